@@ -0,0 +1,288 @@
+"""
+Server-side store for validated upload frames.
+
+Each artifact is a directory under UPLOAD_STAGING_DIR holding one .npy file
+per column plus a small meta.json, so a view can memory-map the columns it
+needs instead of keeping the rows in the session. Sessions only hold the
+token. ArtifactWriter builds an artifact chunk by chunk and iter_frame reads
+one back a slice at a time, so neither side holds the whole frame.
+
+Artifacts older than UPLOAD_STAGING_TTL are evicted whenever a new one is
+saved, and are treated as missing when loaded, unless a function registered
+with pin_artifacts still lists their token (e.g. a queued job's upload).
+"""
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+META_FILE = 'meta.json'
+
+# Functions returning tokens that must outlive the TTL
+_pins = []
+
+
+class ArtifactNotFound(Exception):
+    """The artifact never existed, was discarded, or has expired."""
+
+
+def _root():
+    return Path(settings.UPLOAD_STAGING_DIR)
+
+
+def _path(token):
+    # Tokens are generated here and only ever read back from the session or a job row
+    if not token or not token.isalnum():
+        raise ArtifactNotFound("Invalid artifact token.")
+    return _root() / token
+
+
+def _expired(path, ttl):
+    return time.time() - path.stat().st_mtime > ttl
+
+
+def pin_artifacts(tokens_in_use):
+    """
+    Register tokens_in_use, a callable returning the tokens still needed, so
+    those artifacts are never evicted or treated as expired.
+    """
+    _pins.append(tokens_in_use)
+
+
+def _pinned():
+    return {token for tokens_in_use in _pins for token in tokens_in_use()}
+
+
+def _encode(series):
+    """(kind, values, mask) for one column; mask is None when the column can't hold nulls."""
+    mask = series.isna().to_numpy()
+    if pd.api.types.is_bool_dtype(series) and not mask.any():
+        return 'bool', series.to_numpy(dtype=bool), None
+    if pd.api.types.is_integer_dtype(series):
+        return 'int', series.to_numpy(dtype='int64', na_value=0), mask
+    if pd.api.types.is_float_dtype(series):
+        # NaN already marks the nulls
+        return 'float', series.to_numpy(dtype='float64', na_value=np.nan), None
+    values = series.astype(object).where(~mask, '').astype(str).to_numpy(dtype=str)
+    return 'str', values, mask
+
+
+def _decode(kind, values, mask):
+    if kind == 'int':
+        return pd.arrays.IntegerArray(np.asarray(values), np.asarray(mask))
+    if kind == 'str':
+        column = pd.Series(values, dtype=object)
+        return column.where(~np.asarray(mask), None)
+    return values
+
+
+def evict_expired(ttl=None):
+    """Remove artifacts (and any stray staging files) older than ttl seconds."""
+    ttl = settings.UPLOAD_STAGING_TTL if ttl is None else ttl
+    root = _root()
+    if not root.exists():
+        return 0
+
+    evicted = 0
+    pinned = None
+    for entry in root.iterdir():
+        try:
+            if not _expired(entry, ttl):
+                continue
+            if pinned is None:
+                pinned = _pinned()
+            if entry.name in pinned:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink()
+            evicted += 1
+        except FileNotFoundError:
+            # Removed by another process between listing and checking
+            pass
+    return evicted
+
+
+class ArtifactWriter:
+    """
+    Write an artifact chunk by chunk. Each append() adds a DataFrame's rows to
+    per-column files on disk, so only the current chunk is ever in memory.
+    Every chunk must have the same columns, encoding to the same kinds.
+
+        with ArtifactWriter('pricing') as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+            token = writer.finish(meta)
+
+    Leaving the block without calling finish() removes the partial artifact.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.token = None
+        self.rows = 0
+        self.columns = None
+        self.staging = None
+
+    def __enter__(self):
+        evict_expired()
+        self.token = uuid.uuid4().hex
+        self.staging = _path(self.token).with_name(f".{self.token}.tmp")
+        self.staging.mkdir(parents=True)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.staging is not None:
+            shutil.rmtree(self.staging, ignore_errors=True)
+            self.staging = None
+
+    def append(self, df):
+        if self.columns is None:
+            # name, kind, string widths per chunk (str columns only)
+            self.columns = [[str(name), None, []] for name in df.columns]
+        elif [str(name) for name in df.columns] != [column[0] for column in self.columns]:
+            raise ValueError("Every chunk of an artifact must have the same columns.")
+
+        for i, (name, column) in enumerate(zip(df.columns, self.columns)):
+            column_kind, values, mask = _encode(df[name])
+            if column[1] is None:
+                column[1] = column_kind
+            elif column[1] != column_kind:
+                raise ValueError(f"Column {name} is {column_kind} in this chunk but {column[1]} before.")
+            if column_kind == 'str':
+                column[2].append((len(values), values.dtype.itemsize // 4))
+            with open(self.staging / f"{i}.raw", 'ab') as f:
+                values.tofile(f)
+            if mask is not None:
+                with open(self.staging / f"{i}.mask.raw", 'ab') as f:
+                    mask.tofile(f)
+        self.rows += len(df)
+
+    def _write_npy(self, name, dtype, raw_name, chunks=None):
+        """Turn a raw column file into an .npy file, widening string chunks to one width."""
+        raw = self.staging / raw_name
+        with open(self.staging / name, 'wb') as out:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (self.rows,)}
+            )
+            if not raw.exists():
+                return
+            with open(raw, 'rb') as f:
+                if chunks is None:
+                    shutil.copyfileobj(f, out)
+                else:
+                    for count, width in chunks:
+                        values = np.fromfile(f, dtype=f'<U{width}', count=count)
+                        values.astype(dtype).tofile(out)
+            raw.unlink()
+
+    def finish(self, meta=None):
+        """Publish the artifact and return its token. meta must be JSON-serialisable."""
+        columns = []
+        for i, (name, column_kind, chunks) in enumerate(self.columns or []):
+            if column_kind == 'str':
+                width = max([width for _, width in chunks] + [1])
+                self._write_npy(f"{i}.npy", np.dtype(f'<U{width}'), f"{i}.raw", chunks)
+            else:
+                dtype = {'bool': np.dtype(bool), 'int': np.dtype('int64'), 'float': np.dtype('float64')}[column_kind]
+                self._write_npy(f"{i}.npy", dtype, f"{i}.raw")
+            if column_kind in ('int', 'str'):
+                self._write_npy(f"{i}.mask.npy", np.dtype(bool), f"{i}.mask.raw")
+            columns.append([name, column_kind])
+
+        (self.staging / META_FILE).write_text(json.dumps({
+            'kind': self.kind,
+            'rows': self.rows,
+            'columns': columns,
+            'meta': meta or {},
+        }))
+        # Readers never see a half-written artifact
+        self.staging.rename(_path(self.token))
+        self.staging = None
+        return self.token
+
+
+def save_frame(df, kind, meta=None):
+    """Write df as a new artifact and return its token. meta must be JSON-serialisable."""
+    with ArtifactWriter(kind) as writer:
+        writer.append(df)
+        return writer.finish(meta)
+
+
+def _read_info(token, kind):
+    path = _path(token)
+    try:
+        if _expired(path, settings.UPLOAD_STAGING_TTL) and token not in _pinned():
+            discard(token)
+            raise ArtifactNotFound("The artifact has expired.")
+        info = json.loads((path / META_FILE).read_text())
+    except FileNotFoundError:
+        raise ArtifactNotFound("No artifact for this token.")
+    if info['kind'] != kind:
+        raise ArtifactNotFound(f"Artifact is a {info['kind']}, not a {kind}.")
+    return path, info
+
+
+def artifact_meta(token, kind):
+    """The meta dict saved with an artifact, plus its row count under 'rows'."""
+    _, info = _read_info(token, kind)
+    return dict(info['meta'], rows=info['rows'])
+
+
+def _open_columns(path, info, columns):
+    """{name: (kind, values, mask)} with each array memory-mapped."""
+    # Zero-length arrays can't be mapped
+    mmap_mode = 'r' if info['rows'] else None
+    opened = {}
+    for i, (name, column_kind) in enumerate(info['columns']):
+        if columns is not None and name not in columns:
+            continue
+        values = np.load(path / f"{i}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        mask = None
+        if column_kind in ('int', 'str'):
+            mask = np.load(path / f"{i}.mask.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        opened[name] = (column_kind, values, mask)
+    return opened
+
+
+def load_frame(token, kind, columns=None):
+    """
+    Load an artifact as a DataFrame. Columns are memory-mapped, so only the
+    ones asked for (all by default) are read from disk.
+    """
+    path, info = _read_info(token, kind)
+    opened = _open_columns(path, info, columns)
+    data = {name: _decode(column_kind, values, mask) for name, (column_kind, values, mask) in opened.items()}
+    return pd.DataFrame(data, index=pd.RangeIndex(info['rows']))
+
+
+def iter_frame(token, kind, columns=None, slice_size=50000):
+    """
+    Yield an artifact as DataFrames of at most slice_size rows, in order. Only
+    the current slice of each memory-mapped column is read and decoded.
+    """
+    path, info = _read_info(token, kind)
+    opened = _open_columns(path, info, columns)
+    for start in range(0, info['rows'], slice_size):
+        stop = min(start + slice_size, info['rows'])
+        data = {
+            name: _decode(column_kind, values[start:stop], None if mask is None else mask[start:stop])
+            for name, (column_kind, values, mask) in opened.items()
+        }
+        # Decoded columns are indexed from 0, so align on that before renumbering
+        df = pd.DataFrame(data, index=pd.RangeIndex(stop - start))
+        df.index = pd.RangeIndex(start, stop)
+        yield df
+
+
+def discard(token):
+    try:
+        shutil.rmtree(_path(token))
+    except (FileNotFoundError, ArtifactNotFound):
+        pass
@@ -0,0 +1,185 @@
+"""
+CSV reading for admin uploads.
+
+Each upload format declares a CsvSchema so columns are read with fixed
+dtypes instead of being inferred per chunk. pyarrow's CSV reader is used
+when it is installed; otherwise pandas' C parser reads the same schema.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - optional speed-up
+    pa = pa_csv = None
+
+STRING = 'string'
+INTEGER = 'integer'  # nullable, read as Int64
+FLOAT = 'float'
+
+_PANDAS_DTYPES = {STRING: str, INTEGER: 'Int64', FLOAT: 'float64'}
+# pandas' C parser is much slower reading straight into Int64 than into float64
+_PANDAS_READ_DTYPES = dict(_PANDAS_DTYPES, **{INTEGER: 'float64'})
+
+# Bytes per pyarrow block; roughly 100k rows of a pricing sheet
+BLOCK_SIZE = 8 << 20
+
+# The only price date formats accepted, tried in this order
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class CsvIngestError(Exception):
+    """The file couldn't be read against its schema; the message is shown to the user."""
+
+
+@dataclass(frozen=True)
+class CsvSchema:
+    columns: dict               # column name -> STRING / INTEGER / FLOAT
+    required: tuple = ()        # columns that may not contain nulls
+    date_columns: tuple = ()    # STRING columns to run through parse_dates
+
+    def missing_columns(self, names):
+        return set(self.columns) - set(names)
+
+    def columns_with_nulls(self, df):
+        """Required columns that contain a null, in schema order."""
+        nulls = df[list(self.required)].isnull().any()
+        return nulls[nulls].index.tolist()
+
+
+PRICING_SCHEMA = CsvSchema(
+    columns={
+        'price_date': STRING,
+        'station_name': STRING,
+        'start_hour': INTEGER,
+        'end_hour': INTEGER,
+        'duration': INTEGER,
+        'sales_house_name': STRING,
+        'cost_type': STRING,
+        'cost': FLOAT,
+    },
+    required=('price_date', 'station_name', 'cost_type', 'cost'),
+    date_columns=('price_date',),
+)
+
+BASELINE_SCHEMA = CsvSchema(
+    columns={
+        'day_of_week': STRING,
+        'hour_of_day': INTEGER,
+        'baseline_session': FLOAT,
+        'baseline_sales': FLOAT,
+    },
+    required=('day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales'),
+)
+
+
+def _check_columns(names, schema):
+    missing = schema.missing_columns(names)
+    if missing:
+        raise CsvIngestError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+
+def blank_to_none(df, schema):
+    """Whitespace-only text becomes null, as an empty field already does."""
+    for column, kind in schema.columns.items():
+        if kind != STRING or column not in df:
+            continue
+        values = df[column]
+        blank = values.str.strip().eq('').fillna(False).astype(bool)
+        if blank.any():
+            df[column] = values.mask(blank, None)
+    return df
+
+
+def parse_dates(values):
+    """
+    Parse YYYY-MM-DD and DD/MM/YYYY dates into datetimes; anything else is NaT.
+
+    ISO dates are matched first so DD/MM parsing never swaps their month and
+    day. Each distinct value is parsed once, since a file usually holds only a few.
+    """
+    codes, distinct = pd.factorize(values)
+    distinct = pd.Series(distinct, dtype=object).astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=distinct.index, dtype='datetime64[ns]')
+    for date_format in DATE_FORMATS:
+        rest = parsed.isna()
+        if not rest.any():
+            break
+        parsed[rest] = pd.to_datetime(distinct[rest], format=date_format, errors='coerce')
+    # Nulls have code -1 and come back as NaT
+    parsed = pd.DatetimeIndex(parsed).take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(parsed, index=values.index, name=values.name)
+
+
+def _arrow_blocks(file, schema):
+    reader = pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={
+                column: {STRING: pa.string(), INTEGER: pa.int64(), FLOAT: pa.float64()}[kind]
+                for column, kind in schema.columns.items()
+            },
+            strings_can_be_null=True,
+        ),
+    )
+    _check_columns(reader.schema.names, schema)
+    types_mapper = {pa.int64(): pd.Int64Dtype()}.get
+    for batch in reader:
+        yield batch.to_pandas(types_mapper=types_mapper)
+
+
+def _to_integer(df, schema):
+    for column, kind in schema.columns.items():
+        if kind == INTEGER:
+            try:
+                df[column] = df[column].astype('Int64')
+            except (TypeError, ValueError):
+                raise CsvIngestError(f"Column {column} must contain whole numbers.")
+    return df
+
+
+def _pandas_chunks(file, schema, chunk_size):
+    reader = pd.read_csv(
+        file,
+        dtype={column: _PANDAS_READ_DTYPES[kind] for column, kind in schema.columns.items()},
+        encoding='utf-8-sig',
+        chunksize=chunk_size,
+    )
+    if chunk_size is None:
+        reader = [reader]
+    for i, chunk in enumerate(reader):
+        if i == 0:
+            _check_columns(chunk.columns, schema)
+        yield _to_integer(chunk, schema)
+
+
+def iter_csv(file, schema, chunk_size=50000, engine=None):
+    """
+    Yield DataFrame chunks of a binary CSV file read against schema, with
+    whitespace-only text nulled. engine is 'pyarrow' or 'pandas'; by default
+    pyarrow is used when installed. pyarrow chunks are sized in bytes, so
+    chunk_size only applies to the pandas engine; None reads the file in one go.
+    """
+    if engine is None:
+        engine = 'pyarrow' if pa_csv is not None else 'pandas'
+
+    chunks = _arrow_blocks(file, schema) if engine == 'pyarrow' else _pandas_chunks(file, schema, chunk_size)
+    try:
+        for chunk in chunks:
+            yield blank_to_none(chunk, schema)
+    except CsvIngestError:
+        raise
+    except (ValueError, TypeError) as e:
+        # Conversion failures (text in an integer column, ragged rows); ArrowInvalid is a ValueError
+        raise CsvIngestError(f"Could not read the CSV: {e}")
+
+
+def read_csv(file, schema, engine=None):
+    """Read a whole binary CSV file against schema into one DataFrame."""
+    chunks = list(iter_csv(file, schema, chunk_size=None, engine=engine))
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=_PANDAS_DTYPES[kind]) for column, kind in schema.columns.items()})
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,303 @@
+"""
+Changelists for tables with millions of rows.
+
+The default admin changelist runs COUNT(*) over the filtered queryset (and
+again over the whole table) and pages with OFFSET, both of which scan more
+of the table the deeper you go. LargeTableAdminMixin replaces that with:
+
+- counts that are exact up to EXACT_COUNT_LIMIT rows and estimated beyond
+  it, from pg_class.reltuples when no filter applies or from the planner's
+  row estimate when one does;
+- keyset pagination ("Newer" / "Older" links carrying the last row's key)
+  on keyset_ordering, which an index should cover. Sorting by another
+  column falls back to numbered pages, still with the estimated count.
+  Columns outside the admin's sortable_by can't be sorted on at all, even
+  by editing the URL.
+
+DateRangeFilter is a list filter that turns from/to dates into a range
+predicate on an indexed date or datetime column.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db import connections, models
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+
+EXACT_COUNT_LIMIT = 10000
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+def table_estimate(model, using='default'):
+    """pg_class.reltuples for model's table, or None if unknown (not PostgreSQL, or never analyzed)."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def planner_estimate(queryset):
+    """The planner's row estimate for queryset, or None if not on PostgreSQL."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset, limit=EXACT_COUNT_LIMIT):
+    """
+    (count, is_estimate) for queryset. Up to limit rows are counted exactly
+    with a bounded scan; past that the table or planner estimate is used.
+    """
+    bounded = queryset.order_by()[:limit + 1].count()
+    if bounded <= limit:
+        return bounded, False
+
+    if queryset.query.where:
+        estimate = planner_estimate(queryset)
+    else:
+        estimate = table_estimate(queryset.model, queryset.db)
+    return max(estimate or 0, bounded), True
+
+
+def _keyset_filter(fields, values, forwards):
+    """
+    Q for rows past values in the ordering given by fields ('-name' for
+    descending), or before them when not forwards:
+    f0 >= v0 AND (f0 > v0 OR (f0 = v0 AND f1 > v1) OR ...)
+
+    The leading f0 >= v0 is implied by the OR, but PostgreSQL can only turn
+    a top-level bound into an index range; without it the OR is a filter.
+    """
+    condition = Q(pk__in=[])
+    equal = Q()
+    for field, value in zip(fields, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') == forwards else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+
+    first = fields[0]
+    lookup = 'lte' if first.startswith('-') == forwards else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList with estimated counts and, under the default ordering, keyset pagination."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter and sort links start again from the first page
+        new_params = new_params or {}
+        remove = list(remove or []) + [var for var in (AFTER_VAR, BEFORE_VAR) if var not in new_params]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        # sortable_by only hides header links; a hand-written ?o= for another
+        # column would still sort the whole table, so it is dropped here
+        if self.params.get(ORDER_VAR) and self.sortable_by is not None:
+            allowed = []
+            for part in self.params[ORDER_VAR].split('.'):
+                try:
+                    field_name = self.list_display[int(part.rpartition('-')[2])]
+                except (IndexError, ValueError):
+                    continue
+                if field_name in self.sortable_by:
+                    allowed.append(part)
+            if allowed:
+                self.params[ORDER_VAR] = '.'.join(allowed)
+            else:
+                del self.params[ORDER_VAR]
+        return super().get_ordering(request, queryset)
+
+    @property
+    def keyset_fields(self):
+        return list(self.model_admin.keyset_ordering)
+
+    def keyset_model_fields(self):
+        opts = self.lookup_opts
+        return [opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-')) for name in self.keyset_fields]
+
+    def key_values(self, obj):
+        return [field.value_from_object(obj) for field in self.keyset_model_fields()]
+
+    def encode_key(self, obj):
+        return ','.join(field.value_to_string(obj) for field in self.keyset_model_fields())
+
+    def decode_key(self, value):
+        fields = self.keyset_model_fields()
+        parts = value.split(',')
+        if len(parts) != len(fields):
+            raise IncorrectLookupParameters("Invalid page cursor.")
+        try:
+            return [field.to_python(part) for field, part in zip(fields, parts)]
+        except ValidationError:
+            raise IncorrectLookupParameters("Invalid page cursor.")
+
+    def page_url(self, param, obj):
+        return self.get_query_string({param: self.encode_key(obj)})
+
+    def get_results(self, request):
+        count, self.count_is_estimate = estimated_count(self.queryset)
+        self.keyset = ORDER_VAR not in self.params
+        self.first_url = self.newer_url = self.older_url = None
+        self.result_count = count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+
+        if not self.keyset:
+            # Sorted by a column the keyset doesn't cover: numbered pages, but no COUNT(*)
+            paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+            paginator.count = count
+            try:
+                self.result_list = paginator.page(self.page_num).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            self.multi_page = count > self.list_per_page
+            self.paginator = paginator
+            return
+
+        per_page = self.list_per_page
+        fields = self.keyset_fields
+        queryset = self.queryset.order_by(*fields)
+        after = request.GET.get(AFTER_VAR)
+        before = request.GET.get(BEFORE_VAR)
+
+        if before:
+            # Walk backwards from the cursor, then show those rows in the normal order
+            reverse = [name[1:] if name.startswith('-') else f'-{name}' for name in fields]
+            pks = list(
+                self.queryset.filter(_keyset_filter(fields, self.decode_key(before), forwards=False))
+                .order_by(*reverse).values_list('pk', flat=True)[:per_page + 1]
+            )
+            has_newer = len(pks) > per_page
+            result_list = queryset.filter(pk__in=pks[:per_page])
+        else:
+            if after:
+                queryset = queryset.filter(_keyset_filter(fields, self.decode_key(after), forwards=True))
+            result_list = queryset[:per_page]
+            has_newer = bool(after)
+
+        rows = list(result_list)
+        if before:
+            has_older = bool(rows)
+        else:
+            has_older = len(rows) == per_page and queryset.filter(
+                _keyset_filter(fields, self.key_values(rows[-1]), forwards=True)
+            ).exists()
+
+        if has_newer and rows:
+            self.first_url = self.get_query_string()
+            self.newer_url = self.page_url(BEFORE_VAR, rows[0])
+        if has_older:
+            self.older_url = self.page_url(AFTER_VAR, rows[-1])
+
+        self.result_list = result_list
+        self.multi_page = bool(self.newer_url or self.older_url)
+        self.paginator = None
+
+
+class DateRangeFilter(admin.FieldListFilter):
+    """
+    From/to date inputs for a date or datetime field, applied as
+    field >= from AND field < to + 1 day so an index on the field serves it.
+    Both dates are inclusive and either may be left empty.
+    """
+
+    template = 'admin/date_range_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.param_from = f'{field_path}__from'
+        self.param_to = f'{field_path}__to'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.date_from = self.parse_date(self.param_from)
+        self.date_to = self.parse_date(self.param_to)
+
+    def parse_date(self, param):
+        value = self.used_parameters.get(param)
+        if isinstance(value, list):
+            value = value[-1]
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise IncorrectLookupParameters(f"Invalid date: {value}")
+
+    def expected_parameters(self):
+        return [self.param_from, self.param_to]
+
+    @property
+    def days(self):
+        """Days covered, or None when either end is open."""
+        if self.date_from is None or self.date_to is None:
+            return None
+        return (self.date_to - self.date_from).days + 1
+
+    def bound(self, date):
+        """Midnight starting date, in the current time zone for datetime fields."""
+        if not isinstance(self.field, models.DateTimeField):
+            return date
+        value = datetime.datetime.combine(date, datetime.time.min)
+        return timezone.make_aware(value) if settings.USE_TZ else value
+
+    def queryset(self, request, queryset):
+        if self.date_from is not None:
+            queryset = queryset.filter(**{f'{self.field_path}__gte': self.bound(self.date_from)})
+        if self.date_to is not None:
+            queryset = queryset.filter(**{f'{self.field_path}__lt': self.bound(self.date_to + datetime.timedelta(days=1))})
+        return queryset
+
+    def choices(self, changelist):
+        # One "choice": the form, carrying the other active parameters as hidden inputs
+        other = QueryDict(changelist.get_query_string(remove=self.expected_parameters())[1:])
+        yield {
+            'param_from': self.param_from,
+            'param_to': self.param_to,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'hidden': [(key, value) for key, values in other.lists() for value in values],
+            'clear_url': changelist.get_query_string(remove=self.expected_parameters()),
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    ModelAdmin mixin for very large tables: estimated counts and keyset
+    pagination. keyset_ordering must end in a unique field, e.g.
+    ('-standard_datetime', '-break_id').
+    """
+
+    keyset_ordering = ('-pk',)
+    show_full_result_count = False
+    change_list_template = 'admin/large_table_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
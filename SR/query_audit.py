@@ -0,0 +1,230 @@
+"""
+Query budgets for admin pages.
+
+Renders each registered ModelAdmin's changelist and change form through a
+RequestFactory request, records the queries each one runs and flags views
+over their budget. Repeated query shapes are reported alongside the
+list_display and inline fields that issue a query per row.
+
+A ModelAdmin declares its limits with query_budgets, e.g.
+query_budgets = {'changelist': 8}; views it doesn't mention use
+DEFAULT_QUERY_BUDGETS. Counts exclude session and auth queries since the
+views are called directly, not through the middleware.
+"""
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.contrib import admin
+from django.contrib.admin.utils import lookup_field, quote
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+DEFAULT_QUERY_BUDGETS = {'changelist': 10, 'change': 15}
+
+# A field is reported once it costs at least this many queries over the rows checked
+REPEAT_THRESHOLD = 2
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)'), '(...)'),
+    (re.compile(r'%s'), '?'),
+]
+
+
+def normalize_sql(sql):
+    """The query's shape: literals, parameters and IN lists replaced by placeholders."""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return ' '.join(sql.split())
+
+
+@dataclass
+class ViewAudit:
+    """Queries one admin view ran while rendering."""
+
+    name: str
+    url: str
+    budget: int
+    status_code: int = None
+    queries: list = field(default_factory=list)
+    seconds: float = 0.0
+    error: str = None
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def over_budget(self):
+        return self.error is not None or self.query_count > self.budget
+
+    @property
+    def duplicates(self):
+        """(shape, count) for query shapes run more than once, most repeated first."""
+        counts = Counter(normalize_sql(q['sql']) for q in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count > 1]
+
+
+@dataclass
+class FieldAudit:
+    """Queries one list_display or inline field ran across a page of objects."""
+
+    admin_name: str
+    kind: str           # 'list_display' or 'inline'
+    field_name: str
+    rows: int
+    queries: int
+
+    @property
+    def repeated(self):
+        return self.rows > 1 and self.queries >= REPEAT_THRESHOLD
+
+
+class _Session(SessionBase):
+    """In-memory session; the audited views only read and write keys."""
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+class AdminQueryAuditor:
+    """Audit the registered ModelAdmins of site, viewing each page as user."""
+
+    def __init__(self, user, site=None):
+        self.user = user
+        self.site = site or admin.site
+        self.factory = RequestFactory()
+
+    def request(self, url):
+        request = self.factory.get(url)
+        request.user = self.user
+        request.session = _Session()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def budget(self, model_admin, view):
+        return getattr(model_admin, 'query_budgets', {}).get(view, DEFAULT_QUERY_BUDGETS[view])
+
+    def admin_name(self, model_admin):
+        opts = model_admin.model._meta
+        return f"{opts.app_label}.{opts.model_name}"
+
+    def audit_view(self, model_admin, view, url, call):
+        audit = ViewAudit(f"{self.admin_name(model_admin)} {view}", url, self.budget(model_admin, view))
+        request = self.request(url)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            try:
+                response = call(request)
+                if hasattr(response, 'render'):
+                    response.render()
+                audit.status_code = response.status_code
+            except Exception as e:
+                audit.error = f"{type(e).__name__}: {e}"
+        audit.seconds = time.perf_counter() - started
+        audit.queries = captured.captured_queries
+        return audit
+
+    def audit_list_display(self, model_admin, url):
+        """Queries each list_display column costs over one changelist page."""
+        request = self.request(url)
+        results = list(model_admin.get_changelist_instance(request).result_list)
+        audits = []
+        for name in model_admin.get_list_display(request):
+            if name == 'action_checkbox':
+                continue
+            with CaptureQueriesContext(connection) as captured:
+                for obj in results:
+                    lookup_field(name, obj, model_admin)
+            audits.append(FieldAudit(self.admin_name(model_admin), 'list_display', name, len(results), len(captured)))
+        return audits
+
+    def audit_inlines(self, model_admin, url, obj):
+        """Queries each inline's readonly fields and __str__ cost over the inline's rows."""
+        request = self.request(url)
+        audits = []
+        for inline in model_admin.get_inline_instances(request, obj):
+            formset = inline.get_formset(request, obj)(instance=obj, queryset=inline.get_queryset(request))
+            rows = [form.instance for form in formset.initial_forms]
+            names = ['__str__'] + [n for n in inline.get_readonly_fields(request, obj) if isinstance(n, str)]
+            for name in names:
+                with CaptureQueriesContext(connection) as captured:
+                    for row in rows:
+                        str(row) if name == '__str__' else lookup_field(name, row, inline)
+                audits.append(FieldAudit(
+                    f"{self.admin_name(model_admin)} > {type(inline).__name__}", 'inline', name, len(rows), len(captured)
+                ))
+        return audits
+
+    def run(self):
+        """Audit every registered ModelAdmin. Returns (view audits, field audits)."""
+        views, fields = [], []
+        for model, model_admin in self.site._registry.items():
+            opts = model._meta
+            changelist_url = reverse(f'{self.site.name}:{opts.app_label}_{opts.model_name}_changelist')
+            views.append(self.audit_view(model_admin, 'changelist', changelist_url, model_admin.changelist_view))
+            fields += self.audit_list_display(model_admin, changelist_url)
+
+            obj = model_admin.get_queryset(self.request(changelist_url)).order_by('pk').first()
+            if obj is None:
+                continue
+            object_id = quote(str(obj.pk))
+            change_url = reverse(f'{self.site.name}:{opts.app_label}_{opts.model_name}_change', args=[object_id])
+            views.append(self.audit_view(
+                model_admin, 'change', change_url,
+                lambda request: model_admin.change_view(request, object_id),
+            ))
+            fields += self.audit_inlines(model_admin, change_url, obj)
+        return views, fields
+
+
+def audit_admin(user=None, site=None):
+    """Run AdminQueryAuditor over site (admin.site by default) as user, a superuser if none is given."""
+    if user is None:
+        user = AnonymousUser()
+        user.is_active = user.is_staff = user.is_superuser = True
+        user.has_perm = user.has_module_perms = lambda *args, **kwargs: True
+    return AdminQueryAuditor(user, site).run()
+
+
+def format_report(views, fields, max_duplicates=3):
+    """Plain-text report: one line per view, then repeated query shapes and per-row fields."""
+    lines = []
+    for audit in views:
+        flag = 'OVER ' if audit.over_budget else '     '
+        lines.append(
+            f"{flag}{audit.name:<45} {audit.query_count:>4} / {audit.budget:<4} queries "
+            f"{audit.seconds * 1000:7.1f} ms  {audit.url}"
+        )
+        if audit.error:
+            lines.append(f"        error: {audit.error}")
+        for shape, count in audit.duplicates[:max_duplicates]:
+            lines.append(f"        x{count}: {shape[:160]}")
+
+    repeated = [f for f in fields if f.repeated]
+    if repeated:
+        lines.append("")
+        lines.append("Fields running queries per row:")
+        for f in repeated:
+            lines.append(f"  {f.admin_name} {f.kind} '{f.field_name}': {f.queries} queries for {f.rows} rows")
+    return '\n'.join(lines)
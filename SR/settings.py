@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,17 +78,28 @@ WSGI_APPLICATION = 'SR.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',
-        'USER': 'smartresponse',
-        'PASSWORD': 'Smartresponse!23',
-        'HOST': 'smart-response-db.cz2u0sigqe0h.eu-west-1.rds.amazonaws.com',
-        'PORT': '5432',
+        # Override with SR_DB_* to point at a local PostgreSQL (e.g. for testing pricing SQL)
+        'NAME': os.environ.get('SR_DB_NAME', 'postgres'),
+        'USER': os.environ.get('SR_DB_USER', 'smartresponse'),
+        'PASSWORD': os.environ.get('SR_DB_PASSWORD', 'Smartresponse!23'),
+        'HOST': os.environ.get('SR_DB_HOST', 'smart-response-db.cz2u0sigqe0h.eu-west-1.rds.amazonaws.com'),
+        'PORT': os.environ.get('SR_DB_PORT', '5432'),
         'OPTIONS': {
             'options': '-c search_path=public,sr_exclusive'
         }
     }
 }
 
+# Creates the unmanaged tables in the test database before it is migrated
+TEST_RUNNER = 'SR.test_runner.UnmanagedTablesTestRunner'
+
+
+# Validated uploads waiting to be inserted are staged here, keyed by a token kept in the session.
+# Anything older than the TTL (seconds) is removed the next time an upload is staged.
+
+UPLOAD_STAGING_DIR = os.environ.get('SR_UPLOAD_STAGING_DIR', str(BASE_DIR / '.uploads'))
+UPLOAD_STAGING_TTL = int(os.environ.get('SR_UPLOAD_STAGING_TTL', 24 * 60 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
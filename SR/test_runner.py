@@ -0,0 +1,33 @@
+"""
+Test runner that creates the unmanaged tables in the test database.
+
+Most tables here are owned outside Django (managed = False), so migrate
+never creates them, yet the managed models and the index migrations refer
+to them. They are created from the model definitions just before the test
+database is migrated.
+"""
+from django.apps import apps
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.test.runner import DiscoverRunner
+
+
+def create_unmanaged_tables(using, **kwargs):
+    connection = connections[using]
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as schema_editor:
+        for model in apps.get_models():
+            if not model._meta.managed and model._meta.db_table not in existing:
+                schema_editor.create_model(model)
+                existing.add(model._meta.db_table)
+
+
+class UnmanagedTablesTestRunner(DiscoverRunner):
+
+    def setup_databases(self, **kwargs):
+        # pre_migrate is sent once per app, so the handler skips tables already created
+        pre_migrate.connect(create_unmanaged_tables, dispatch_uid='create_unmanaged_tables')
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            pre_migrate.disconnect(dispatch_uid='create_unmanaged_tables')
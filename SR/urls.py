@@ -21,4 +21,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('campaigns.urls')),
     path('admin/campaigns/', include('campaigns.urls')),
+    path('stations/', include('stations.urls')),
 ]
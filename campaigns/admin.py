@@ -1,22 +1,28 @@
 from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django import forms
 from django.shortcuts import render, redirect
 from django.urls import path, reverse
-from django.http import HttpResponse
-from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.http import QueryDict
 from django.utils.html import format_html
-import csv
-from io import TextIOWrapper
-import pandas as pd
-
-from .models import Client, Campaign, Product_Mapping, Page_Mapping, Commercial, Product, Page
+import copy
+import itertools
+
+from .models import (
+    Client, Campaign, Product_Mapping, Page_Mapping, Commercial, Product, Page, Product_Baseline, Page_Baseline,
+)
+from .baselines import BASELINE_ARTIFACT, BASELINE_COLUMNS, baseline_export_query, insert_baselines, upsert_baselines
+from .mappings import map_to_campaign
+from SR.artifacts import ArtifactNotFound, artifact_meta, discard, load_frame, save_frame
+from SR.csv_ingest import BASELINE_SCHEMA, CsvIngestError, read_csv
+from SR.exports import csv_download, query_csv_chunks, query_rows, zip_csv_chunks, zip_download
 
 admin.site.site_header = "Smart Response Campaign Management Portal"
 admin.site.site_title = "Campaign Portal Admin"
 admin.site.index_title = "Welcome to the Campaign Admin"
 
-BASELINE_COLUMNS = ['day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales']
-
 # Form for selecting a campaign
 class CampaignSelectForm(forms.Form):
     campaign = forms.ModelChoiceField(queryset=Campaign.objects.all(), required=True)
@@ -73,6 +79,32 @@ class CommercialMappedToCampaignFilter(admin.SimpleListFilter):
         return queryset
 
 
+class HasBaselineFilter(admin.SimpleListFilter):
+    """Filters on the baseline_exists annotation added by BaselineAdminMixin.get_queryset."""
+    title = "Has baseline"
+    parameter_name = "baseline"
+
+    def lookups(self, request, model_admin):
+        return [
+            ("yes", "Yes"),
+            ("no", "No"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == "yes":
+            return queryset.filter(baseline_exists=True)
+        elif self.value() == "no":
+            return queryset.filter(baseline_exists=False)
+        return queryset
+
+
+class SelectionChangeList(ChangeList):
+    """A changelist that only builds its filtered queryset, without counting or fetching a page."""
+
+    def get_results(self, request):
+        pass
+
+
 class BaselineAdminMixin:
     """Shared baseline export/upload + mapping logic for products/pages."""
 
@@ -83,8 +115,16 @@ class BaselineAdminMixin:
     id_field = None
     mapping_model = None
     mapping_fk_name = None  # 'ga_product_id' or 'ga_page_id'
+    baseline_model = None
+    baseline_fk_name = None  # baseline_model's foreign key to this admin's model
+
+    # Checked by SR.query_audit; has_baseline is an annotation, not a query per row
+    query_budgets = {'changelist': 5}
 
-    actions = ['upload_baseline_csv_action', 'map_to_campaign_action']
+    actions = [
+        'upload_baseline_csv_action', 'map_to_campaign_action',
+        'export_baselines_csv_action', 'export_baselines_zip_action',
+    ]
 
     # Remove the delete selected action
     def get_actions(self, request):
@@ -93,11 +133,23 @@ class BaselineAdminMixin:
             del actions['delete_selected']
         return actions
 
+    # ==== Has Baseline Column ====
+    def get_queryset(self, request):
+        # One correlated EXISTS per listed row, answered from the baseline table's index
+        baselines = self.baseline_model.objects.filter(**{self.baseline_fk_name: OuterRef('pk')})
+        return super().get_queryset(request).annotate(baseline_exists=Exists(baselines))
+
+    def has_baseline(self, obj):
+        return "Yes" if obj.baseline_exists else "No"
+    has_baseline.short_description = "Has baseline"
+    has_baseline.admin_order_field = 'baseline_exists'
+
     # ==== Export Button ====
     def export_link(self, obj):
+        url = reverse(f'admin:{self.export_view_name}', args=[obj.pk])
         return format_html(
-            '<a class="button" href="{}">Export Baseline CSV</a>',
-            reverse(f'admin:{self.export_view_name}', args=[obj.pk])
+            '<a class="button" href="{}">Export Baseline CSV</a> <a href="{}?gzip=1">.gz</a>',
+            url, url
         )
     export_link.short_description = "Export"
 
@@ -133,25 +185,35 @@ class BaselineAdminMixin:
     # ==== Export ====
     def export_baseline(self, request, object_id):
         obj = self.model.objects.get(pk=object_id)
-        with connection.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT day_of_week, hour_of_day, baseline_session, baseline_sales
-                FROM {self.baseline_table}
-                WHERE {self.id_field} = %s
-                ORDER BY day_of_week, hour_of_day
-                """,
-                [getattr(obj, self.id_field)]
-            )
-            rows = cursor.fetchall()
+        sql = f"""
+            SELECT day_of_week, hour_of_day, baseline_session, baseline_sales
+            FROM {self.baseline_table}
+            WHERE {self.id_field} = %s
+            ORDER BY day_of_week, hour_of_day
+        """
+        return csv_download(
+            query_csv_chunks(sql, [getattr(obj, self.id_field)], BASELINE_COLUMNS),
+            f"{getattr(obj, self.id_field)}_baseline.csv",
+            compress=bool(request.GET.get('gzip')),
+        )
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{getattr(obj, self.id_field)}_baseline.csv"'
-        writer = csv.writer(response)
-        writer.writerow(BASELINE_COLUMNS)
-        for row in rows:
-            writer.writerow(row)
-        return response
+    # ==== Bulk Export Actions ====
+    def export_baselines_csv_action(self, request, queryset):
+        sql, params = baseline_export_query(self.baseline_table, self.id_field, queryset)
+        return csv_download(
+            query_csv_chunks(sql, params, [self.id_field] + BASELINE_COLUMNS),
+            f"{self.baseline_table}.csv",
+        )
+    export_baselines_csv_action.short_description = "Export baselines as one CSV"
+
+    def export_baselines_zip_action(self, request, queryset):
+        sql, params = baseline_export_query(self.baseline_table, self.id_field, queryset)
+        groups = (
+            (f"{entity_id}_baseline.csv", (row[1:] for row in rows))
+            for entity_id, rows in itertools.groupby(query_rows(sql, params), key=lambda row: row[0])
+        )
+        return zip_download(zip_csv_chunks(groups, BASELINE_COLUMNS), f"{self.baseline_table}.zip")
+    export_baselines_zip_action.short_description = "Export baselines as a zip of CSVs"
 
     # ==== Upload Baseline Action ====
     def upload_baseline_csv_action(self, request, queryset):
@@ -174,28 +236,28 @@ class BaselineAdminMixin:
                 return redirect(f'admin:{self.upload_view_name}')
 
             try:
-                df = pd.read_csv(TextIOWrapper(uploaded_file.file, encoding='utf-8'))
-
-                if not set(BASELINE_COLUMNS).issubset(df.columns):
-                    missing = set(BASELINE_COLUMNS) - set(df.columns)
-                    self.message_user(request, f"Missing required columns: {', '.join(missing)}", level=messages.ERROR)
+                try:
+                    df = read_csv(uploaded_file.file, BASELINE_SCHEMA)
+                except CsvIngestError as e:
+                    self.message_user(request, str(e), level=messages.ERROR)
                     return redirect(f'admin:{self.upload_view_name}')
 
-                missing_required = df[BASELINE_COLUMNS].isnull().any()
-                if missing_required.any():
-                    missing_cols = missing_required[missing_required == True].index.tolist()
+                missing_cols = BASELINE_SCHEMA.columns_with_nulls(df)
+                if missing_cols:
                     self.message_user(request, f"Missing required values in: {', '.join(missing_cols)}", level=messages.ERROR)
                     return redirect(f'admin:{self.upload_view_name}')
 
-                cleaned_data = df[BASELINE_COLUMNS].to_dict(orient='records')
-
-                # Store IDs + data for insert
-                request.session['validated_baseline_data'] = cleaned_data
-                request.session['validated_baseline_ids'] = selected_ids
+                # Stage IDs + data for insert; the session only keeps the token
+                previous_token = request.session.pop('baseline_upload_token', None)
+                if previous_token:
+                    discard(previous_token)
+                request.session['baseline_upload_token'] = save_frame(
+                    df[BASELINE_COLUMNS], BASELINE_ARTIFACT, meta={'ids': selected_ids}
+                )
 
                 self.message_user(
                     request,
-                    f"Validated {len(cleaned_data)} rows for {len(selected_ids)} selected items. Ready to insert.",
+                    f"Validated {len(df)} rows for {len(selected_ids)} selected items. Ready to insert.",
                     level=messages.SUCCESS
                 )
 
@@ -217,30 +279,33 @@ class BaselineAdminMixin:
         })
     
     def insert_baseline_view(self, request):
-        baseline_data = request.session.get('validated_baseline_data', [])
-        selected_ids = request.session.get('validated_baseline_ids', [])
+        token = request.session.get('baseline_upload_token')
+        try:
+            selected_ids = artifact_meta(token, BASELINE_ARTIFACT)['ids']
+            # Memory-mapped columns, handed to the insert as they are
+            baseline_data = load_frame(token, BASELINE_ARTIFACT, columns=BASELINE_COLUMNS)
+        except ArtifactNotFound:
+            selected_ids, baseline_data = [], None
 
-        if not baseline_data or not selected_ids:
+        if baseline_data is None or not len(baseline_data) or not selected_ids:
             self.message_user(request, "No validated baseline data found.", level=messages.ERROR)
             return redirect('../')
 
         try:
-            with connection.cursor() as cursor:
-                for obj_id in selected_ids:
-                    for row in baseline_data:
-                        cursor.execute(
-                            f"""
-                            INSERT INTO {self.baseline_table}
-                            ({self.id_field}, day_of_week, hour_of_day, baseline_session, baseline_sales)
-                            VALUES (%s, %s, %s, %s, %s)
-                            """,
-                            [obj_id, row['day_of_week'], row['hour_of_day'], row['baseline_session'], row['baseline_sales']]
-                        )
-            self.message_user(request, f"Inserted {len(baseline_data) * len(selected_ids)} rows into {self.baseline_table}.", level=messages.SUCCESS)
+            if request.POST.get('mode') == 'upsert':
+                result = upsert_baselines(self.baseline_table, self.id_field, selected_ids, baseline_data)
+                self.message_user(
+                    request,
+                    f"Upserted into {self.baseline_table}: {result.inserted} inserted, "
+                    f"{result.updated} updated, {result.unchanged} unchanged.",
+                    level=messages.SUCCESS
+                )
+            else:
+                inserted = insert_baselines(self.baseline_table, self.id_field, selected_ids, baseline_data)
+                self.message_user(request, f"Inserted {inserted} rows into {self.baseline_table}.", level=messages.SUCCESS)
 
             # Clear session
-            request.session.pop('validated_baseline_data', None)
-            request.session.pop('validated_baseline_ids', None)
+            discard(request.session.pop('baseline_upload_token'))
 
         except Exception as e:
             self.message_user(request, f"Error inserting baseline data: {e}", level=messages.ERROR)
@@ -249,14 +314,47 @@ class BaselineAdminMixin:
     
     # ==== Map to Campaign Action ====
     def map_to_campaign_action(self, request, queryset):
-        ids = list(queryset.values_list('pk', flat=True))
-        request.session['map_object_ids'] = ids
+        if request.POST.get('select_across') == '1':
+            # "Select all N": keep the changelist's filters rather than every matching id
+            request.session['map_selection'] = {'filters': request.GET.urlencode()}
+        else:
+            request.session['map_selection'] = {'ids': list(queryset.values_list('pk', flat=True))}
         return redirect(f'admin:{self.map_view_name}')
     map_to_campaign_action.short_description = "Map to campaign"
 
+    def get_changelist(self, request, **kwargs):
+        if getattr(request, 'selection_only', False):
+            return SelectionChangeList
+        return super().get_changelist(request, **kwargs)
+
+    def mapping_selection(self, request):
+        """
+        The queryset saved by map_to_campaign_action, or None if nothing is
+        selected. Raises IncorrectLookupParameters if saved filters no longer apply.
+        """
+        selection = request.session.get('map_selection')
+        if not selection:
+            return None
+        if 'ids' in selection:
+            return self.model.objects.filter(pk__in=selection['ids'])
+
+        # Rebuild the changelist the action ran on, with the same filters and
+        # search, but only as far as its queryset: no count and no page query
+        changelist_request = copy.copy(request)
+        changelist_request.GET = QueryDict(selection['filters'])
+        changelist_request.selection_only = True
+        return self.get_changelist_instance(changelist_request).queryset
+
     def map_to_campaign_view(self, request):
-        selected_ids = request.session.get('map_object_ids', [])
-        if not selected_ids:
+        try:
+            selected = self.mapping_selection(request)
+        except IncorrectLookupParameters:
+            request.session.pop('map_selection', None)
+            self.message_user(
+                request, "The selected filters are no longer valid. Please select the items again.", level=messages.ERROR
+            )
+            return redirect('..')
+        if selected is None:
             self.message_user(request, "No items selected.", level=messages.WARNING)
             return redirect('..')
 
@@ -264,12 +362,14 @@ class BaselineAdminMixin:
             form = CampaignSelectForm(request.POST)
             if form.is_valid():
                 campaign = form.cleaned_data['campaign']
-                for obj_id in selected_ids:
-                    self.mapping_model.objects.get_or_create(
-                        **{self.mapping_fk_name: obj_id, 'campaign': campaign}
-                    )
-                self.message_user(request, f"Mapped {len(selected_ids)} items to '{campaign.name}'.", level=messages.SUCCESS)
-                request.session.pop('map_object_ids', None)
+                total = selected.count()
+                created = map_to_campaign(self.mapping_model, self.mapping_fk_name, selected, campaign)
+                self.message_user(
+                    request,
+                    f"Mapped {total} items to '{campaign.name}' ({created} new, {total - created} already mapped).",
+                    level=messages.SUCCESS,
+                )
+                request.session.pop('map_selection', None)
                 return redirect('../')
         else:
             form = CampaignSelectForm()
@@ -278,7 +378,7 @@ class BaselineAdminMixin:
             self.admin_site.each_context(request),
             title="Map to Campaign",
             form=form,
-            selected_count=len(selected_ids),
+            selected_count=selected.count(),
         )
         return render(request, "admin/map_to_campaign.html", context)
 
@@ -300,6 +400,10 @@ class ProductMappingInline(admin.TabularInline):
     verbose_name = "Product"
     verbose_name_plural = "Products"
 
+    def get_queryset(self, request):
+        # product_name and Product_Mapping.__str__ read the product for every row
+        return super().get_queryset(request).select_related('ga_product')
+
     def product_name(self, obj):
         return obj.ga_product.item_name
     product_name.short_description = "Product"
@@ -317,6 +421,9 @@ class PageMappingInline(admin.TabularInline):
     verbose_name = "Page"
     verbose_name_plural = "Pages"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ga_page')
+
     def page_url(self, obj):
         return obj.ga_page.url
     page_url.short_description = "Page"
@@ -353,6 +460,7 @@ class CampaignAdmin(admin.ModelAdmin):
     list_display = ['name', 'client']
     search_fields = ['name']
     inlines = [ProductMappingInline, PageMappingInline, CommercialInline]
+    query_budgets = {'change': 12}
 
     class Media:
         css = {
@@ -364,7 +472,7 @@ class CampaignAdmin(admin.ModelAdmin):
 class ProductAdmin(BaselineAdminMixin, admin.ModelAdmin):
     list_display = ('item_name', 'client', 'has_baseline', 'export_link')
     search_fields = ('item_name',)
-    list_filter = ('client', MappedToCampaignFilter)
+    list_filter = ('client', MappedToCampaignFilter, HasBaselineFilter)
 
     export_view_name = 'product_export_baseline'
     upload_view_name = 'product_upload_baseline'
@@ -373,19 +481,10 @@ class ProductAdmin(BaselineAdminMixin, admin.ModelAdmin):
     id_field = 'ga_product_id'
     mapping_model = Product_Mapping
     mapping_fk_name = 'ga_product_id'
+    baseline_model = Product_Baseline
+    baseline_fk_name = 'ga_product'
     can_delete = False 
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT ga_product_id FROM product_baselines")
-            self.baseline_ids = {row[0] for row in cursor.fetchall()}
-        return qs
-
-    def has_baseline(self, obj):
-        return "Yes" if obj.ga_product_id in self.baseline_ids else "No"
-    has_baseline.short_description = "Has baseline"
-
     def get_readonly_fields(self, request, obj = ...):
         if obj:
             return['ga_product_id', 'item_id', 'item_name', 'client']
@@ -402,7 +501,7 @@ class ProductAdmin(BaselineAdminMixin, admin.ModelAdmin):
 class PageAdmin(BaselineAdminMixin, admin.ModelAdmin):
     list_display = ('url', 'client', 'has_baseline', 'export_link')
     search_fields = ('url',)
-    list_filter = ('client', PageMappedToCampaignFilter)
+    list_filter = ('client', PageMappedToCampaignFilter, HasBaselineFilter)
 
     export_view_name = 'page_export_baseline'
     upload_view_name = 'page_upload_baseline'
@@ -411,19 +510,10 @@ class PageAdmin(BaselineAdminMixin, admin.ModelAdmin):
     id_field = 'ga_page_id'
     mapping_model = Page_Mapping
     mapping_fk_name = 'ga_page_id'
+    baseline_model = Page_Baseline
+    baseline_fk_name = 'ga_page_id'
     can_delete = False
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT ga_page_id FROM page_baselines")
-            self.baseline_ids = {row[0] for row in cursor.fetchall()}
-        return qs
-
-    def has_baseline(self, obj):
-        return "Yes" if obj.ga_page_id in self.baseline_ids else "No"
-    has_baseline.short_description = "Has baseline"
-
     def get_readonly_fields(self, request, obj = ...):
         if obj:
             return['ga_page_id', 'url', 'client']
@@ -443,6 +533,8 @@ class PageAdmin(BaselineAdminMixin, admin.ModelAdmin):
 @admin.register(Commercial)
 class CommercialAdmin(admin.ModelAdmin):
     list_display = ['clearcast_commercial_title', 'campaign', 'web_address']
+    # campaign is nullable, which the admin's automatic select_related doesn't follow
+    list_select_related = ['campaign']
     search_fields = ['clearcast_commercial_title']
     list_filter = [CommercialMappedToCampaignFilter]
 
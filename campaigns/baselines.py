@@ -0,0 +1,196 @@
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+
+BASELINE_COLUMNS = ['day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales']
+
+# Kind of the artifact a validated baseline upload is staged as
+BASELINE_ARTIFACT = 'baseline'
+
+BATCH_SIZE = 5000
+
+# The CSV rows go over once as arrays and are crossed with the entity ids in the database
+UNNEST_INSERT_SQL = """
+    INSERT INTO {table} ({id_field}, day_of_week, hour_of_day, baseline_session, baseline_sales)
+    SELECT e.entity_id, r.day_of_week, r.hour_of_day, r.baseline_session, r.baseline_sales
+    FROM unnest(%s::bigint[]) AS e(entity_id)
+    CROSS JOIN unnest(%s::text[], %s::integer[], %s::double precision[], %s::double precision[])
+        AS r(day_of_week, hour_of_day, baseline_session, baseline_sales)
+"""
+
+# Updates rows whose values changed and inserts keys that aren't stored yet, in one
+# statement. Rows already holding the incoming values are left alone.
+UNNEST_UPSERT_SQL = """
+    WITH incoming AS (
+        SELECT e.entity_id, r.day_of_week, r.hour_of_day, r.baseline_session, r.baseline_sales
+        FROM unnest(%s::bigint[]) AS e(entity_id)
+        CROSS JOIN unnest(%s::text[], %s::integer[], %s::double precision[], %s::double precision[])
+            AS r(day_of_week, hour_of_day, baseline_session, baseline_sales)
+    ),
+    updated AS (
+        UPDATE {table} AS t
+        SET baseline_session = i.baseline_session, baseline_sales = i.baseline_sales
+        FROM incoming AS i
+        WHERE t.{id_field} = i.entity_id
+          AND t.day_of_week = i.day_of_week
+          AND t.hour_of_day = i.hour_of_day
+          AND (t.baseline_session IS DISTINCT FROM i.baseline_session
+               OR t.baseline_sales IS DISTINCT FROM i.baseline_sales)
+        RETURNING t.{id_field}, t.day_of_week, t.hour_of_day
+    ),
+    inserted AS (
+        INSERT INTO {table} ({id_field}, day_of_week, hour_of_day, baseline_session, baseline_sales)
+        SELECT i.entity_id, i.day_of_week, i.hour_of_day, i.baseline_session, i.baseline_sales
+        FROM incoming AS i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} AS t
+            WHERE t.{id_field} = i.entity_id
+              AND t.day_of_week = i.day_of_week
+              AND t.hour_of_day = i.hour_of_day
+        )
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM incoming),
+        (SELECT count(*) FROM (SELECT DISTINCT * FROM updated) AS keys),
+        (SELECT count(*) FROM inserted)
+"""
+
+
+@dataclass
+class UpsertResult:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def dedupe_rows(frame):
+    """Keep the last row for each (day_of_week, hour_of_day), as an upsert would."""
+    return frame.drop_duplicates(['day_of_week', 'hour_of_day'], keep='last')
+
+
+def baseline_columns(frame):
+    """
+    Validated baseline rows (a DataFrame with BASELINE_COLUMNS, e.g. the staged
+    upload) as typed column lists, read straight from the columns.
+    """
+    return (
+        frame['day_of_week'].astype(str).tolist(),
+        frame['hour_of_day'].astype('int64').tolist(),
+        frame['baseline_session'].astype('float64').tolist(),
+        frame['baseline_sales'].astype('float64').tolist(),
+    )
+
+
+def insert_baselines(table, id_field, entity_ids, frame):
+    """
+    Insert every baseline row in frame for every entity id into table, in one
+    transaction. Returns the number of rows written.
+    """
+    entity_ids = [int(entity_id) for entity_id in entity_ids]
+    if not entity_ids or not len(frame):
+        return 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                UNNEST_INSERT_SQL.format(table=table, id_field=id_field),
+                [entity_ids, *baseline_columns(frame)],
+            )
+            return cursor.rowcount
+
+        sql = (
+            f"INSERT INTO {table} ({id_field}, {', '.join(BASELINE_COLUMNS)}) "
+            f"VALUES (%s, %s, %s, %s, %s)"
+        )
+        values = list(zip(*baseline_columns(frame)))
+        count = 0
+        for entity_id in entity_ids:
+            for start in range(0, len(values), BATCH_SIZE):
+                batch = [(entity_id, *row) for row in values[start:start + BATCH_SIZE]]
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        return count
+
+
+def upsert_baselines(table, id_field, entity_ids, frame):
+    """
+    Write the baseline rows in frame keyed on (entity id, day_of_week, hour_of_day):
+    new keys are inserted, keys whose session or sales values differ are
+    updated, and identical rows are not written at all. Re-running the same
+    upload is a no-op. Returns an UpsertResult.
+    """
+    entity_ids = sorted({int(entity_id) for entity_id in entity_ids})
+    frame = dedupe_rows(frame)
+    if not entity_ids or not len(frame):
+        return UpsertResult()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Keep a concurrent upsert from inserting the same keys between our check and insert
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(
+                UNNEST_UPSERT_SQL.format(table=table, id_field=id_field),
+                [entity_ids, *baseline_columns(frame)],
+            )
+            total, updated, inserted = cursor.fetchone()
+            return UpsertResult(inserted=inserted, updated=updated, unchanged=total - inserted - updated)
+
+        return _upsert_rows(cursor, table, id_field, entity_ids, frame)
+
+
+def _upsert_rows(cursor, table, id_field, entity_ids, frame):
+    incoming = list(zip(*baseline_columns(frame)))
+    result = UpsertResult()
+
+    for start in range(0, len(entity_ids), BATCH_SIZE):
+        batch_ids = entity_ids[start:start + BATCH_SIZE]
+        placeholders = ', '.join(['%s'] * len(batch_ids))
+        cursor.execute(
+            f"SELECT {id_field}, {', '.join(BASELINE_COLUMNS)} FROM {table} "
+            f"WHERE {id_field} IN ({placeholders})",
+            batch_ids,
+        )
+        stored = {(entity_id, day, hour): (session, sales) for entity_id, day, hour, session, sales in cursor.fetchall()}
+
+        inserts, updates = [], []
+        for entity_id in batch_ids:
+            for day, hour, session, sales in incoming:
+                current = stored.get((entity_id, day, hour))
+                if current is None:
+                    inserts.append((entity_id, day, hour, session, sales))
+                elif current != (session, sales):
+                    updates.append((session, sales, entity_id, day, hour))
+                else:
+                    result.unchanged += 1
+
+        if inserts:
+            cursor.executemany(
+                f"INSERT INTO {table} ({id_field}, {', '.join(BASELINE_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+                inserts,
+            )
+        if updates:
+            cursor.executemany(
+                f"UPDATE {table} SET baseline_session = %s, baseline_sales = %s "
+                f"WHERE {id_field} = %s AND day_of_week = %s AND hour_of_day = %s",
+                updates,
+            )
+        result.inserted += len(inserts)
+        result.updated += len(updates)
+
+    return result
+
+
+def baseline_export_query(table, id_field, entities):
+    """
+    (sql, params) selecting the baselines of every entity in the entities
+    queryset, one ordered scan grouped by entity id.
+    """
+    subquery, params = entities.order_by().values(id_field).query.sql_with_params()
+    sql = f"""
+        SELECT {id_field}, {', '.join(BASELINE_COLUMNS)}
+        FROM {table}
+        WHERE {id_field} IN ({subquery})
+        ORDER BY {id_field}, day_of_week, hour_of_day
+    """
+    return sql, params
@@ -0,0 +1,41 @@
+from django.db import connection, transaction
+
+# Every selected entity not yet mapped to the campaign gets one mapping row. The
+# mapping tables have no unique key on (entity, campaign), so existing pairs are
+# skipped with NOT EXISTS rather than ON CONFLICT.
+MAP_SQL = """
+    INSERT INTO {table} ({fk_column}, {campaign_column})
+    SELECT e.{pk_column}, %s
+    FROM {entity_table} AS e
+    WHERE e.{pk_column} IN ({entities})
+      AND NOT EXISTS (
+          SELECT 1 FROM {table} AS m
+          WHERE m.{fk_column} = e.{pk_column} AND m.{campaign_column} = %s
+      )
+"""
+
+
+def map_to_campaign(mapping_model, fk_name, entities, campaign):
+    """
+    Map every entity in the entities queryset to campaign with one
+    INSERT ... SELECT, skipping entities already mapped to it. fk_name is the
+    mapping model's entity column attname, e.g. 'ga_product_id'. Returns the
+    number of mappings created.
+    """
+    opts = mapping_model._meta
+    subquery, params = entities.order_by().values_list('pk', flat=True).query.sql_with_params()
+    sql = MAP_SQL.format(
+        table=opts.db_table,
+        fk_column=next(field.column for field in opts.concrete_fields if field.attname == fk_name),
+        campaign_column=opts.get_field('campaign').column,
+        entity_table=entities.model._meta.db_table,
+        pk_column=entities.model._meta.pk.column,
+        entities=subquery,
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Keep a concurrent mapping from inserting the same pairs between our check and insert
+            cursor.execute(f"LOCK TABLE {opts.db_table} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(sql, [campaign.pk, *params, campaign.pk])
+        return cursor.rowcount
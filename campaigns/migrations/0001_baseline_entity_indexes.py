@@ -0,0 +1,148 @@
+from django.db import migrations, models
+
+# product_baselines and page_baselines are not managed by Django, so the indexes
+# are created directly. They lead with the entity id, which serves the admin's
+# "has baseline" EXISTS check as well as per-entity exports and upserts.
+# On PostgreSQL they are built CONCURRENTLY to avoid locking the tables.
+
+INDEXES = [
+    ('product_baselines_entity_idx', 'product_baselines', 'ga_product_id'),
+    ('page_baselines_entity_idx', 'page_baselines', 'ga_page_id'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for name, table, id_field in INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({id_field}, day_of_week, hour_of_day)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    initial = True
+    atomic = False
+
+    dependencies = []
+
+    operations = [
+        # State only: every campaigns model is unmanaged, so these create no tables
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('campaign_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'sr_campaigns',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('client_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('daily_activity_start_time', models.TimeField()),
+                ('daily_activity_end_time', models.TimeField()),
+                ('attribution_window_duration', models.IntegerField()),
+                ('ga4_filename', models.CharField(max_length=200)),
+                ('start_date', models.DateField()),
+            ],
+            options={
+                'db_table': 'sr_clients',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Commercial',
+            fields=[
+                ('commercial_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('advertiser_id', models.BigIntegerField()),
+                ('clearcast_commercial_title', models.CharField()),
+                ('commercial_number', models.CharField()),
+                ('web_address', models.CharField()),
+            ],
+            options={
+                'db_table': 'sr_commercials',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Page',
+            fields=[
+                ('ga_page_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('url', models.CharField()),
+            ],
+            options={
+                'db_table': 'ga_pages',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Page_Baseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.CharField(max_length=3)),
+                ('hour_of_day', models.IntegerField()),
+                ('baseline_session', models.FloatField()),
+                ('baseline_sales', models.FloatField()),
+            ],
+            options={
+                'db_table': 'page_baselines',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Page_Mapping',
+            fields=[
+                ('map_id', models.BigAutoField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'sr_page_mappings',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('ga_product_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_id', models.CharField()),
+                ('item_name', models.CharField()),
+            ],
+            options={
+                'db_table': 'ga_products',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Product_Baseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.CharField(max_length=3)),
+                ('hour_of_day', models.IntegerField()),
+                ('baseline_session', models.FloatField()),
+                ('baseline_sales', models.FloatField()),
+            ],
+            options={
+                'db_table': 'product_baselines',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Product_Mapping',
+            fields=[
+                ('map_id', models.BigAutoField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'sr_product_mappings',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,3 +1,279 @@
+import csv
+import datetime
+import gzip
+import io
+import zipfile
+from contextlib import nullcontext
+from unittest import mock
+
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from SR import exports
+
+from .baselines import UpsertResult, insert_baselines, upsert_baselines
+from .models import Campaign, Client, Product, Product_Baseline, Product_Mapping
+
+
+class MapToCampaignTests(TestCase):
+    """The map-to-campaign action, for explicit ids and for "select all" across a filtered changelist."""
+
+    changelist_url = '/admin/campaigns/product/'
+    map_url = '/admin/campaigns/product/map-to-campaign/'
+
+    @classmethod
+    def setUpTestData(cls):
+        clients = Client.objects.bulk_create([
+            Client(
+                name=f"Client {i}", daily_activity_start_time=datetime.time(6), daily_activity_end_time=datetime.time(23),
+                attribution_window_duration=10, ga4_filename=f'client{i}.csv', start_date=datetime.date(2025, 1, 1),
+            )
+            for i in range(2)
+        ])
+        cls.client_a, cls.client_b = clients
+        Product.objects.bulk_create([
+            Product(client=clients[i % 2], ga_product_id=i, item_id=f"item-{i}", item_name=f"Product {i}")
+            for i in range(20)
+        ])
+        cls.campaign, cls.other = Campaign.objects.bulk_create(
+            [Campaign(client=cls.client_a, name="Campaign"), Campaign(client=cls.client_a, name="Other")]
+        )
+        # Already mapped, so "Mapped to campaign: No" leaves them out
+        Product_Mapping.objects.bulk_create(
+            [Product_Mapping(ga_product_id=pk, campaign=cls.other) for pk in (0, 2)]
+        )
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def select_across(self, query):
+        return self.client.post(self.changelist_url + query, {
+            'action': 'map_to_campaign_action', '_selected_action': [1], 'select_across': '1',
+        })
+
+    def test_select_across_maps_every_filtered_product(self):
+        query = f'?client__client_id__exact={self.client_a.pk}&mapped=no'
+        expected = set(Product.objects.filter(client=self.client_a).exclude(ga_product_id__in=[0, 2]).values_list('pk', flat=True))
+        self.assertEqual(len(expected), 8)
+
+        response = self.select_across(query)
+        self.assertRedirects(response, self.map_url)
+        self.assertEqual(self.client.session['map_selection'], {'filters': query[1:]})
+
+        # The selection is rebuilt from the filters without the changelist's
+        # result and full-table counts: the selected count is the only product query
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.map_url)
+        self.assertEqual(response.context['selected_count'], len(expected))
+        product_queries = [q['sql'] for q in queries if 'FROM "ga_products"' in q['sql']]
+        self.assertEqual(len(product_queries), 1, product_queries)
+
+        response = self.client.post(self.map_url, {'campaign': self.campaign.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(Product_Mapping.objects.filter(campaign=self.campaign).values_list('ga_product_id', flat=True)), expected
+        )
+        self.assertNotIn('map_selection', self.client.session)
+
+    def test_explicit_ids_are_mapped(self):
+        self.client.post(self.changelist_url, {'action': 'map_to_campaign_action', '_selected_action': [1, 3]})
+        self.client.post(self.map_url, {'campaign': self.campaign.pk})
+        self.assertEqual(
+            sorted(Product_Mapping.objects.filter(campaign=self.campaign).values_list('ga_product_id', flat=True)), [1, 3]
+        )
+
+    def test_invalid_saved_filters_show_a_message(self):
+        session = self.client.session
+        session['map_selection'] = {'filters': 'client__client_id__exact=not-a-number'}
+        session.save()
+
+        response = self.client.get(self.map_url, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "The selected filters are no longer valid. Please select the items again.",
+            [str(message) for message in response.context['messages']],
+        )
+        self.assertNotIn('map_selection', self.client.session)
+        self.assertFalse(Product_Mapping.objects.filter(campaign=self.campaign).exists())
+
+
+def baseline_frame(rows):
+    return pd.DataFrame(rows, columns=['day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales'])
+
+
+class BaselineWriteTests(TestCase):
+    """insert_baselines and upsert_baselines, on PostgreSQL and on the executemany fallback."""
+
+    table = 'product_baselines'
+    id_field = 'ga_product_id'
+    # Every test runs once per path; the fallback is what any other backend gets
+    vendors = ('postgresql', 'sqlite')
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            name="Client", daily_activity_start_time=datetime.time(6), daily_activity_end_time=datetime.time(23),
+            attribution_window_duration=10, ga4_filename='client.csv', start_date=datetime.date(2025, 1, 1),
+        )
+        Product.objects.bulk_create([
+            Product(client=client, ga_product_id=i, item_id=f"item-{i}", item_name=f"Product {i}") for i in (1, 2, 3)
+        ])
+
+    def on(self, vendor):
+        if vendor == 'postgresql':
+            return nullcontext()
+        return mock.patch.object(connection, 'vendor', vendor)
+
+    def write(self, vendor, function, entity_ids, rows):
+        with self.on(vendor), CaptureQueriesContext(connection) as queries:
+            result = function(self.table, self.id_field, entity_ids, baseline_frame(rows))
+        if vendor != 'postgresql':
+            self.assertFalse([q['sql'] for q in queries if 'unnest' in q['sql'] or 'LOCK TABLE' in q['sql']])
+        return result
+
+    def stored(self):
+        return sorted(Product_Baseline.objects.values_list(
+            'ga_product_id', 'day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales',
+        ))
+
+    def test_insert_writes_every_row_for_every_entity(self):
+        rows = [('Mon', 0, 1.5, 2.0), ('Mon', 1, 3.0, 0.0), ('Tue', 23, 0.25, 7.0)]
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                Product_Baseline.objects.all().delete()
+                self.assertEqual(self.write(vendor, insert_baselines, [1, 2], rows), 6)
+                self.assertEqual(self.stored(), sorted((pk, *row) for pk in (1, 2) for row in rows))
+                self.assertEqual(self.write(vendor, insert_baselines, [], rows), 0)
+
+    def test_identical_upload_changes_nothing(self):
+        rows = [('Mon', 0, 1.5, 2.0), ('Mon', 1, 3.0, 0.0), ('Tue', 23, 0.25, 7.0)]
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                Product_Baseline.objects.all().delete()
+                self.assertEqual(self.write(vendor, upsert_baselines, [1, 2], rows), UpsertResult(inserted=6))
+                ids = sorted(Product_Baseline.objects.values_list('pk', flat=True))
+
+                self.assertEqual(self.write(vendor, upsert_baselines, [2, 1, 2], rows), UpsertResult(unchanged=6))
+                self.assertEqual(sorted(Product_Baseline.objects.values_list('pk', flat=True)), ids)
+
+    def test_changed_rows_are_updated_not_duplicated(self):
+        results = {}
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                Product_Baseline.objects.all().delete()
+                self.write(vendor, upsert_baselines, [1, 2], [('Mon', 0, 1.5, 2.0), ('Mon', 1, 3.0, 0.0)])
+
+                results[vendor] = self.write(vendor, upsert_baselines, [1, 2, 3], [
+                    ('Mon', 0, 1.5, 2.0),       # unchanged for 1 and 2, new for 3
+                    ('Mon', 1, 9.0, 0.0),       # superseded by the next row
+                    ('Mon', 1, 3.0, 4.0),       # sales changed for 1 and 2
+                    ('Sun', 12, 0.5, 0.5),      # new everywhere
+                ])
+                self.assertEqual(results[vendor], UpsertResult(inserted=5, updated=2, unchanged=2))
+                self.assertEqual(self.stored(), sorted(
+                    (pk, *row) for pk in (1, 2, 3)
+                    for row in [('Mon', 0, 1.5, 2.0), ('Mon', 1, 3.0, 4.0), ('Sun', 12, 0.5, 0.5)]
+                ))
+
+        self.assertEqual(results['sqlite'], results['postgresql'])
+
+
+class BaselineExportTests(TestCase):
+    """Baseline CSV exports, streamed through COPY and through the cursor fallback."""
+
+    vendors = ('postgresql', 'sqlite')
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            name="Client", daily_activity_start_time=datetime.time(6), daily_activity_end_time=datetime.time(23),
+            attribution_window_duration=10, ga4_filename='client.csv', start_date=datetime.date(2025, 1, 1),
+        )
+        Product.objects.bulk_create([
+            Product(client=client, ga_product_id=i, item_id=f"item-{i}", item_name=f"Product {i}") for i in (1, 2, 3)
+        ])
+        # Stored out of key order; product 3 has no baseline
+        Product_Baseline.objects.bulk_create([
+            Product_Baseline(ga_product_id=pk, day_of_week=day, hour_of_day=hour, baseline_session=pk * session, baseline_sales=0.5)
+            for pk in (2, 1) for day, hour, session in [('Tue', 3, 1.0), ('Mon', 23, 2.5), ('Mon', 4, 0.0)]
+        ])
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def stored(self, pk):
+        return [
+            list(row) for row in Product_Baseline.objects.filter(ga_product_id=pk)
+            .order_by('day_of_week', 'hour_of_day')
+            .values_list('day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales')
+        ]
+
+    def read(self, response, vendor):
+        """The streamed body; the query only runs as it is read."""
+        self.assertTrue(response.streaming)
+        unused = exports._copy_chunks if vendor != 'postgresql' else exports._cursor_chunks
+        with mock.patch.object(connection, 'vendor', vendor), \
+                mock.patch.object(exports, unused.__name__, side_effect=AssertionError(f"{unused.__name__} used")):
+            return b''.join(response.streaming_content)
+
+    def read_csv(self, body, types=(str, int, float, float)):
+        # COPY and csv.writer format floats differently, so compare values
+        header, *rows = csv.reader(io.StringIO(body.decode()))
+        return header, [[convert(value) for convert, value in zip(types, row)] for row in rows]
+
+    def test_single_export_matches_the_stored_rows(self):
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                response = self.client.get('/admin/campaigns/product/1/export-baseline/')
+                self.assertEqual(response['Content-Type'], 'text/csv')
+                self.assertIn('filename="1_baseline.csv"', response['Content-Disposition'])
+                header, rows = self.read_csv(self.read(response, vendor))
+                self.assertEqual(header, ['day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales'])
+                self.assertEqual(rows, self.stored(1))
+
+                response = self.client.get('/admin/campaigns/product/3/export-baseline/')
+                self.assertEqual(self.read_csv(self.read(response, vendor))[1], [])
+
+    def test_gzip_export_holds_the_same_csv(self):
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                plain = self.read(self.client.get('/admin/campaigns/product/2/export-baseline/'), vendor)
+                response = self.client.get('/admin/campaigns/product/2/export-baseline/?gzip=1')
+                self.assertEqual(response['Content-Type'], 'application/gzip')
+                self.assertIn('filename="2_baseline.csv.gz"', response['Content-Disposition'])
+                self.assertEqual(gzip.decompress(self.read(response, vendor)), plain)
+                self.assertEqual(self.read_csv(plain)[1], self.stored(2))
+
+    def export_action(self, action, ids):
+        return self.client.post('/admin/campaigns/product/', {'action': action, '_selected_action': ids})
+
+    def test_bulk_csv_holds_every_selected_baseline(self):
+        for vendor in self.vendors:
+            with self.subTest(vendor=vendor):
+                response = self.export_action('export_baselines_csv_action', [3, 2, 1])
+                self.assertIn('filename="product_baselines.csv"', response['Content-Disposition'])
+                header, rows = self.read_csv(self.read(response, vendor), types=(int, str, int, float, float))
+                self.assertEqual(header, ['ga_product_id', 'day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales'])
+                self.assertEqual(rows, [[pk] + row for pk in (1, 2) for row in self.stored(pk)])
+
+                response = self.export_action('export_baselines_csv_action', [2])
+                _, rows = self.read_csv(self.read(response, vendor), types=(int, str, int, float, float))
+                self.assertEqual(rows, [[2] + row for row in self.stored(2)])
 
-# Create your tests here.
+    def test_bulk_zip_holds_one_csv_per_entity_with_a_baseline(self):
+        response = self.export_action('export_baselines_zip_action', [3, 2, 1])
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('filename="product_baselines.zip"', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ['1_baseline.csv', '2_baseline.csv'])
+            for pk in (1, 2):
+                header, rows = self.read_csv(archive.read(f'{pk}_baseline.csv'))
+                self.assertEqual(header, ['day_of_week', 'hour_of_day', 'baseline_session', 'baseline_sales'])
+                self.assertEqual(rows, self.stored(pk))
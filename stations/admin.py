@@ -1,18 +1,27 @@
 from django.contrib import admin, messages
-from django.urls import path
-from django.shortcuts import render, redirect
-from django.http import HttpResponse
-from django.db import connection, transaction
+from django.urls import path, reverse
+from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import JsonResponse, StreamingHttpResponse
 import csv
-import pandas as pd
-import math
-from io import TextIOWrapper
-from datetime import timedelta
+import itertools
 from django.utils.html import format_html
-from django.utils.safestring import mark_safe
-from datetime import datetime
 
-from .models import Pricing_Sheet, Station_Pricing, Sales_House, Station, Hour, Duration, Break
+from .models import Pricing_Sheet, Station_Pricing, Break, Pricing_Job, Pricing_Run
+from .diagnostics import break_coverage, reason_summary
+from .jobs import enqueue_pricing_jobs, retry_job
+from .sheet_loads import load_sheets
+from .uploads import (
+    PricingUploadError, discard_pricing_upload, load_pricing_upload, split_pricing_upload, stage_pricing_upload,
+    staged_price_dates,
+)
+from .reference import get_reference_data
+from .windows import get_pricing_windows
+from SR.exports import Echo, csv_download, query_csv_chunks
+from SR.large_tables import DateRangeFilter, LargeTableAdminMixin
+from .bulk_pricing import assign_prices_bulk
+from .pricing import assign_prices
+from .sql_pricing import assign_prices_in_db
 
 
 @admin.register(Pricing_Sheet)
@@ -20,121 +29,38 @@ class PricingSheetAdmin(admin.ModelAdmin):
     list_display = ['price_date', 'note']
     change_list_template = "admin/pricing_sheet_changelist.html"
 
+    # 'python' matches breaks in-process, 'bulk' resolves the whole window with
+    # pandas joins, 'database' runs one set-based UPDATE (PostgreSQL only, other
+    # backends fall back to the Python matcher)
+    pricing_mode = 'python'
+
+    # Price dates in one upload are loaded and repriced concurrently, this many at a time
+    upload_workers = 4
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('export-csv/', self.admin_site.admin_view(self.export_csv_view), name="export_pricing_csv"),
             path('upload-csv/', self.admin_site.admin_view(self.upload_csv_view), name="upload_pricing_csv"),
             path('insert-csv/', self.admin_site.admin_view(self.insert_csv_view), name="insert_pricing_csv"),
+            path('jobs/<int:job_id>/', self.admin_site.admin_view(self.job_progress_view), name="pricing_job_progress"),
+            path('jobs/<int:job_id>/status/', self.admin_site.admin_view(self.job_status_view), name="pricing_job_status"),
+            path('runs/<int:run_id>/unmatched/', self.admin_site.admin_view(self.unmatched_breaks_view), name="pricing_run_unmatched"),
+            path('runs/<int:run_id>/unmatched/csv/', self.admin_site.admin_view(self.unmatched_breaks_csv_view), name="pricing_run_unmatched_csv"),
         ]
         return custom_urls + urls
     
     def get_breaks_in_pricing_window(self, price_date):
-        # Step 1: Find the next pricing sheet, if any
-        next_sheet = Pricing_Sheet.objects.filter(price_date__gt=price_date).order_by('price_date').first()
-
-        # Step 2: Determine pricing window end date
-        if next_sheet:
-            pricing_end_date = next_sheet.price_date - timedelta(days=1)
-        else:
-            pricing_end_date = None  # No end date — use open-ended range
-
-        # Step 3: Filter breaks by date range using standard_datetime
-        breaks = Break.objects.filter(standard_datetime__date__gte=price_date)
-
-        if pricing_end_date:
-            breaks = breaks.filter(standard_datetime__date__lte=pricing_end_date)
-
-        return breaks
+        # The window runs from this sheet's date up to the next sheet's date (open-ended
+        # for the latest sheet), queried as a plain standard_datetime range
+        return get_pricing_windows().window(price_date).breaks()
 
     def assign_prices_to_breaks(self, price_date, breaks):
-        errors = []
-
-        print("Price date: ", {price_date})
-
-        # Step 1: Get all pricing rows for the date
-        pricing_qs = (
-            Station_Pricing.objects
-            .filter(price_date=price_date)
-            .select_related('station')  # required
-            .prefetch_related('sales_house', 'start_hour', 'end_hour', 'duration')  # optional
-            .order_by('-price_id')  # bottom-up priority
-        )
-
-        print(pricing_qs.query)
-        pricing_station_ids = list({pr.station_id for pr in pricing_qs})
-        print(f"Station IDs available in pricing_qs: {pricing_station_ids}")
-
-        matched_breaks = []
-
-        for br in breaks:
-            break_hour = br.standard_datetime.hour
-            station_id = br.station_id
-            sales_house_id = br.sales_house_id
-            duration_val = br.spot_duration
-            matched_price = None
-            fail_reason = "Unknown mismatch"
-
-            print(f"\n--- Matching break_id={br.break_id} ---")
-            print(f"Break station_id={station_id}")
-
-            # Instead of looking in a dict, filter directly from pricing_qs
-            station_prices = [
-                pr for pr in pricing_qs
-                if pr.station_id == station_id
-            ]
-
-            if not station_prices:
-                fail_reason = "No station pricing rows"
-            else:
-                sales_house_matches = [
-                    pr for pr in station_prices
-                    if pr.sales_house_id is None or pr.sales_house_id == sales_house_id
-                ]
-                if not sales_house_matches:
-                    fail_reason = "Sales house mismatch"
-                else:
-                    duration_matches = [
-                        pr for pr in sales_house_matches
-                        if pr.duration_id is None or pr.duration.duration_seconds == duration_val
-                    ]
-                    if not duration_matches:
-                        fail_reason = "Duration mismatch"
-                    else:
-                        hour_matches = []
-                        for pr in duration_matches:
-                            if pr.start_hour_id is None or pr.end_hour_id is None:
-                                hour_matches.append(pr)
-                            else:
-                                start_h = pr.start_hour.hour
-                                end_h = pr.end_hour.hour
-                                if start_h <= break_hour < end_h:
-                                    hour_matches.append(pr)
-
-                        if not hour_matches:
-                            fail_reason = "Hour mismatch"
-                        else:
-                            matched_price = hour_matches[0]  # priority preserved
-
-            if matched_price:
-                br.price_id = matched_price.price_id
-                matched_breaks.append(br)
-            else:
-                errors.append({
-                    'break_id': br.break_id,
-                    'station': br.station.station_name if br.station else None,
-                    'datetime': br.standard_datetime,
-                    'sales_house': br.sales_house.sales_house_name if br.sales_house else None,
-                    'duration': br.spot_duration,
-                    'reason': fail_reason
-                })
-
-        if not errors:
-            with transaction.atomic():
-                Break.objects.bulk_update(matched_breaks, ['price_id'])
-            return True, []
-
-        return False, errors
+        if self.pricing_mode == 'database':
+            return assign_prices_in_db(price_date, breaks)
+        if self.pricing_mode == 'bulk':
+            return assign_prices_bulk(price_date, breaks)
+        return assign_prices(price_date, breaks)
 
 
     def export_csv_view(self, request):
@@ -157,25 +83,19 @@ class PricingSheetAdmin(admin.ModelAdmin):
                 LEFT JOIN sr_exclusive.hours eh ON eh.hour = sp.end_hour
                 LEFT JOIN sr_exclusive.sr_sales_houses shs ON shs.sales_house_id = sp.sales_house_id
                 WHERE sp.price_date = %s
-                ORDER BY sp.price_id;
+                ORDER BY sp.price_id
             """
-
-            with connection.cursor() as cursor:
-                cursor.execute(sql, [selected_date])
-                rows = cursor.fetchall()
-
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="station_prices_{selected_date}.csv"'
-
-            writer = csv.writer(response)
-            writer.writerow([
+            header = [
                 'price_date', 'station_name', 'start_hour', 'end_hour',
                 'duration', 'sales_house_name', 'cost_type', 'cost'
-            ])
-            for row in rows:
-                writer.writerow(row)
+            ]
 
-            return response
+            # Rows are streamed from the database as the response is sent
+            return csv_download(
+                query_csv_chunks(sql, [selected_date], header),
+                f"station_prices_{selected_date}.csv",
+                compress=bool(request.POST.get('gzip')),
+            )
 
         # Show the dropdown form
         all_dates = Pricing_Sheet.objects.values_list('price_date', flat=True).order_by('-price_date')
@@ -195,223 +115,102 @@ class PricingSheetAdmin(admin.ModelAdmin):
                 return redirect("admin:upload_pricing_csv")
 
             try:
-                df = pd.read_csv(TextIOWrapper(uploaded_file.file, encoding='utf-8'))
-
-                # Replace blank strings or NaN with None (Python's null equivalent)
-                df = df.replace(r'^\s*$', None, regex=True)
-
-                # === ✅ Expected Columns ===
-                expected_columns = {
-                    'price_date', 'station_name', 'start_hour', 'end_hour',
-                    'duration', 'sales_house_name', 'cost_type', 'cost'
-                }
-
-                if not expected_columns.issubset(set(df.columns)):
-                    missing = expected_columns - set(df.columns)
-                    messages.error(request, f"Missing required columns: {', '.join(missing)}")
-                    return redirect("admin:upload_pricing_csv")
-
-                # === ✅ Required Field Check ===
-                required_fields = ['price_date', 'station_name', 'cost_type', 'cost']
-                missing_required = df[required_fields].isnull().any()
-                if missing_required.any():
-                    missing_cols = missing_required[missing_required == True].index.tolist()
-                    messages.error(request, f"Missing required values in columns: {', '.join(missing_cols)}")
-                    return redirect("admin:upload_pricing_csv")
-
-                # === ✅ Duration Check ===
-                valid_durations = set(Duration.objects.values_list('duration_seconds', flat=True))
-
-                non_null_durations=df['duration'].dropna()
-                unknown_durations = set(non_null_durations) - valid_durations
-
-                if unknown_durations:
-                    messages.error(request, f"Unknown duration values: {', '.join(map(str, unknown_durations))}")
-                    return redirect("admin:upload_pricing_csv")
-
-                # === ✅ Parse and validate price_date column ===
-                try:
-                    df['price_date'] = pd.to_datetime(df['price_date'], dayfirst=True, errors='coerce')
-                    if df['price_date'].isnull().any():
-                        messages.error(request, "One or more rows have invalid date formats. Please use DD/MM/YYYY or YYYY-MM-DD.")
-                        return redirect("admin:upload_pricing_csv")
-
-                    # Standardize to YYYY-MM-DD for matching
-                    df['price_date'] = df['price_date'].dt.strftime('%Y-%m-%d')
-                except Exception as e:
-                    messages.error(request, f"Failed to parse dates: {str(e)}")
-                    return redirect("admin:upload_pricing_csv")
-                
-                # === ✅ Station Name Check ===
-                known_stations = dict(Station.objects.values_list('station_name', 'station_id'))
-                df['station_id'] = df['station_name'].map(known_stations)
-                if df['station_id'].isnull().any():
-                    unknown_stations = df[df['station_id'].isnull()]['station_name'].unique()
-                    station_list = Station.objects.values_list('station_name', flat=True).order_by('station_name')
-                    messages.error(
-                        request,
-                        f"Unknown station name(s): {', '.join(unknown_stations)}"
-                    )
-
-                    return redirect("admin:upload_pricing_csv")
-
-
-                # === ✅ Sales House Name Check ===
-                known_sales_houses = dict(Sales_House.objects.values_list('sales_house_name', 'sales_house_id'))
-
-                # Only map non-null values
-                df['sales_house_id'] = df['sales_house_name'].apply(
-                    lambda x: known_sales_houses.get(x) if pd.notnull(x) else None
-                )
-
-                # Check only non-null entries for failed mapping
-                invalid_sales_house_rows = df[
-                    df['sales_house_name'].notna() & df['sales_house_id'].isna()
-                ]
-
-                if not invalid_sales_house_rows.empty:
-                    unknown_sales = invalid_sales_house_rows['sales_house_name'].unique()
-                    messages.error(request, f"Unknown sales house names: {', '.join(unknown_sales)}")
-                    return redirect("admin:upload_pricing_csv")
-
-
-                # === ✅ Start/End Hour Check ===
-                valid_hours = set(Hour.objects.values_list('hour', flat=True))
-
-                invalid_start_hours = set(df['start_hour'].dropna()) - valid_hours
-                invalid_end_hours = set(df['end_hour'].dropna()) - valid_hours
-                invalid_hours = invalid_start_hours.union(invalid_end_hours)
-
-                if invalid_hours:
-                    messages.error(request, f"Unknown hour values: {', '.join(map(str, invalid_hours))}")
-                    return redirect("admin:upload_pricing_csv")
-
-
-                # === ✅ Save cleaned version for insertion ===
-                cleaned_data = df[[
-                    'price_date', 'station_id', 'start_hour', 'end_hour',
-                    'duration', 'sales_house_id', 'cost_type', 'cost'
-                ]].to_dict(orient='records')
-
-
-                request.session['validated_station_pricing'] = cleaned_data
-                messages.success(request, f"Successfully validated {len(cleaned_data)} rows. Ready to insert.")
+                # === ✅ Validate in chunks and stage valid rows server-side ===
+                token, row_count = stage_pricing_upload(uploaded_file.file)
+            except PricingUploadError as e:
+                messages.error(request, str(e))
                 return redirect("admin:upload_pricing_csv")
-
             except Exception as e:
                 messages.error(request, f"An error occurred while processing the CSV: {str(e)}")
                 return redirect("admin:upload_pricing_csv")
 
+            # === ✅ Keep only the token in the session ===
+            previous_token = request.session.get('pricing_upload_token')
+            if previous_token:
+                discard_pricing_upload(previous_token)
+            request.session['pricing_upload_token'] = token
+            dates = staged_price_dates(token)
+            messages.success(
+                request,
+                f"Successfully validated {row_count} rows"
+                + (f" across {len(dates)} price dates ({', '.join(dates)})" if len(dates) > 1 else "")
+                + ". Ready to insert."
+            )
+            return redirect("admin:upload_pricing_csv")
+
         return render(request, "admin/upload_csv_form.html", {})
 
 
+    def build_price_instance(self, row):
+        return Station_Pricing(
+            price_date_id=row['price_date'],
+            station_id=row['station_id'],
+            start_hour_id=int(row.get('start_hour')) if row.get('start_hour') is not None else None,
+            end_hour_id=int(row.get('end_hour')) if row.get('end_hour') is not None else None,
+            duration_id=int(row.get('duration')) if row.get('duration') is not None else None,
+            sales_house_id=row.get('sales_house_id') if row.get('sales_house_id') is not None else None,
+            cost_type=row['cost_type'],
+            cost=row['cost']
+        )
+
     def insert_csv_view(self, request):
         if request.method != "POST":
             messages.error(request, "Invalid request method.")
             return redirect("admin:upload_pricing_csv")
 
-        validated_data = request.session.get("validated_station_pricing")
+        token = request.session.get("pricing_upload_token")
 
-        if not validated_data:
+        if not token:
             messages.error(request, "No validated data available. Please upload and validate a CSV first.")
             return redirect("admin:upload_pricing_csv")
 
+        incremental = request.POST.get('mode') == 'incremental'
         try:
-            # === ✅ Convert NaN to None for nullable fields ===
-            for row in validated_data:
-                for field in ['start_hour', 'end_hour', 'duration', 'sales_house_id']:
-                    if pd.isna(row.get(field)):
-                        row[field] = None
-
-            # === ✅ Extract the single price_date for this batch ===
-            price_date = validated_data[0]['price_date']
-
-            # ✅ Delete existing rows for that date
-            deleted_count, _ = Station_Pricing.objects.filter(price_date=price_date).delete()
-            self.message_user(request, f"Deleted {deleted_count} existing rows for {price_date}", level=messages.INFO)
-
-            # === ✅ Ensure Pricing_Sheet exists for this date ===
-            _, created = Pricing_Sheet.objects.get_or_create(price_date=price_date)
-
-            if created:
-                messages.info(request, f"Pricing sheet for {price_date} was automatically created.")
-
-            # === ✅ Filter and normalize input rows ===
-            rows_to_insert = []
-            for row in validated_data:
-                rows_to_insert.append(row)
-
-            # === ✅ Build model instances ===
-            instances = [
-                Station_Pricing(
-                    price_date_id=row['price_date'],
-                    station_id=row['station_id'],
-                    start_hour_id=int(row.get('start_hour')) if row.get('start_hour') is not None else None,
-                    end_hour_id=int(row.get('end_hour')) if row.get('end_hour') is not None else None,
-                    duration_id=int(row.get('duration')) if row.get('duration') is not None else None,
-                    sales_house_id=row.get('sales_house_id') if row.get('sales_house_id') is not None else None,
-                    cost_type=row['cost_type'],
-                    cost=row['cost']
-                )
-                for row in rows_to_insert
-            ]
-
-            # === ✅ Insert with transaction ===
-            with transaction.atomic():
-                Station_Pricing.objects.bulk_create(instances, batch_size=1000)
-
-            # === ✅ Clean up and feedback ===
-            del request.session['validated_station_pricing']
-            messages.success(
-                request,
-                f"Inserted {len(instances)} new rows."
-            )
-
-            # === Applying new pricing sheet to breaks===
-            pricing_sheet, created = Pricing_Sheet.objects.get_or_create(price_date=price_date)
-            admin_instance = admin.site._registry[Pricing_Sheet]
-            breaks = admin_instance.get_breaks_in_pricing_window(price_date)
-            messages.info(request, f"{breaks.count()} breaks fall within the pricing window starting {price_date}.")
-
-            # Phase 1: Get breaks in pricing window
-            breaks = self.get_breaks_in_pricing_window(price_date)
-
-            # Phase 2: Assign prices to breaks
-            success, errors = self.assign_prices_to_breaks(price_date, breaks)
-
-            if success:
-                messages.success(request, f"Pricing assigned to {breaks.count()} breaks for {price_date}.")
-            else:
-                # Build HTML table for unmatched breaks
-                table_html = "<table style='border-collapse: collapse; width: 100%;'>"
-                table_html += (
-                    "<tr>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Break ID</th>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Station</th>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Date/Time</th>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Sales House</th>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Duration</th>"
-                    "<th style='border: 1px solid black; padding: 4px;'>Reason</th>"
-                    "</tr>"
-                )
-
-                for err in errors:
-                    table_html += (
-                        "<tr>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['break_id']}</td>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['station']}</td>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['datetime']}</td>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['sales_house'] or ''}</td>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['duration']}</td>"
-                        f"<td style='border: 1px solid black; padding: 4px;'>{err['reason']}</td>"
-                        "</tr>"
+            # === Hand large sheets to the job worker instead of running in this request ===
+            if request.POST.get('background'):
+                jobs = enqueue_pricing_jobs(request.session.pop('pricing_upload_token'), incremental=incremental)
+                for job in jobs:
+                    messages.info(request, f"Queued pricing job {job.job_id} for {job.price_date}.")
+                if len(jobs) == 1:
+                    return redirect("admin:pricing_job_progress", job_id=jobs[0].job_id)
+                return redirect("admin:stations_pricing_job_changelist")
+
+            # === ✅ Split the staged rows into one artifact per price_date ===
+            date_tokens = split_pricing_upload(request.session.pop('pricing_upload_token'))
+            grouped_rows = {price_date: load_pricing_upload(date_token) for price_date, date_token in date_tokens}
+
+            # === ✅ Load and reprice each sheet; dates run side by side in a worker pool ===
+            try:
+                results = load_sheets(self, grouped_rows, incremental=incremental, workers=self.upload_workers)
+            finally:
+                for _, date_token in date_tokens:
+                    discard_pricing_upload(date_token)
+
+            for result in results:
+                for level, text in result.notes:
+                    messages.add_message(request, level, text)
+
+                if result.error:
+                    messages.error(request, f"An error occurred during insertion for {result.price_date}: {result.error}")
+                elif result.success:
+                    messages.success(request, f"Pricing assigned to {result.breaks} breaks for {result.price_date}.")
+                else:
+                    messages.error(
+                        request,
+                        format_html(
+                            '<b>{}: {} breaks could not be matched to any price.</b> <a href="{}">View unmatched breaks</a>',
+                            result.price_date,
+                            result.unmatched,
+                            reverse("admin:pricing_run_unmatched", args=[result.run_id]),
+                        )
                     )
 
-                table_html += "</table>"
-
-                messages.error(
+            if len(results) > 1:
+                failed = [r.price_date for r in results if r.error or not r.success]
+                messages.info(
                     request,
-                    mark_safe(f"<b>{len(errors)} breaks could not be matched to any price:</b><br>{table_html}")
+                    f"Processed {len(results)} price dates: {len(results) - len(failed)} fully priced"
+                    + (f", needing attention: {', '.join(failed)}." if failed else ".")
                 )
 
             return redirect("admin:upload_pricing_csv")
@@ -422,8 +221,258 @@ class PricingSheetAdmin(admin.ModelAdmin):
 
 
 
+    def filtered_unmatched(self, request, run):
+        unmatched = run.unmatched_breaks.all()
+        reason = request.GET.get('reason')
+        station = request.GET.get('station')
+        if reason:
+            unmatched = unmatched.filter(reason=reason)
+        if station:
+            unmatched = unmatched.filter(station_name=station)
+        return unmatched
+
+    def unmatched_breaks_view(self, request, run_id):
+        run = get_object_or_404(Pricing_Run, pk=run_id)
+        unmatched = self.filtered_unmatched(request, run)
+
+        paginator = Paginator(unmatched.order_by('break_id'), 100)
+        page = paginator.get_page(request.GET.get('page'))
+
+        # Keep the active filters on pagination and download links
+        filters = request.GET.copy()
+        filters.pop('page', None)
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title=f"Unmatched breaks for {run}",
+            run=run,
+            page=page,
+            summary=reason_summary(run.unmatched_breaks.all()),
+            stations=run.unmatched_breaks.order_by('station_name').values_list('station_name', flat=True).distinct(),
+            selected_reason=request.GET.get('reason', ''),
+            selected_station=request.GET.get('station', ''),
+            filter_query=filters.urlencode(),
+        )
+        return render(request, "admin/unmatched_breaks.html", context)
+
+    def unmatched_breaks_csv_view(self, request, run_id):
+        run = get_object_or_404(Pricing_Run, pk=run_id)
+        rows = (
+            self.filtered_unmatched(request, run)
+            .order_by('break_id')
+            .values_list('break_id', 'station_name', 'standard_datetime', 'sales_house_name', 'spot_duration', 'reason')
+            .iterator(chunk_size=5000)
+        )
+
+        writer = csv.writer(Echo())
+        header = ['break_id', 'station', 'datetime', 'sales_house', 'duration', 'reason']
+        lines = itertools.chain([writer.writerow(header)], (writer.writerow(row) for row in rows))
+
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="unmatched_breaks_run_{run.run_id}.csv"'
+        return response
+
+    def job_status(self, job):
+        return {
+            'job_id': job.job_id,
+            'price_date': str(job.price_date),
+            'status': job.status,
+            'finished': job.finished,
+            'rows_inserted': job.rows_inserted,
+            'rows_updated': job.rows_updated,
+            'rows_deleted': job.rows_deleted,
+            'breaks_total': job.breaks_total,
+            'breaks_processed': job.breaks_processed,
+            'breaks_priced': job.breaks_priced,
+            'unmatched_count': job.unmatched_count,
+            'unmatched_reasons': job.unmatched_reasons,
+            'unmatched_url': reverse("admin:pricing_run_unmatched", args=[job.run_id]) if job.run_id and job.unmatched_count else None,
+            'message': job.message,
+        }
+
+    def job_status_view(self, request, job_id):
+        job = get_object_or_404(Pricing_Job, pk=job_id)
+        return JsonResponse(self.job_status(job))
+
+    def job_progress_view(self, request, job_id):
+        job = get_object_or_404(Pricing_Job, pk=job_id)
+        context = dict(
+            self.admin_site.each_context(request),
+            title=f"Pricing job {job.job_id}",
+            job=job,
+            status=self.job_status(job),
+        )
+        return render(request, "admin/pricing_job_progress.html", context)
+
+
+@admin.register(Pricing_Job)
+class PricingJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'price_date', 'status', 'rows_inserted', 'breaks_processed', 'unmatched_count', 'created_at', 'finished_at']
+    list_filter = ['status']
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected failed jobs")
+    def retry_jobs(self, request, queryset):
+        failed = list(queryset.filter(status=Pricing_Job.FAILED))
+        retried = [job for job in failed if retry_job(job)]
+        if retried:
+            self.message_user(request, f"Queued {len(retried)} jobs again.", messages.SUCCESS)
+        expired = len(failed) - len(retried)
+        if expired:
+            self.message_user(
+                request, f"{expired} jobs could not be retried because their upload has expired.", messages.WARNING
+            )
+        if len(failed) < queryset.count():
+            self.message_user(request, "Only failed jobs can be retried.", messages.INFO)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Pricing_Run)
+class PricingRunAdmin(admin.ModelAdmin):
+    list_display = ['run_id', 'price_date', 'source', 'breaks_processed', 'unmatched_count', 'created_at', 'unmatched_link']
+    list_filter = ['source', 'price_date']
+
+    def unmatched_link(self, obj):
+        if not obj.unmatched_count:
+            return "-"
+        return format_html(
+            '<a href="{}">View unmatched</a>',
+            reverse("admin:pricing_run_unmatched", args=[obj.run_id])
+        )
+    unmatched_link.short_description = "Unmatched breaks"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Station_Pricing)
-class StationPricingAdmin(admin.ModelAdmin):
-    list_display = ['price_date', 'station', 'start_hour', 'end_hour', 'duration', 'sales_house', 'cost_type', 'cost']
+class StationPricingAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    # FK columns are shown from their ids and the cached reference data, so the
+    # changelist doesn't fetch a related row per column per price row
+    list_display = ['sheet_date', 'station_name', 'start_hour_value', 'end_hour_value', 'duration_value', 'sales_house_name', 'cost_type', 'cost']
+    query_budgets = {'changelist': 6}  # checked by SR.query_audit
+    # sr_station_prices runs to millions of rows: estimated totals, keyset pages on price_id
+    keyset_ordering = ('-price_id',)
     list_filter = ['price_date']
 
+    def sheet_date(self, obj):
+        return obj.price_date_id
+    sheet_date.short_description = "Price date"
+    sheet_date.admin_order_field = 'price_date'
+
+    def station_name(self, obj):
+        return get_reference_data().station_names.get(obj.station_id, obj.station_id)
+    station_name.short_description = "Station"
+    station_name.admin_order_field = 'station'
+
+    def start_hour_value(self, obj):
+        return obj.start_hour_id
+    start_hour_value.short_description = "Start hour"
+    start_hour_value.admin_order_field = 'start_hour'
+
+    def end_hour_value(self, obj):
+        return obj.end_hour_id
+    end_hour_value.short_description = "End hour"
+    end_hour_value.admin_order_field = 'end_hour'
+
+    def duration_value(self, obj):
+        return obj.duration_id
+    duration_value.short_description = "Duration"
+    duration_value.admin_order_field = 'duration'
+
+    def sales_house_name(self, obj):
+        return get_reference_data().sales_house_names.get(obj.sales_house_id, obj.sales_house_id)
+    sales_house_name.short_description = "Sales house"
+    sales_house_name.admin_order_field = 'sales_house'
+
+
+class PricedFilter(admin.SimpleListFilter):
+    title = "Priced"
+    parameter_name = "priced"
+
+    def lookups(self, request, model_admin):
+        return [
+            ("yes", "Yes"),
+            ("no", "No"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == "yes":
+            return queryset.filter(price__isnull=False)
+        elif self.value() == "no":
+            return queryset.filter(price__isnull=True)
+        return queryset
+
+
+@admin.register(Break)
+class BreakAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['break_id', 'standard_datetime', 'station', 'sales_house', 'spot_duration', 'price_cost', 'priced']
+    list_filter = [('standard_datetime', DateRangeFilter), 'station', 'sales_house', PricedFilter]
+    # sales_house and price are nullable, which the automatic select_related skips
+    list_select_related = ['station', 'sales_house', 'price']
+    search_fields = ['break_id']
+    # Sorting by a column without an index would sort the whole table
+    sortable_by = ['break_id', 'standard_datetime']
+    change_list_template = 'admin/break_changelist.html'
+    query_budgets = {'changelist': 8}  # checked by SR.query_audit
+
+    # sr_breaks has tens of millions of rows; pages walk the standard_datetime index
+    keyset_ordering = ('-standard_datetime', '-break_id')
+
+    # The coverage panel is only computed for a bounded date range
+    summary_max_days = 31
+
+    def get_search_results(self, request, queryset, search_term):
+        # Search is by break id only, as an indexed equality rather than a text match
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if not search_term.isdigit():
+            return queryset.none(), False
+        return queryset.filter(break_id=int(search_term)), False
+
+    def price_cost(self, obj):
+        if obj.price is None:
+            return "-"
+        return f"{obj.price.cost} {obj.price.cost_type}"
+    price_cost.short_description = "Price"
+
+    def priced(self, obj):
+        return obj.price_id is not None
+    priced.boolean = True
+    priced.short_description = "Priced"
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None)
+        if not context or 'cl' not in context:
+            return response
+
+        # === ✅ Per-station, per-day coverage for the filtered breaks, in one grouped query ===
+        cl = context['cl']
+        date_range = next((spec for spec in cl.filter_specs if isinstance(spec, DateRangeFilter)), None)
+        days = date_range.days if date_range else None
+        if days is not None and 0 < days <= self.summary_max_days:
+            context['coverage'] = dict(zip(('days', 'rows', 'day_totals'), break_coverage(cl.queryset)))
+        else:
+            context['coverage_hint'] = (
+                f"Choose a date range of up to {self.summary_max_days} days to see pricing coverage by station and day."
+            )
+        return response
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
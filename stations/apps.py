@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class StationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stations'
+
+    def ready(self):
+        from SR.artifacts import pin_artifacts
+
+        from . import signals  # noqa: F401
+        from .jobs import pending_upload_tokens
+
+        pin_artifacts(pending_upload_tokens)
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .models import Break, Station_Pricing
+from .reference import get_reference_data
+from .pricing import DURATION_MISMATCH, HOUR_MISMATCH, NO_STATION_PRICING, SALES_HOUSE_MISMATCH
+
+# Nullable ids are stored as -1 in the frames so they can live in plain int64 arrays.
+# Ids are always positive, so -1 never collides with a real value.
+NULL_ID = -1
+
+BREAK_COLUMNS = ['break_id', 'station_id', 'sales_house_id', 'spot_duration', 'standard_datetime']
+RULE_COLUMNS = ['price_id', 'station_id', 'sales_house_id', 'duration_id', 'start_hour_id', 'end_hour_id']
+KEY_COLUMNS = ['station_id', 'sales_house_id', 'spot_duration', 'hour']
+
+
+def _fill_ids(df, columns):
+    for column in columns:
+        df[column] = df[column].fillna(NULL_ID).astype(np.int64)
+    return df
+
+
+def load_breaks_frame(breaks, chunk_size=50000):
+    """Load break columns needed for pricing into a DataFrame, streaming rows from the DB."""
+    rows = breaks.values_list(*BREAK_COLUMNS).iterator(chunk_size=chunk_size)
+    df = pd.DataFrame.from_records(rows, columns=BREAK_COLUMNS)
+    df['standard_datetime'] = pd.to_datetime(df['standard_datetime'], utc=True)
+    df['hour'] = df['standard_datetime'].dt.hour.astype(np.int64)
+    return _fill_ids(df, ['break_id', 'station_id', 'sales_house_id', 'spot_duration'])
+
+
+def load_rules_frame(price_date):
+    rows = Station_Pricing.objects.filter(price_date=price_date).values_list(*RULE_COLUMNS)
+    df = pd.DataFrame.from_records(rows, columns=RULE_COLUMNS)
+    df = _fill_ids(df, RULE_COLUMNS)
+
+    # A rule with either hour missing covers the whole day
+    open_hours = (df['start_hour_id'] == NULL_ID) | (df['end_hour_id'] == NULL_ID)
+    df.loc[open_hours, ['start_hour_id', 'end_hour_id']] = NULL_ID
+    return df
+
+
+def resolve_prices(breaks_df, rules_df):
+    """
+    Resolve a price_id for every break using vectorized joins.
+
+    Matching follows the same rules as PriceMatcher: station must match, NULL
+    sales house / duration / hours on a rule act as wildcards, and the highest
+    price_id wins. Breaks are first collapsed to their distinct
+    (station, sales house, duration, hour) keys, which keeps the join small
+    even when the window holds millions of breaks.
+
+    Returns (assigned, unmatched): assigned has break_id/price_id, unmatched
+    carries the break columns plus a 'reason'.
+    """
+    keys = breaks_df[KEY_COLUMNS].drop_duplicates().reset_index(drop=True)
+    keys['key_id'] = np.arange(len(keys), dtype=np.int64)
+
+    rules = rules_df.rename(columns={'sales_house_id': 'rule_sales_house_id'})
+    pairs = keys.merge(rules, on='station_id', how='inner')
+
+    sales_house_ok = (
+        (pairs['rule_sales_house_id'] == NULL_ID)
+        | (pairs['rule_sales_house_id'] == pairs['sales_house_id'])
+    )
+    duration_ok = sales_house_ok & (
+        (pairs['duration_id'] == NULL_ID)
+        | (pairs['duration_id'] == pairs['spot_duration'])
+    )
+    hour_ok = duration_ok & (
+        (pairs['start_hour_id'] == NULL_ID)
+        | ((pairs['start_hour_id'] <= pairs['hour']) & (pairs['hour'] < pairs['end_hour_id']))
+    )
+
+    key_count = len(keys)
+    key_ids = pairs['key_id'].to_numpy()
+    has_station = np.zeros(key_count, dtype=bool)
+    has_station[key_ids] = True
+    has_sales_house = np.zeros(key_count, dtype=bool)
+    has_sales_house[key_ids[sales_house_ok.to_numpy()]] = True
+    has_duration = np.zeros(key_count, dtype=bool)
+    has_duration[key_ids[duration_ok.to_numpy()]] = True
+
+    # Bottom-up priority: highest matching price_id per key
+    best = np.full(key_count, NULL_ID, dtype=np.int64)
+    hour_mask = hour_ok.to_numpy()
+    np.maximum.at(best, key_ids[hour_mask], pairs['price_id'].to_numpy()[hour_mask])
+
+    keys['price_id'] = best
+    keys['reason'] = np.select(
+        [~has_station, ~has_sales_house, ~has_duration, best == NULL_ID],
+        [NO_STATION_PRICING, SALES_HOUSE_MISMATCH, DURATION_MISMATCH, HOUR_MISMATCH],
+        default='',
+    )
+
+    resolved = breaks_df.merge(keys[KEY_COLUMNS + ['price_id', 'reason']], on=KEY_COLUMNS, how='left')
+    matched = resolved['price_id'] != NULL_ID
+
+    assigned = resolved.loc[matched, ['break_id', 'price_id']].reset_index(drop=True)
+    unmatched = resolved.loc[~matched, BREAK_COLUMNS + ['reason']].reset_index(drop=True)
+    return assigned, unmatched
+
+
+def price_breaks_bulk(price_date, breaks):
+    """Load a pricing window and its sheet into frames and resolve every break."""
+    return resolve_prices(load_breaks_frame(breaks), load_rules_frame(price_date))
+
+
+def assign_prices_bulk(price_date, breaks):
+    """
+    assign_prices using the vectorized resolver: (True, []) once every break
+    is priced, or (False, errors) without writing anything.
+    """
+    assigned, unmatched = price_breaks_bulk(price_date, breaks)
+    if len(unmatched):
+        return False, errors_from_unmatched(unmatched)
+    write_assignments(assigned)
+    return True, []
+
+
+def write_assignments(assigned, batch_size=5000):
+    instances = (
+        Break(break_id=break_id, price_id=price_id)
+        for break_id, price_id in zip(assigned['break_id'].tolist(), assigned['price_id'].tolist())
+    )
+    with transaction.atomic():
+        batch = []
+        for instance in instances:
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                Break.objects.bulk_update(batch, ['price_id'])
+                batch = []
+        if batch:
+            Break.objects.bulk_update(batch, ['price_id'])
+    return len(assigned)
+
+
+def errors_from_unmatched(unmatched):
+    """Build the same error rows that assign_prices_to_breaks reports."""
+    refs = get_reference_data()
+    return [
+        {
+            'break_id': row.break_id,
+            'station': refs.station_names.get(row.station_id),
+            'datetime': row.standard_datetime.to_pydatetime(),
+            'sales_house': refs.sales_house_names.get(row.sales_house_id),
+            'duration': None if row.spot_duration == NULL_ID else row.spot_duration,
+            'reason': row.reason,
+        }
+        for row in unmatched.itertuples(index=False)
+    ]
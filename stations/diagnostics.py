@@ -0,0 +1,101 @@
+import os
+from datetime import datetime
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from .models import Pricing_Run, Unmatched_Break
+from .reference import get_reference_data
+from .repricing import discard_unmatched, read_unmatched
+
+
+def _unmatched_instance(run, row):
+    # Rows come either from assign_prices_to_breaks (typed values) or from a spill file (strings)
+    when = row['datetime']
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    duration = row['duration']
+    if duration in ('', None):
+        duration = None
+    return Unmatched_Break(
+        run=run,
+        break_id=int(row['break_id']),
+        station_name=row['station'] or None,
+        standard_datetime=when,
+        sales_house_name=row['sales_house'] or None,
+        spot_duration=int(duration) if duration is not None else None,
+        reason=row['reason'],
+    )
+
+
+def record_unmatched(run, rows, batch_size=5000):
+    """Store unmatched break rows (in the assign_prices_to_breaks error format) against a run."""
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(_unmatched_instance(run, row))
+        if len(batch) >= batch_size:
+            Unmatched_Break.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        Unmatched_Break.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def record_pricing_run(price_date, source, breaks_processed, errors=None, unmatched_path=None):
+    """
+    Create a Pricing_Run and store its unmatched breaks, from an error list or
+    a spill file (which is removed once loaded).
+    """
+    try:
+        run = Pricing_Run.objects.create(price_date=price_date, source=source, breaks_processed=breaks_processed)
+        if errors:
+            run.unmatched_count = record_unmatched(run, errors)
+        elif unmatched_path:
+            run.unmatched_count = record_unmatched(run, read_unmatched(unmatched_path))
+        if run.unmatched_count:
+            run.save(update_fields=['unmatched_count'])
+    finally:
+        # The spill file has served its purpose once its rows are in the table (or failed to get there)
+        if unmatched_path:
+            discard_unmatched(unmatched_path)
+    return run
+
+
+def reason_summary(unmatched):
+    """Counts per fail reason for an Unmatched_Break queryset, computed in the database."""
+    return list(unmatched.values('reason').annotate(count=Count('id')).order_by('-count'))
+
+
+def break_coverage(breaks):
+    """
+    Breaks and priced breaks per station per day for a Break queryset, from one
+    grouped query. Returns (days, rows, day_totals): rows hold the station name,
+    a (priced, total) cell per day and the station's totals.
+    """
+    counts = (
+        breaks.order_by()
+        .annotate(day=TruncDate('standard_datetime'))
+        .values('station_id', 'day')
+        .annotate(total=Count('break_id'), priced=Count('price_id'))
+    )
+    cells = {(c['station_id'], c['day']): (c['priced'], c['total']) for c in counts}
+    days = sorted({day for _, day in cells})
+    station_names = get_reference_data().station_names
+
+    rows = []
+    for station_id in sorted({s for s, _ in cells}, key=lambda s: station_names.get(s, str(s))):
+        row = [cells.get((station_id, day), (0, 0)) for day in days]
+        rows.append({
+            'station': station_names.get(station_id, station_id),
+            'cells': row,
+            'priced': sum(priced for priced, _ in row),
+            'total': sum(total for _, total in row),
+        })
+    day_totals = [
+        (sum(row['cells'][i][0] for row in rows), sum(row['cells'][i][1] for row in rows))
+        for i in range(len(days))
+    ]
+    return days, rows, day_totals
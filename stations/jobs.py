@@ -0,0 +1,155 @@
+from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
+
+from .diagnostics import record_pricing_run
+from .loaders import replace_pricing_sheet
+from .models import Pricing_Job, Pricing_Run, Pricing_Sheet, Station_Pricing
+from .repricing import reprice_in_chunks
+from .sheet_diff import affected_breaks, apply_sheet_diff, diff_pricing_sheet
+from .uploads import (
+    PricingUploadError, discard_pricing_upload, load_pricing_upload, split_pricing_upload, staged_price_dates,
+)
+
+
+def enqueue_pricing_jobs(upload_token, incremental=False):
+    """
+    Queue one job per price_date in a staged upload so workers can run the dates
+    side by side. Every sheet is created before any job, as load_sheets does:
+    a new sheet shortens its predecessor's window, which must not happen while
+    that date is being repriced. Sheets and jobs are committed together, so a
+    worker never claims a job while later sheets are still missing.
+    """
+    date_tokens = split_pricing_upload(upload_token)
+    try:
+        with transaction.atomic():
+            for price_date, _ in date_tokens:
+                Pricing_Sheet.objects.get_or_create(price_date=price_date)
+            return [
+                Pricing_Job.objects.create(price_date=price_date, incremental=incremental, upload_token=token)
+                for price_date, token in date_tokens
+            ]
+    except Exception:
+        # No job will ever read the per-date uploads
+        for _, token in date_tokens:
+            discard_pricing_upload(token)
+        raise
+
+
+def pending_upload_tokens():
+    """
+    Uploads of queued, running or failed jobs; they must outlive the staging
+    TTL. A failed job's upload is kept for retry_job until the job is deleted.
+    """
+    return Pricing_Job.objects.filter(
+        status__in=[Pricing_Job.QUEUED, Pricing_Job.RUNNING, Pricing_Job.FAILED]
+    ).values_list('upload_token', flat=True)
+
+
+def retry_job(job):
+    """Queue a failed job again, resetting its progress. Returns False if its upload is gone."""
+    try:
+        staged_price_dates(job.upload_token)
+    except PricingUploadError:
+        return False
+
+    job.status = Pricing_Job.QUEUED
+    job.message = ''
+    job.rows_inserted = job.rows_updated = job.rows_deleted = 0
+    job.breaks_total = job.breaks_processed = job.breaks_priced = job.unmatched_count = 0
+    job.unmatched_reasons = {}
+    job.run = None
+    job.started_at = job.finished_at = None
+    job.save()
+    return True
+
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it, or None if the queue is empty."""
+    with transaction.atomic():
+        job = (
+            Pricing_Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Pricing_Job.QUEUED)
+            .order_by('job_id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Pricing_Job.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def _save_progress(job, *fields):
+    job.save(update_fields=list(fields))
+
+
+def _load_sheet(job, sheet_admin):
+    """Write the job's rows to sr_station_prices and return the breaks that need repricing."""
+    price_date = job.price_date
+    rows = load_pricing_upload(job.upload_token)
+
+    diff = None
+    if job.incremental and Station_Pricing.objects.filter(price_date=price_date).exists():
+        diff = diff_pricing_sheet(price_date, rows)
+        if not diff.order_preserved:
+            job.message = "New rows sit between existing rows, so the whole sheet was replaced.\n"
+            diff = None
+
+    if diff is not None:
+        apply_sheet_diff(diff, sheet_admin.build_price_instance)
+        job.rows_inserted = len(diff.inserts)
+        job.rows_updated = len(diff.updates)
+        job.rows_deleted = len(diff.deletes)
+        return affected_breaks(sheet_admin.get_breaks_in_pricing_window(price_date), diff)
+
+    job.rows_deleted, _, job.rows_inserted = replace_pricing_sheet(price_date, rows)
+    return sheet_admin.get_breaks_in_pricing_window(price_date)
+
+
+def run_job(job, chunk_size=5000):
+    """Run the insert-and-reprice pipeline for a claimed job, recording progress on the job row."""
+    sheet_admin = admin.site._registry[Pricing_Sheet]
+
+    try:
+        breaks = _load_sheet(job, sheet_admin)
+        job.breaks_total = breaks.count()
+        _save_progress(job, 'rows_inserted', 'rows_updated', 'rows_deleted', 'breaks_total', 'message')
+
+        def progress(result):
+            job.breaks_processed = result.breaks_processed
+            job.breaks_priced = result.breaks_priced
+            job.unmatched_count = result.unmatched
+            _save_progress(job, 'breaks_processed', 'breaks_priced', 'unmatched_count')
+
+        # Keep the admin's behaviour: breaks are only written if every one of them matched
+        result = reprice_in_chunks(job.price_date, breaks, chunk_size=chunk_size, all_or_nothing=True, progress=progress)
+
+        job.breaks_processed = result.breaks_processed
+        job.breaks_priced = result.breaks_priced
+        job.unmatched_count = result.unmatched
+        job.unmatched_reasons = dict(result.reasons)
+        job.run = record_pricing_run(
+            job.price_date, Pricing_Run.JOB, result.breaks_processed, unmatched_path=result.unmatched_path
+        )
+        if result.success:
+            job.message += f"Pricing assigned to {result.breaks_priced} breaks for {job.price_date}."
+            job.status = Pricing_Job.SUCCEEDED
+        else:
+            job.message += f"{result.unmatched} breaks could not be matched to any price; no breaks were updated."
+            job.status = Pricing_Job.FAILED
+    except Exception as e:
+        job.status = Pricing_Job.FAILED
+        job.message += f"An error occurred during insertion: {str(e)}"
+
+    # A failed job keeps its upload so it can be retried
+    if job.status == Pricing_Job.SUCCEEDED:
+        discard_pricing_upload(job.upload_token)
+    job.finished_at = timezone.now()
+    _save_progress(
+        job, 'status', 'message', 'finished_at', 'breaks_processed', 'breaks_priced',
+        'unmatched_count', 'unmatched_reasons', 'run',
+    )
+    return job
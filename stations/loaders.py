@@ -0,0 +1,113 @@
+import csv
+from io import StringIO
+
+from django.db import connection, transaction
+
+from .models import Pricing_Sheet, Station_Pricing
+from .versions import bump_sheet_version
+
+# (model field, key in a validated upload row)
+PRICE_FIELDS = [
+    ('price_date', 'price_date'),
+    ('station', 'station_id'),
+    ('start_hour', 'start_hour'),
+    ('end_hour', 'end_hour'),
+    ('duration', 'duration'),
+    ('sales_house', 'sales_house_id'),
+    ('cost_type', 'cost_type'),
+    ('cost', 'cost'),
+]
+PRICE_COLUMNS = [Station_Pricing._meta.get_field(name).column for name, _ in PRICE_FIELDS]
+ROW_KEYS = [key for _, key in PRICE_FIELDS]
+
+BATCH_SIZE = 5000
+
+
+def _row_values(row):
+    return tuple(row.get(key) for key in ROW_KEYS)
+
+
+def _copy_rows(cursor, rows):
+    table = Station_Pricing._meta.db_table
+    sql = f"COPY {table} ({', '.join(PRICE_COLUMNS)}) FROM STDIN"
+    raw = cursor.cursor
+    count = 0
+
+    if hasattr(raw, 'copy'):
+        # psycopg 3 streams rows straight into the COPY
+        with raw.copy(sql) as copy:
+            for row in rows:
+                copy.write_row(_row_values(row))
+                count += 1
+        return count
+
+    # psycopg2: feed COPY ... CSV from an in-memory buffer, one batch at a time
+    csv_sql = f"{sql} WITH (FORMAT csv)"
+    batch = []
+
+    def flush():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        # Empty unquoted fields are NULL in CSV COPY
+        writer.writerows(['' if v is None else v for v in values] for values in batch)
+        buffer.seek(0)
+        raw.copy_expert(csv_sql, buffer)
+
+    for row in rows:
+        batch.append(_row_values(row))
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return count
+
+
+def _insert_rows(cursor, rows):
+    table = Station_Pricing._meta.db_table
+    placeholders = ', '.join(['%s'] * len(PRICE_COLUMNS))
+    sql = f"INSERT INTO {table} ({', '.join(PRICE_COLUMNS)}) VALUES ({placeholders})"
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(_row_values(row))
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def load_station_prices(rows, method=None):
+    """
+    Bulk-load validated upload rows into sr_station_prices, in file order so
+    price_id priority matches the sheet.
+
+    Uses COPY FROM STDIN on PostgreSQL and batched executemany elsewhere;
+    pass method='copy' or 'executemany' to force one.
+    """
+    if method is None:
+        method = 'copy' if connection.vendor == 'postgresql' else 'executemany'
+
+    with connection.cursor() as cursor:
+        if method == 'copy':
+            return _copy_rows(cursor, rows)
+        return _insert_rows(cursor, rows)
+
+
+def replace_pricing_sheet(price_date, rows):
+    """
+    Swap a sheet's price rows for new ones in one transaction.
+
+    Returns (deleted_count, sheet_created, inserted_count).
+    """
+    with transaction.atomic():
+        deleted_count, _ = Station_Pricing.objects.filter(price_date=price_date).delete()
+        _, created = Pricing_Sheet.objects.get_or_create(price_date=price_date)
+        inserted_count = load_station_prices(rows)
+        transaction.on_commit(lambda: bump_sheet_version(price_date))
+    return deleted_count, created, inserted_count
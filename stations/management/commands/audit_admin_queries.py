@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from SR.query_audit import audit_admin, format_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every registered admin changelist and change form against the current database and "
+        "report query counts, repeated queries and fields that query once per row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="View the pages as this user instead of an unsaved superuser.")
+        parser.add_argument('--fail-over-budget', action='store_true', help="Exit with an error if any view is over budget.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = get_user_model().objects.get(username=options['username'])
+
+        views, fields = audit_admin(user)
+        self.stdout.write(format_report(views, fields))
+
+        over = [audit.name for audit in views if audit.over_budget]
+        if over and options['fail_over_budget']:
+            raise CommandError(f"Over query budget: {', '.join(over)}")
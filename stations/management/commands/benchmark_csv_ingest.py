@@ -0,0 +1,117 @@
+import os
+import random
+import tempfile
+import time
+from io import TextIOWrapper
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from SR import csv_ingest
+from SR.csv_ingest import BASELINE_SCHEMA, PRICING_SCHEMA, iter_csv, read_csv
+from stations.reference import ReferenceData
+from stations.uploads import validate_pricing_chunk
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def synthetic_refs(stations=60, sales_houses=8):
+    """ReferenceData built in memory so the benchmark doesn't need the database."""
+    return ReferenceData(
+        station_names={i: f"Station {i}" for i in range(1, stations + 1)},
+        sales_house_names={i: f"Sales House {i}" for i in range(1, sales_houses + 1)},
+        hours=range(25),
+        durations=[10, 20, 30, 40, 60],
+    )
+
+
+def write_pricing_csv(path, rows, refs, seed=0):
+    rng = random.Random(seed)
+    stations = list(refs.station_ids)
+    sales_houses = list(refs.sales_house_ids) + ['']
+    durations = sorted(refs.durations)
+    with open(path, 'w') as f:
+        f.write(','.join(PRICING_SCHEMA.columns) + '\n')
+        for _ in range(rows):
+            start = rng.randint(0, 23)
+            f.write(
+                f"01/02/2025,{rng.choice(stations)},{start},{rng.randint(start + 1, 24)},"
+                f"{rng.choice(durations)},{rng.choice(sales_houses)},CPT,{rng.uniform(1, 500):.2f}\n"
+            )
+
+
+def write_baseline_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write(','.join(BASELINE_SCHEMA.columns) + '\n')
+        for i in range(rows):
+            f.write(f"{DAYS[i % 7]},{i % 24},{rng.uniform(0, 100):.3f},{rng.uniform(0, 10):.3f}\n")
+
+
+def legacy_pricing(path, refs):
+    """The upload view's original parsing: inferred dtypes, regex blank replace and a per-row apply."""
+    with open(path, 'rb') as f:
+        df = pd.read_csv(TextIOWrapper(f, encoding='utf-8'))
+    df = df.replace(r'^\s*$', None, regex=True)
+    df[['price_date', 'station_name', 'cost_type', 'cost']].isnull().any()
+    set(df['duration'].dropna()) - refs.durations
+    df['price_date'] = pd.to_datetime(df['price_date'], dayfirst=True, errors='coerce')
+    df['price_date'] = df['price_date'].dt.strftime('%Y-%m-%d')
+    df['station_id'] = df['station_name'].map(refs.station_ids)
+    df['sales_house_id'] = df['sales_house_name'].apply(
+        lambda x: refs.sales_house_ids.get(x) if pd.notnull(x) else None
+    )
+    (set(df['start_hour'].dropna()) | set(df['end_hour'].dropna())) - refs.hours
+    return len(df)
+
+
+def schema_pricing(path, refs, engine):
+    with open(path, 'rb') as f:
+        return sum(len(validate_pricing_chunk(chunk, refs)) for chunk in iter_csv(f, PRICING_SCHEMA, engine=engine))
+
+
+def legacy_baseline(path):
+    with open(path, 'rb') as f:
+        df = pd.read_csv(TextIOWrapper(f, encoding='utf-8'))
+    df[list(BASELINE_SCHEMA.columns)].isnull().any()
+    return len(df)
+
+
+def schema_baseline(path, engine):
+    with open(path, 'rb') as f:
+        df = read_csv(f, BASELINE_SCHEMA, engine=engine)
+    BASELINE_SCHEMA.columns_with_nulls(df)
+    return len(df)
+
+
+class Command(BaseCommand):
+    help = "Time pricing and baseline CSV parsing on synthetic files: original code vs the schema-driven reader."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Rows per synthetic file.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        refs = synthetic_refs()
+        engines = ['pandas'] + (['pyarrow'] if csv_ingest.pa_csv is not None else [])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pricing_path = os.path.join(tmp, 'pricing.csv')
+            baseline_path = os.path.join(tmp, 'baseline.csv')
+            write_pricing_csv(pricing_path, rows, refs)
+            write_baseline_csv(baseline_path, rows)
+            self.stdout.write(
+                f"{rows:,} rows: pricing {os.path.getsize(pricing_path) / 1e6:.0f} MB, "
+                f"baseline {os.path.getsize(baseline_path) / 1e6:.0f} MB"
+            )
+
+            runs = [('pricing', 'original', lambda: legacy_pricing(pricing_path, refs))]
+            runs += [('pricing', engine, lambda e=engine: schema_pricing(pricing_path, refs, e)) for engine in engines]
+            runs += [('baseline', 'original', lambda: legacy_baseline(baseline_path))]
+            runs += [('baseline', engine, lambda e=engine: schema_baseline(baseline_path, e)) for engine in engines]
+
+            for name, label, run in runs:
+                started = time.perf_counter()
+                count = run()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:>8} {label:>8}: {elapsed:6.2f}s ({count / elapsed:,.0f} rows/sec)")
@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from stations.loaders import load_station_prices
+from stations.models import Duration, Hour, Pricing_Sheet, Sales_House, Station, Station_Pricing
+
+
+class _Rollback(Exception):
+    pass
+
+
+def synthetic_rows(price_date, count, seed=0):
+    """Validated-upload-shaped rows built from the reference tables, with some wildcard columns."""
+    rng = random.Random(seed)
+    stations = list(Station.objects.values_list('station_id', flat=True))
+    sales_houses = list(Sales_House.objects.values_list('sales_house_id', flat=True))
+    durations = list(Duration.objects.values_list('duration_seconds', flat=True))
+    hours = sorted(Hour.objects.values_list('hour', flat=True))
+    if not stations or len(hours) < 2:
+        raise CommandError("Stations and at least two hours are needed to build benchmark rows.")
+
+    rows = []
+    for _ in range(count):
+        start_hour = end_hour = None
+        if rng.random() < 0.7:
+            start_hour, end_hour = sorted(rng.sample(hours, 2))
+        rows.append({
+            'price_date': price_date,
+            'station_id': rng.choice(stations),
+            'start_hour': start_hour,
+            'end_hour': end_hour,
+            'duration': rng.choice(durations) if durations and rng.random() < 0.5 else None,
+            'sales_house_id': rng.choice(sales_houses) if sales_houses and rng.random() < 0.5 else None,
+            'cost_type': 'CPT',
+            'cost': round(rng.uniform(1, 500), 2),
+        })
+    return rows
+
+
+def _bulk_create(rows):
+    Station_Pricing.objects.bulk_create(
+        [
+            Station_Pricing(
+                price_date_id=row['price_date'],
+                station_id=row['station_id'],
+                start_hour_id=row['start_hour'],
+                end_hour_id=row['end_hour'],
+                duration_id=row['duration'],
+                sales_house_id=row['sales_house_id'],
+                cost_type=row['cost_type'],
+                cost=row['cost'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Time loading synthetic pricing rows with bulk_create, executemany and COPY. "
+        "Every run is rolled back, so nothing is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Rows to load per run.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per method; the fastest is reported.")
+        parser.add_argument('--price-date', default='2099-01-01',
+                            help="Sheet date the rows are loaded under (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        price_date = options['price_date']
+        rows = synthetic_rows(price_date, options['rows'])
+
+        methods = {
+            'bulk_create': _bulk_create,
+            'executemany': lambda r: load_station_prices(r, method='executemany'),
+        }
+        if connection.vendor == 'postgresql':
+            methods['copy'] = lambda r: load_station_prices(r, method='copy')
+
+        self.stdout.write(f"Loading {len(rows)} rows, best of {options['repeat']} runs")
+        for name, load in methods.items():
+            timings = []
+            for _ in range(options['repeat']):
+                try:
+                    with transaction.atomic():
+                        Pricing_Sheet.objects.get_or_create(price_date=price_date)
+                        started = time.perf_counter()
+                        load(rows)
+                        timings.append(time.perf_counter() - started)
+                        raise _Rollback
+                except _Rollback:
+                    pass
+
+            best = min(timings)
+            self.stdout.write(f"{name:>12}: {best:.3f}s ({len(rows) / best:,.0f} rows/sec)")
@@ -0,0 +1,139 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from stations.diagnostics import record_pricing_run
+from stations.models import Pricing_Run, Station
+from stations.pricing import PriceMatcher
+from stations.repricing import discard_unmatched, reprice_in_chunks
+from stations.windows import PricingWindows, day_start
+
+# Matchers compiled in this worker process, by sheet date
+_matchers = {}
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Connections inherited from the parent can't be shared; each worker opens its own
+    connections.close_all()
+
+
+def reprice_partition(window, station_id, since, chunk_size, dry_run):
+    """Reprice one station's breaks within one pricing window. Runs in a pool worker."""
+    started = time.monotonic()
+
+    price_date = window.price_date
+    breaks = window.breaks().filter(station_id=station_id)
+    if since is not None:
+        breaks = breaks.filter(standard_datetime__gte=since)
+
+    if price_date not in _matchers:
+        _matchers[price_date] = PriceMatcher.for_sheet(price_date)
+
+    result = reprice_in_chunks(
+        price_date, breaks, chunk_size=chunk_size, matcher=_matchers[price_date], dry_run=dry_run
+    )
+
+    run = None
+    if result.breaks_processed and not dry_run:
+        run = record_pricing_run(
+            price_date, Pricing_Run.COMMAND, result.breaks_processed, unmatched_path=result.unmatched_path
+        )
+    elif result.unmatched_path:
+        # Dry runs only report reason counts, so nothing reads the spill file
+        discard_unmatched(result.unmatched_path)
+
+    return {
+        'price_date': price_date,
+        'station_id': station_id,
+        'breaks': result.breaks_processed,
+        'priced': result.breaks_priced,
+        'unmatched': result.unmatched,
+        'reasons': dict(result.reasons),
+        'run_id': run.run_id if run else None,
+        'seconds': time.monotonic() - started,
+    }
+
+
+class Command(BaseCommand):
+    help = "Reprice breaks for every pricing window, partitioned by window and station across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only reprice breaks from this date (YYYY-MM-DD) onwards.")
+        parser.add_argument('--station', type=int, action='append', dest='stations',
+                            help="Station id to reprice. Repeat for several stations.")
+        parser.add_argument('--dry-run', action='store_true', help="Match breaks and report without writing prices.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count).")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Breaks matched and written per chunk.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = day_start(datetime.strptime(options['since'], '%Y-%m-%d').date())
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        windows = [w for w in PricingWindows.load() if since is None or w.end is None or w.end > since]
+        if not windows:
+            raise CommandError("No pricing windows to reprice.")
+
+        stations = Station.objects.order_by('station_id')
+        if options['stations']:
+            stations = stations.filter(station_id__in=options['stations'])
+        station_ids = list(stations.values_list('station_id', flat=True))
+        if not station_ids:
+            raise CommandError("No matching stations.")
+
+        partitions = [(window, station_id) for window in windows for station_id in station_ids]
+        self.stdout.write(
+            f"Repricing {len(windows)} windows x {len(station_ids)} stations = {len(partitions)} partitions"
+            + (" (dry run)" if options['dry_run'] else "")
+        )
+
+        # Workers open their own connections; don't hand them ours
+        connections.close_all()
+
+        totals = {'breaks': 0, 'priced': 0, 'unmatched': 0}
+        started = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=get_context('fork'), initializer=_init_worker
+        ) as pool:
+            futures = [
+                pool.submit(reprice_partition, window, station_id, since, options['chunk_size'], options['dry_run'])
+                for window, station_id in partitions
+            ]
+            for future in as_completed(futures):
+                part = future.result()
+                for key in totals:
+                    totals[key] += part[key]
+                if not part['breaks']:
+                    continue
+
+                rate = part['breaks'] / part['seconds'] if part['seconds'] else 0
+                line = (
+                    f"{part['price_date']} station {part['station_id']}: {part['breaks']} breaks "
+                    f"in {part['seconds']:.2f}s ({rate:,.0f}/s), {part['unmatched']} unmatched"
+                )
+                if part['unmatched']:
+                    reasons = ', '.join(f"{reason}: {count}" for reason, count in part['reasons'].items())
+                    line += f" [{reasons}]"
+                    if part['run_id']:
+                        line += f" (pricing run {part['run_id']})"
+                self.stdout.write(line)
+
+        elapsed = time.monotonic() - started
+        rate = totals['breaks'] / elapsed if elapsed else 0
+        if options['dry_run']:
+            priced = f"{totals['breaks'] - totals['unmatched']} would be priced"
+        else:
+            priced = f"{totals['priced']} priced"
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['breaks']} breaks in {elapsed:.1f}s ({rate:,.0f} breaks/sec): "
+            f"{priced}, {totals['unmatched']} unmatched"
+        ))
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from stations.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued pricing-sheet insert and repricing jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to wait between polls of an empty queue.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Breaks matched and written per chunk.")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Jobs run at once. Each price_date in an upload is its own job, so dates run side by side.",
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            return self.work(options)
+
+        threads = [
+            threading.Thread(target=self.work_in_thread, args=(options,), name=f"pricing-worker-{i}")
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def work_in_thread(self, options):
+        try:
+            self.work(options)
+        finally:
+            # Each thread has its own connection; close it when the thread is done
+            connections.close_all()
+
+    def work(self, options):
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Running {job}")
+            started = time.monotonic()
+            job = run_job(job, chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f"{job} finished in {time.monotonic() - started:.1f}s: "
+                f"{job.breaks_processed} breaks processed, {job.unmatched_count} unmatched"
+            )
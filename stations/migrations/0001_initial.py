@@ -0,0 +1,116 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Break',
+            fields=[
+                ('break_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('standard_datetime', models.DateTimeField()),
+                ('spot_duration', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'sr_breaks',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Duration',
+            fields=[
+                ('duration_seconds', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'spot_duration',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Hour',
+            fields=[
+                ('hour', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'hours',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Pricing_Sheet',
+            fields=[
+                ('price_date', models.DateField(primary_key=True, serialize=False)),
+                ('note', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'sr_pricing_sheets',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Sales_House',
+            fields=[
+                ('sales_house_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('sales_house_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'sr_sales_houses',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('station_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('station_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'sr_stations',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Station_Pricing',
+            fields=[
+                ('price_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cost_type', models.CharField(max_length=3)),
+                ('cost', models.FloatField()),
+            ],
+            options={
+                'db_table': 'sr_station_prices',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Pricing_Job',
+            fields=[
+                ('job_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('price_date', models.DateField()),
+                ('incremental', models.BooleanField(default=False)),
+                ('rows', models.JSONField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('rows_inserted', models.IntegerField(default=0)),
+                ('rows_updated', models.IntegerField(default=0)),
+                ('rows_deleted', models.IntegerField(default=0)),
+                ('breaks_total', models.IntegerField(default=0)),
+                ('breaks_processed', models.IntegerField(default=0)),
+                ('breaks_priced', models.IntegerField(default=0)),
+                ('unmatched_count', models.IntegerField(default=0)),
+                ('unmatched_reasons', models.JSONField(default=dict)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'sr_pricing_jobs',
+            },
+        ),
+    ]
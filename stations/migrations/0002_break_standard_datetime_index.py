@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# sr_breaks is not managed by Django, so the index is created directly.
+# On PostgreSQL it is built CONCURRENTLY to avoid locking the table.
+
+INDEX_NAME = 'sr_breaks_standard_datetime_idx'
+
+
+def create_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {INDEX_NAME} ON sr_breaks (standard_datetime)"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('stations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
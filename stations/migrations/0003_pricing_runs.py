@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0002_break_standard_datetime_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pricing_Run',
+            fields=[
+                ('run_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('price_date', models.DateField()),
+                ('source', models.CharField(choices=[('upload', 'Admin upload'), ('job', 'Background job'), ('command', 'reprice_breaks command')], max_length=10)),
+                ('breaks_processed', models.IntegerField(default=0)),
+                ('unmatched_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'sr_pricing_runs',
+            },
+        ),
+        migrations.AddField(
+            model_name='pricing_job',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='stations.pricing_run'),
+        ),
+        migrations.CreateModel(
+            name='Unmatched_Break',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('break_id', models.BigIntegerField()),
+                ('station_name', models.CharField(max_length=100, null=True)),
+                ('standard_datetime', models.DateTimeField()),
+                ('sales_house_name', models.CharField(max_length=100, null=True)),
+                ('spot_duration', models.BigIntegerField(null=True)),
+                ('reason', models.CharField(max_length=50)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unmatched_breaks', to='stations.pricing_run')),
+            ],
+            options={
+                'db_table': 'sr_unmatched_breaks',
+                'indexes': [models.Index(fields=['run', 'reason'], name='sr_unmatched_run_reason_idx'), models.Index(fields=['run', 'station_name'], name='sr_unmatched_run_station_idx')],
+            },
+        ),
+    ]
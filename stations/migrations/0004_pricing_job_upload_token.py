@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0003_pricing_runs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pricing_job',
+            name='rows',
+        ),
+        migrations.AddField(
+            model_name='pricing_job',
+            name='upload_token',
+            field=models.CharField(default='', max_length=32),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Serves the break admin's station filter combined with a date range, and
+# per-station coverage over a window. Built CONCURRENTLY on PostgreSQL, as in 0002.
+
+INDEX_NAME = 'sr_breaks_station_datetime_idx'
+
+
+def create_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {INDEX_NAME} ON sr_breaks (station_id, standard_datetime)"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('stations', '0004_pricing_job_upload_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stations', '0005_break_station_datetime_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cache_Version',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'sr_cache_versions',
+            },
+        ),
+    ]
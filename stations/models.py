@@ -81,6 +81,97 @@ class Break(models.Model):
         db_table = 'sr_breaks'
 
     def __str__(self):
-        return f"Break {self.break_id} on {self.break_date} ({self.station.station_name})"
+        return f"Break {self.break_id} on {self.standard_datetime:%Y-%m-%d %H:%M} ({self.station.station_name})"
+
+class Pricing_Run(models.Model):
+    """One repricing of a pricing window; unmatched breaks are recorded against it."""
+
+    UPLOAD = 'upload'
+    JOB = 'job'
+    COMMAND = 'command'
+    SOURCE_CHOICES = [
+        (UPLOAD, 'Admin upload'),
+        (JOB, 'Background job'),
+        (COMMAND, 'reprice_breaks command'),
+    ]
+
+    run_id = models.BigAutoField(primary_key=True)
+    price_date = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    breaks_processed = models.IntegerField(default=0)
+    unmatched_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        db_table = 'sr_pricing_runs'
+
+    def __str__(self):
+        return f"Pricing run {self.run_id} for {self.price_date}"
+
+class Unmatched_Break(models.Model):
+    run = models.ForeignKey(Pricing_Run, on_delete=models.CASCADE, related_name='unmatched_breaks')
+    break_id = models.BigIntegerField()
+    station_name = models.CharField(max_length=100, null=True)
+    standard_datetime = models.DateTimeField()
+    sales_house_name = models.CharField(max_length=100, null=True)
+    spot_duration = models.BigIntegerField(null=True)
+    reason = models.CharField(max_length=50)
+
+    class Meta:
+        db_table = 'sr_unmatched_breaks'
+        indexes = [
+            models.Index(fields=['run', 'reason'], name='sr_unmatched_run_reason_idx'),
+            models.Index(fields=['run', 'station_name'], name='sr_unmatched_run_station_idx'),
+        ]
+
+class Pricing_Job(models.Model):
+    """Queued insert-and-reprice run for an uploaded pricing sheet, picked up by `manage.py run_pricing_jobs`."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    price_date = models.DateField()
+    incremental = models.BooleanField(default=False)
+    upload_token = models.CharField(max_length=32)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    rows_inserted = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_deleted = models.IntegerField(default=0)
+    breaks_total = models.IntegerField(default=0)
+    breaks_processed = models.IntegerField(default=0)
+    breaks_priced = models.IntegerField(default=0)
+    unmatched_count = models.IntegerField(default=0)
+    unmatched_reasons = models.JSONField(default=dict)
+    run = models.ForeignKey(Pricing_Run, on_delete=models.SET_NULL, null=True, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        db_table = 'sr_pricing_jobs'
+
+    def __str__(self):
+        return f"Pricing job {self.job_id} for {self.price_date} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+class Cache_Version(models.Model):
+    """Version counter for a process-cached lookup; bumping it makes every process reload."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=1)
+
+    class Meta:
+        db_table = 'sr_cache_versions'
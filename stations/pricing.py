@@ -0,0 +1,137 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Break, Station_Pricing
+from .reference import get_reference_data
+
+# Reasons reported for breaks that can't be matched to a price row.
+# These strings are shown to users, so keep them stable.
+NO_STATION_PRICING = "No station pricing rows"
+SALES_HOUSE_MISMATCH = "Sales house mismatch"
+DURATION_MISMATCH = "Duration mismatch"
+HOUR_MISMATCH = "Hour mismatch"
+
+FAIL_REASONS = [NO_STATION_PRICING, SALES_HOUSE_MISMATCH, DURATION_MISMATCH, HOUR_MISMATCH]
+
+logger = logging.getLogger(__name__)
+
+PRICE_RULE_FIELDS = ['price_id', 'station_id', 'sales_house_id', 'duration_id', 'start_hour_id', 'end_hour_id']
+
+
+class PriceMatcher:
+    """
+    Lookup of a pricing sheet's rules, built once and reused for every break.
+
+    Rules are indexed station -> sales house -> duration, with None keys acting
+    as wildcards. Each leaf holds (price_id, start_hour, end_hour) intervals
+    sorted by price_id descending, so the first hit is the bottom-up priority
+    match that assign_prices_to_breaks has always used.
+    """
+
+    def __init__(self, rules):
+        index = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        for price_id, station_id, sales_house_id, duration_id, start_hour, end_hour in rules:
+            # A missing start or end hour means the rule covers the whole day
+            if start_hour is None or end_hour is None:
+                start_hour = end_hour = None
+            index[station_id][sales_house_id][duration_id].append((price_id, start_hour, end_hour))
+
+        self.index = {}
+        for station_id, sales_houses in index.items():
+            self.index[station_id] = {}
+            for sales_house_id, durations in sales_houses.items():
+                self.index[station_id][sales_house_id] = {
+                    duration_id: sorted(intervals, reverse=True)
+                    for duration_id, intervals in durations.items()
+                }
+
+    @classmethod
+    def for_sheet(cls, price_date):
+        rules = Station_Pricing.objects.filter(price_date=price_date).values_list(*PRICE_RULE_FIELDS)
+        return cls(rules)
+
+    @property
+    def station_ids(self):
+        return list(self.index)
+
+    def match(self, station_id, sales_house_id, duration, hour):
+        """Return (price_id, None) for a match, or (None, fail_reason)."""
+        sales_houses = self.index.get(station_id)
+        if not sales_houses:
+            return None, NO_STATION_PRICING
+
+        sales_house_buckets = [sales_houses.get(None)]
+        if sales_house_id is not None:
+            sales_house_buckets.append(sales_houses.get(sales_house_id))
+        sales_house_buckets = [b for b in sales_house_buckets if b]
+        if not sales_house_buckets:
+            return None, SALES_HOUSE_MISMATCH
+
+        duration_keys = (None,) if duration is None else (None, duration)
+        candidates = []
+        for durations in sales_house_buckets:
+            for key in duration_keys:
+                intervals = durations.get(key)
+                if intervals:
+                    candidates.append(intervals)
+        if not candidates:
+            return None, DURATION_MISMATCH
+
+        best = None
+        for intervals in candidates:
+            for price_id, start_hour, end_hour in intervals:
+                if start_hour is None or start_hour <= hour < end_hour:
+                    if best is None or price_id > best:
+                        best = price_id
+                    break
+        if best is None:
+            return None, HOUR_MISMATCH
+        return best, None
+
+
+def assign_prices(price_date, breaks):
+    """
+    Match every break to a price row of the sheet for price_date.
+
+    Returns (True, []) once all breaks are priced, or (False, errors) without
+    writing anything if any break couldn't be matched.
+    """
+    errors = []
+    matcher = PriceMatcher.for_sheet(price_date)
+    logger.debug("Stations priced on %s: %s", price_date, matcher.station_ids)
+
+    matched_breaks = []
+    unmatched = []
+
+    breaks = breaks.only('break_id', 'station', 'sales_house', 'standard_datetime', 'spot_duration', 'price')
+    for br in breaks.iterator(chunk_size=2000):
+        price_id, fail_reason = matcher.match(
+            br.station_id, br.sales_house_id, br.spot_duration, br.standard_datetime.hour
+        )
+
+        if price_id is not None:
+            br.price_id = price_id
+            matched_breaks.append(br)
+        else:
+            unmatched.append((br, fail_reason))
+
+    if unmatched:
+        refs = get_reference_data()
+        for br, fail_reason in unmatched:
+            errors.append({
+                'break_id': br.break_id,
+                'station': refs.station_names.get(br.station_id),
+                'datetime': br.standard_datetime,
+                'sales_house': refs.sales_house_names.get(br.sales_house_id),
+                'duration': br.spot_duration,
+                'reason': fail_reason
+            })
+
+    if not errors:
+        with transaction.atomic():
+            Break.objects.bulk_update(matched_breaks, ['price_id'], batch_size=1000)
+        return True, []
+
+    return False, errors
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from datetime import timezone as dt_timezone
+from threading import Lock
+
+from .models import Station_Pricing
+from .pricing import PriceMatcher
+from .versions import get_version, sheet_version_name
+from .windows import get_pricing_windows
+
+# Compiled sheets kept per process. A handful covers the current sheet plus
+# whatever historic sheets planning tools are looking at.
+MAX_CACHED_SHEETS = 16
+
+
+class CompiledSheet:
+    def __init__(self, price_date):
+        rules = list(Station_Pricing.objects.filter(price_date=price_date).values_list(
+            'price_id', 'station_id', 'sales_house_id', 'duration_id', 'start_hour_id', 'end_hour_id',
+            'cost_type', 'cost',
+        ))
+        self.price_date = price_date
+        self.matcher = PriceMatcher(rule[:6] for rule in rules)
+        self.costs = {rule[0]: (rule[6], rule[7]) for rule in rules}
+
+    def quote(self, station_id, sales_house_id, duration, hour):
+        price_id, reason = self.matcher.match(station_id, sales_house_id, duration, hour)
+        if price_id is None:
+            return {'price_date': self.price_date, 'price_id': None, 'reason': reason}
+        cost_type, cost = self.costs[price_id]
+        return {'price_date': self.price_date, 'price_id': price_id, 'cost_type': cost_type, 'cost': cost}
+
+
+_sheets = OrderedDict()
+_lock = Lock()
+
+
+def compiled_sheet(price_date):
+    """LRU-cached CompiledSheet, keyed by sheet date and its current version."""
+    key = (price_date, get_version(sheet_version_name(price_date)))
+    with _lock:
+        sheet = _sheets.get(key)
+        if sheet is not None:
+            _sheets.move_to_end(key)
+            return sheet
+
+    sheet = CompiledSheet(price_date)
+    with _lock:
+        # Drop any older version of this sheet along with the least recently used entries
+        for stale in [k for k in _sheets if k[0] == price_date]:
+            del _sheets[stale]
+        _sheets[key] = sheet
+        while len(_sheets) > MAX_CACHED_SHEETS:
+            _sheets.popitem(last=False)
+    return sheet
+
+
+def _no_sheet():
+    return {'price_date': None, 'price_id': None, 'reason': "No pricing sheet"}
+
+
+def price_for(station_id, sales_house_id, duration, when):
+    """
+    Quote the price row a spot would get, using the same rules as assign_prices_to_breaks.
+
+    when must be timezone-aware; hours are matched in UTC like stored breaks.
+    """
+    window = get_pricing_windows().window_for(when)
+    if window is None:
+        return _no_sheet()
+    hour = when.astimezone(dt_timezone.utc).hour
+    return compiled_sheet(window.price_date).quote(station_id, sales_house_id, duration, hour)
+
+
+def price_for_many(spots):
+    """Batch price_for over (station_id, sales_house_id, duration, when) tuples."""
+    spots = list(spots)
+    if not spots:
+        return []
+
+    sheet_dates = get_pricing_windows().sheet_dates_for([spot[3] for spot in spots])
+    sheets = {}
+    quotes = []
+    for (station_id, sales_house_id, duration, when), price_date in zip(spots, sheet_dates):
+        if price_date is None:
+            quotes.append(_no_sheet())
+            continue
+        if price_date not in sheets:
+            sheets[price_date] = compiled_sheet(price_date)
+        hour = when.astimezone(dt_timezone.utc).hour
+        quotes.append(sheets[price_date].quote(station_id, sales_house_id, duration, hour))
+    return quotes
@@ -0,0 +1,47 @@
+import time
+
+from .models import Duration, Hour, Sales_House, Station
+from .versions import get_version
+
+REFERENCE_VERSION = 'reference_data'
+
+# The lookup tables can also be edited outside this app, which can't bump the
+# version, so a worker's copy is reloaded at least this often (seconds)
+MAX_AGE = 300
+
+
+class ReferenceData:
+    """Small lookup tables, with maps both ways between ids and names."""
+
+    def __init__(self, station_names, sales_house_names, hours, durations):
+        self.station_names = station_names                  # station_id -> station_name
+        self.sales_house_names = sales_house_names          # sales_house_id -> sales_house_name
+        self.station_ids = {name: pk for pk, name in station_names.items()}
+        self.sales_house_ids = {name: pk for pk, name in sales_house_names.items()}
+        self.hours = frozenset(hours)
+        self.durations = frozenset(durations)
+
+    @classmethod
+    def load(cls):
+        return cls(
+            station_names=dict(Station.objects.values_list('station_id', 'station_name')),
+            sales_house_names=dict(Sales_House.objects.values_list('sales_house_id', 'sales_house_name')),
+            hours=Hour.objects.values_list('hour', flat=True),
+            durations=Duration.objects.values_list('duration_seconds', flat=True),
+        )
+
+
+_cached = {'version': None, 'loaded_at': 0.0, 'data': None}
+
+
+def get_reference_data():
+    """
+    Process-wide stations, sales houses, hours and durations, reloaded when
+    REFERENCE_VERSION is bumped or the copy is older than MAX_AGE.
+    """
+    version = get_version(REFERENCE_VERSION)
+    if _cached['version'] != version or time.monotonic() - _cached['loaded_at'] > MAX_AGE:
+        _cached['data'] = ReferenceData.load()
+        _cached['version'] = version
+        _cached['loaded_at'] = time.monotonic()
+    return _cached['data']
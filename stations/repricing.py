@@ -0,0 +1,199 @@
+import csv
+import os
+import tempfile
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+
+from .models import Break
+from .pricing import PriceMatcher
+from .reference import get_reference_data
+
+ERROR_COLUMNS = ['break_id', 'station', 'datetime', 'sales_house', 'duration', 'reason']
+
+# Schema-qualified so a permanent table of the same name on search_path is never touched
+STAGING_TABLE = 'pg_temp.reprice_staging'
+
+
+@dataclass
+class RepriceResult:
+    breaks_processed: int = 0
+    breaks_priced: int = 0
+    unmatched: int = 0
+    reasons: Counter = field(default_factory=Counter)
+    # CSV of unmatched breaks (ERROR_COLUMNS), None when every break matched
+    unmatched_path: str = None
+
+    @property
+    def success(self):
+        return self.unmatched == 0
+
+
+class UnmatchedSpill:
+    """Write unmatched breaks to a CSV file as they are found instead of keeping them in memory."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.temporary = path is None
+        self.file = None
+        self.writer = None
+        self.refs = None
+
+    def write(self, br, reason):
+        if self.writer is None:
+            if self.path:
+                self.file = open(self.path, 'w', newline='')
+            else:
+                self.file = tempfile.NamedTemporaryFile('w', newline='', suffix='.csv', prefix='unmatched_', delete=False)
+                self.path = self.file.name
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(ERROR_COLUMNS)
+            self.refs = get_reference_data()
+
+        self.writer.writerow([
+            br.break_id,
+            self.refs.station_names.get(br.station_id),
+            br.standard_datetime.isoformat(),
+            self.refs.sales_house_names.get(br.sales_house_id) or '',
+            br.spot_duration,
+            reason,
+        ])
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+    def discard(self):
+        """Close and remove a temporary spill file nobody will read."""
+        self.close()
+        if self.temporary and self.path:
+            discard_unmatched(self.path)
+            self.path = None
+
+
+def discard_unmatched(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_unmatched(path):
+    """Stream error rows back out of a spill file."""
+    with open(path, newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _create_staging_table(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(f"CREATE TEMPORARY TABLE {STAGING_TABLE} (break_id bigint PRIMARY KEY, price_id bigint NOT NULL)")
+
+
+def _stage_chunk(cursor, assignments):
+    cursor.executemany(f"INSERT INTO {STAGING_TABLE} (break_id, price_id) VALUES (%s, %s)", assignments)
+
+
+def _promote_staging_table(cursor):
+    cursor.execute(f"""
+        UPDATE {Break._meta.db_table}
+        SET price_id = s.price_id
+        FROM {STAGING_TABLE} s
+        WHERE {Break._meta.db_table}.break_id = s.break_id
+    """)
+
+
+def reprice_in_chunks(price_date, breaks, chunk_size=5000, all_or_nothing=False, unmatched_path=None, matcher=None,
+                      progress=None, dry_run=False):
+    """
+    Reprice a pricing window chunk by chunk so memory stays flat for any window size.
+
+    Breaks are streamed with a server-side cursor. By default each chunk's
+    prices are written as soon as the chunk is matched. With all_or_nothing,
+    chunks go to a temporary staging table instead and are copied onto
+    sr_breaks in one statement only if every break matched, which is the
+    behaviour of assign_prices_to_breaks. Other backends have no staging
+    table: chunks are written inside one transaction, rolled back on a miss.
+
+    Unmatched breaks are written to a CSV spill file (see read_unmatched),
+    a temporary file unless unmatched_path is given. The caller owns the file:
+    record_pricing_run removes it once loaded, otherwise use discard_unmatched.
+    progress, if given, is called with the running RepriceResult after each chunk.
+    With dry_run nothing is written and breaks_priced stays 0; the breaks that
+    would be priced are breaks_processed - unmatched.
+    """
+    matcher = matcher or PriceMatcher.for_sheet(price_date)
+    result = RepriceResult()
+    spill = UnmatchedSpill(unmatched_path)
+
+    breaks = (
+        breaks
+        .only('break_id', 'station', 'sales_house', 'standard_datetime', 'spot_duration', 'price')
+        .order_by('break_id')
+    )
+
+    # Staged chunks are committed as they go; the fallback holds one transaction open
+    staged = all_or_nothing and not dry_run and connection.vendor == 'postgresql'
+    rollback = all_or_nothing and not dry_run and not staged
+
+    def flush(chunk):
+        if not chunk:
+            return
+        if not dry_run:
+            if staged:
+                with connection.cursor() as cursor:
+                    _stage_chunk(cursor, [(br.break_id, br.price_id) for br in chunk])
+            else:
+                with transaction.atomic():
+                    Break.objects.bulk_update(chunk, ['price_id'], batch_size=chunk_size)
+            result.breaks_priced += len(chunk)
+        if progress:
+            progress(result)
+
+    try:
+        # The staging table is session-scoped, so chunks can be committed as they are
+        # staged (and progress reported) while sr_breaks only changes in the final UPDATE
+        if staged:
+            with connection.cursor() as cursor:
+                _create_staging_table(cursor)
+
+        with transaction.atomic() if rollback else nullcontext():
+            chunk = []
+            for br in breaks.iterator(chunk_size=chunk_size):
+                result.breaks_processed += 1
+                price_id, fail_reason = matcher.match(
+                    br.station_id, br.sales_house_id, br.spot_duration, br.standard_datetime.hour
+                )
+
+                if price_id is None:
+                    result.unmatched += 1
+                    result.reasons[fail_reason] += 1
+                    spill.write(br, fail_reason)
+                else:
+                    br.price_id = price_id
+                    chunk.append(br)
+
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                    chunk = []
+            flush(chunk)
+
+            if all_or_nothing and not dry_run and not result.success:
+                result.breaks_priced = 0
+                if rollback:
+                    transaction.set_rollback(True)
+
+        if staged:
+            with connection.cursor() as cursor:
+                if result.success:
+                    _promote_staging_table(cursor)
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    except BaseException:
+        spill.discard()
+        raise
+    finally:
+        spill.close()
+
+    result.unmatched_path = spill.path
+    return result
@@ -0,0 +1,154 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Station_Pricing
+from .versions import bump_sheet_version
+
+# Columns that identify a price row within a sheet. Rows with the same key
+# but a different cost are updated in place instead of deleted and re-added.
+KEY_FIELDS = ['station_id', 'start_hour_id', 'end_hour_id', 'duration_id', 'sales_house_id', 'cost_type']
+
+# Beyond this many touched rules, select affected breaks by station only
+# rather than building one predicate per rule.
+MAX_RULE_PREDICATES = 200
+
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+
+def row_key(row):
+    """Key for a validated upload row (the dicts stored by upload_csv_view)."""
+    return (
+        _int_or_none(row['station_id']),
+        _int_or_none(row.get('start_hour')),
+        _int_or_none(row.get('end_hour')),
+        _int_or_none(row.get('duration')),
+        _int_or_none(row.get('sales_house_id')),
+        row['cost_type'],
+    )
+
+
+@dataclass
+class SheetDiff:
+    price_date: str
+    inserts: list = field(default_factory=list)   # validated rows
+    updates: list = field(default_factory=list)   # (price_id, new cost)
+    deletes: list = field(default_factory=list)   # existing rule dicts
+    # False when applying the diff would change which rule wins for a break,
+    # because new rows always get higher price_ids than the rows they sit between
+    order_preserved: bool = True
+
+    @property
+    def unchanged(self):
+        return not (self.inserts or self.updates or self.deletes)
+
+    @property
+    def touched_rules(self):
+        """Rules whose addition or removal can change which price a break gets."""
+        inserted = [dict(zip(KEY_FIELDS, row_key(row))) for row in self.inserts]
+        return inserted + self.deletes
+
+
+def diff_pricing_sheet(price_date, rows):
+    """
+    Compare validated upload rows with the stored sheet for price_date.
+
+    Rows are paired by KEY_FIELDS in file order against existing rows in
+    price_id order, so repeated keys are handled as a multiset. Cost changes
+    become updates, unpaired incoming rows inserts, and unpaired stored rows
+    deletes.
+    """
+    existing = defaultdict(list)
+    for rule in (
+        Station_Pricing.objects
+        .filter(price_date=price_date)
+        .order_by('price_id')
+        .values('price_id', 'cost', *KEY_FIELDS)
+    ):
+        existing[tuple(rule[f] for f in KEY_FIELDS)].append(rule)
+
+    diff = SheetDiff(price_date=price_date)
+    kept_price_ids = []
+    for row in rows:
+        candidates = existing.get(row_key(row))
+        if candidates:
+            rule = candidates.pop(0)
+            kept_price_ids.append(rule['price_id'])
+            if rule['cost'] != row['cost']:
+                diff.updates.append((rule['price_id'], row['cost']))
+        else:
+            diff.inserts.append(row)
+            # Inserted rows get new (higher) price_ids, so anything kept after them
+            # in the file would end up with lower priority than it has in a full reload
+            kept_price_ids.append(None)
+
+    for candidates in existing.values():
+        diff.deletes.extend(candidates)
+
+    # Priority follows file order (later rows win). That only survives if kept rows
+    # are still in price_id order and every inserted row comes after all kept rows.
+    seen_insert = False
+    last_price_id = None
+    for price_id in kept_price_ids:
+        if price_id is None:
+            seen_insert = True
+        elif seen_insert or (last_price_id is not None and price_id < last_price_id):
+            diff.order_preserved = False
+            break
+        else:
+            last_price_id = price_id
+
+    return diff
+
+
+@transaction.atomic
+def apply_sheet_diff(diff, build_instance):
+    """Write a SheetDiff. build_instance turns a validated row into a Station_Pricing."""
+    if diff.deletes:
+        Station_Pricing.objects.filter(price_id__in=[rule['price_id'] for rule in diff.deletes]).delete()
+    if diff.updates:
+        Station_Pricing.objects.bulk_update(
+            [Station_Pricing(price_id=price_id, cost=cost) for price_id, cost in diff.updates],
+            ['cost'],
+            batch_size=1000,
+        )
+    if diff.inserts:
+        Station_Pricing.objects.bulk_create([build_instance(row) for row in diff.inserts], batch_size=1000)
+    if not diff.unchanged:
+        transaction.on_commit(lambda: bump_sheet_version(diff.price_date))
+
+
+def _rule_predicate(rule):
+    predicate = Q(station_id=rule['station_id'])
+    if rule['sales_house_id'] is not None:
+        predicate &= Q(sales_house_id=rule['sales_house_id'])
+    if rule['duration_id'] is not None:
+        predicate &= Q(spot_duration=rule['duration_id'])
+    if rule['start_hour_id'] is not None and rule['end_hour_id'] is not None:
+        predicate &= Q(standard_datetime__hour__gte=rule['start_hour_id'], standard_datetime__hour__lt=rule['end_hour_id'])
+    return predicate
+
+
+def affected_breaks(breaks, diff):
+    """
+    Narrow a pricing window to the breaks a diff can reprice.
+
+    That is every break a touched rule could match, plus breaks without a
+    price (which includes breaks whose rule was just deleted).
+    """
+    touched = diff.touched_rules
+    if not touched:
+        return breaks.filter(price__isnull=True)
+
+    if len(touched) > MAX_RULE_PREDICATES:
+        predicate = Q(station_id__in={rule['station_id'] for rule in touched})
+    else:
+        predicate = Q()
+        for rule in touched:
+            predicate |= _rule_predicate(rule)
+
+    return breaks.filter(predicate | Q(price__isnull=True))
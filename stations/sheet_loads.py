@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.contrib import messages
+from django.db import connections
+
+from .diagnostics import record_pricing_run
+from .loaders import replace_pricing_sheet
+from .models import Pricing_Run, Pricing_Sheet, Station_Pricing
+from .sheet_diff import affected_breaks, apply_sheet_diff, diff_pricing_sheet
+
+
+@dataclass
+class SheetLoadResult:
+    """Outcome of loading and repricing one sheet from an upload."""
+
+    price_date: str
+    rows: int = 0
+    success: bool = False
+    breaks: int = 0
+    unmatched: int = 0
+    run_id: int = None
+    error: str = None
+    # (messages level, text) in the order the steps ran
+    notes: list = field(default_factory=list)
+
+    def note(self, level, text):
+        self.notes.append((level, text))
+
+
+def load_sheet(sheet_admin, price_date, rows, incremental=False):
+    """Write one sheet's rows (a diff or a full replace), reprice its window and record the run."""
+    result = SheetLoadResult(price_date=price_date, rows=len(rows))
+    try:
+        # === ✅ Diff against the stored sheet when only changes should be applied ===
+        diff = None
+        if incremental and Station_Pricing.objects.filter(price_date=price_date).exists():
+            diff = diff_pricing_sheet(price_date, rows)
+            if not diff.order_preserved:
+                result.note(
+                    messages.WARNING,
+                    f"{price_date}: new rows sit between existing rows, which changes price priority. "
+                    f"Replacing the whole sheet instead."
+                )
+                diff = None
+
+        if diff is not None:
+            apply_sheet_diff(diff, sheet_admin.build_price_instance)
+            result.note(
+                messages.SUCCESS,
+                f"Applied changes for {price_date}: {len(diff.inserts)} inserted, "
+                f"{len(diff.updates)} updated, {len(diff.deletes)} deleted."
+            )
+
+            # Only breaks a touched rule could match need repricing
+            breaks = affected_breaks(sheet_admin.get_breaks_in_pricing_window(price_date), diff)
+            result.breaks = breaks.count()
+            result.note(messages.INFO, f"{result.breaks} breaks in the pricing window starting {price_date} are affected.")
+        else:
+            # === ✅ Delete existing rows and bulk-load the new ones in one transaction ===
+            deleted_count, _, inserted_count = replace_pricing_sheet(price_date, rows)
+            result.note(messages.INFO, f"Deleted {deleted_count} existing rows for {price_date}")
+            result.note(messages.SUCCESS, f"Inserted {inserted_count} new rows for {price_date}.")
+
+            breaks = sheet_admin.get_breaks_in_pricing_window(price_date)
+            result.breaks = breaks.count()
+            result.note(messages.INFO, f"{result.breaks} breaks fall within the pricing window starting {price_date}.")
+
+        success, errors = sheet_admin.assign_prices_to_breaks(price_date, breaks)
+
+        # Record the run, with any unmatched breaks, for the diagnostics page
+        run = record_pricing_run(price_date, Pricing_Run.UPLOAD, result.breaks, errors=errors)
+        result.success = success
+        result.unmatched = len(errors)
+        result.run_id = run.run_id
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def _load_sheet_in_thread(*args, **kwargs):
+    try:
+        return load_sheet(*args, **kwargs)
+    finally:
+        # Connections are per thread; don't leave this one open after the pool is gone
+        connections.close_all()
+
+
+def load_sheets(sheet_admin, grouped_rows, incremental=False, workers=4):
+    """
+    Load and reprice several sheets, one unit per price_date, running up to
+    workers units at once. Returns a SheetLoadResult per date, in date order.
+    """
+    # Create every sheet first: a new sheet shortens the previous sheet's window,
+    # so windows must not change while other dates are being repriced
+    created = []
+    for price_date in grouped_rows:
+        _, was_created = Pricing_Sheet.objects.get_or_create(price_date=price_date)
+        if was_created:
+            created.append(price_date)
+
+    if len(grouped_rows) == 1 or workers <= 1:
+        results = [load_sheet(sheet_admin, d, rows, incremental) for d, rows in grouped_rows.items()]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(grouped_rows))) as pool:
+            futures = [
+                pool.submit(_load_sheet_in_thread, sheet_admin, d, rows, incremental)
+                for d, rows in grouped_rows.items()
+            ]
+            results = [future.result() for future in futures]
+
+    for result in results:
+        if result.price_date in created:
+            result.notes.insert(0, (messages.INFO, f"Pricing sheet for {result.price_date} was automatically created."))
+    return results
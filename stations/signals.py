@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Duration, Hour, Pricing_Sheet, Sales_House, Station
+from .reference import REFERENCE_VERSION
+from .versions import bump_sheet_version, bump_version
+from .windows import WINDOWS_VERSION
+
+
+@receiver(post_save, sender=Pricing_Sheet)
+@receiver(post_delete, sender=Pricing_Sheet)
+def pricing_sheets_changed(sender, instance, **kwargs):
+    price_date = instance.price_date
+
+    def bump():
+        bump_version(WINDOWS_VERSION)
+        bump_sheet_version(price_date)
+
+    # Bumped before the commit, another process could reload the old sheets and cache them under the new version
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Station)
+@receiver(post_delete, sender=Station)
+@receiver(post_save, sender=Sales_House)
+@receiver(post_delete, sender=Sales_House)
+@receiver(post_save, sender=Hour)
+@receiver(post_delete, sender=Hour)
+@receiver(post_save, sender=Duration)
+@receiver(post_delete, sender=Duration)
+def reference_data_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version(REFERENCE_VERSION))
@@ -0,0 +1,113 @@
+from django.db import connection, transaction
+
+from .models import Break, Sales_House, Station, Station_Pricing
+from .pricing import (
+    DURATION_MISMATCH, HOUR_MISMATCH, NO_STATION_PRICING, SALES_HOUSE_MISMATCH, assign_prices,
+)
+
+BREAKS = Break._meta.db_table
+PRICES = Station_Pricing._meta.db_table
+STATIONS = Station._meta.db_table
+SALES_HOUSES = Sales_House._meta.db_table
+
+# Join conditions between a break (b) and a price row (sp), one per matching stage.
+# Hours are compared in UTC, the connection time zone Django sets when USE_TZ is on.
+STATION_MATCH = "sp.price_date = %s AND sp.station_id = b.station_id"
+SALES_HOUSE_MATCH = "(sp.sales_house_id IS NULL OR sp.sales_house_id = b.sales_house_id)"
+DURATION_MATCH = "(sp.duration IS NULL OR sp.duration = b.spot_duration)"
+HOUR_MATCH = """(
+    sp.start_hour IS NULL OR sp.end_hour IS NULL
+    OR (sp.start_hour <= EXTRACT(HOUR FROM b.standard_datetime)
+        AND EXTRACT(HOUR FROM b.standard_datetime) < sp.end_hour)
+)"""
+
+FULL_MATCH = f"{STATION_MATCH} AND {SALES_HOUSE_MATCH} AND {DURATION_MATCH} AND {HOUR_MATCH}"
+
+ASSIGN_SQL = f"""
+    UPDATE {BREAKS} AS target
+    SET price_id = m.price_id
+    FROM (
+        SELECT DISTINCT ON (b.break_id) b.break_id, sp.price_id
+        FROM {BREAKS} b
+        JOIN {PRICES} sp ON {FULL_MATCH}
+        WHERE b.break_id IN ({{window}})
+        ORDER BY b.break_id, sp.price_id DESC
+    ) m
+    WHERE target.break_id = m.break_id
+"""
+
+UNMATCHED_SQL = f"""
+    SELECT
+        b.break_id,
+        s.station_name,
+        b.standard_datetime,
+        shs.sales_house_name,
+        b.spot_duration,
+        CASE
+            WHEN NOT EXISTS (SELECT 1 FROM {PRICES} sp WHERE {STATION_MATCH})
+                THEN %s
+            WHEN NOT EXISTS (SELECT 1 FROM {PRICES} sp WHERE {STATION_MATCH} AND {SALES_HOUSE_MATCH})
+                THEN %s
+            WHEN NOT EXISTS (
+                SELECT 1 FROM {PRICES} sp
+                WHERE {STATION_MATCH} AND {SALES_HOUSE_MATCH} AND {DURATION_MATCH}
+            )
+                THEN %s
+            ELSE %s
+        END AS reason
+    FROM {BREAKS} b
+    LEFT JOIN {STATIONS} s ON s.station_id = b.station_id
+    LEFT JOIN {SALES_HOUSES} shs ON shs.sales_house_id = b.sales_house_id
+    WHERE b.break_id IN ({{window}})
+      AND NOT EXISTS (SELECT 1 FROM {PRICES} sp WHERE {FULL_MATCH})
+    ORDER BY b.break_id
+"""
+
+
+def supports_set_based_pricing():
+    return connection.vendor == 'postgresql'
+
+
+def _window_sql(breaks):
+    return breaks.values('break_id').query.sql_with_params()
+
+
+def unmatched_breaks_in_db(price_date, breaks):
+    """Return error rows, in the assign_prices_to_breaks format, for breaks with no matching price."""
+    window_sql, window_params = _window_sql(breaks)
+    params = [
+        price_date, NO_STATION_PRICING,
+        price_date, SALES_HOUSE_MISMATCH,
+        price_date, DURATION_MISMATCH,
+        HOUR_MISMATCH,
+        *window_params,
+        price_date,
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(UNMATCHED_SQL.format(window=window_sql), params)
+        columns = ['break_id', 'station', 'datetime', 'sales_house', 'duration', 'reason']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def assign_prices_in_db(price_date, breaks):
+    """
+    Price every break in the window with a single UPDATE ... FROM on PostgreSQL.
+
+    Keeps the all-or-nothing behaviour of assign_prices: unmatched breaks are
+    checked first and nothing is written if there are any. Other backends
+    fall back to the Python matcher.
+    """
+    if not supports_set_based_pricing():
+        return assign_prices(price_date, breaks)
+
+    with transaction.atomic():
+        errors = unmatched_breaks_in_db(price_date, breaks)
+        if errors:
+            return False, errors
+
+        window_sql, window_params = _window_sql(breaks)
+        with connection.cursor() as cursor:
+            cursor.execute(ASSIGN_SQL.format(window=window_sql), [price_date, *window_params])
+
+    return True, []
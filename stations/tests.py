@@ -1,3 +1,1208 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+
+from django.contrib import admin as django_admin, messages
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from campaigns.models import (
+    Campaign, Client, Commercial, Page, Page_Baseline, Page_Mapping, Product, Product_Baseline, Product_Mapping,
+)
+from SR import artifacts, exports
+from SR.artifacts import ArtifactNotFound, artifact_meta, evict_expired
+from SR.csv_ingest import parse_dates
+from SR.large_tables import estimated_count, table_estimate
+from SR.query_audit import AdminQueryAuditor, format_report
+
+from .admin import BreakAdmin
+from .bulk_pricing import assign_prices_bulk, load_breaks_frame, load_rules_frame, resolve_prices
+from . import loaders, quotes, reference, versions, windows
+from .diagnostics import break_coverage
+from .jobs import claim_next_job, enqueue_pricing_jobs, pending_upload_tokens, retry_job, run_job
+from .loaders import load_station_prices, replace_pricing_sheet
+from .models import (
+    Break, Duration, Hour, Pricing_Job, Pricing_Run, Pricing_Sheet, Sales_House, Station, Station_Pricing,
+    Unmatched_Break,
+)
+from .pricing import (
+    DURATION_MISMATCH, HOUR_MISMATCH, NO_STATION_PRICING, SALES_HOUSE_MISMATCH, PriceMatcher, assign_prices,
+)
+from .reference import REFERENCE_VERSION, get_reference_data
+from .repricing import discard_unmatched, read_unmatched, reprice_in_chunks
+from .sheet_diff import affected_breaks, apply_sheet_diff, diff_pricing_sheet
+from .sheet_loads import load_sheets
+from .sql_pricing import assign_prices_in_db
+from .uploads import ARTIFACT_KIND, load_pricing_upload, split_pricing_upload, stage_pricing_upload, staged_price_dates
+from .versions import bump_sheet_version, get_version, sheet_version_name
+from .windows import WINDOWS_VERSION, day_start, get_pricing_windows
+
+# Rows per table: enough that a per-row query shows up well over any budget
+ROWS = 30
+
+
+def create_synthetic_dataset(rows=ROWS):
+    """A few rows in every table the admin lists, with all foreign keys filled in."""
+    hours = Hour.objects.bulk_create([Hour(hour=h) for h in range(25)])
+    durations = Duration.objects.bulk_create([Duration(duration_seconds=d) for d in (10, 20, 30, 40, 60)])
+    stations = Station.objects.bulk_create([Station(station_id=i, station_name=f"Station {i}") for i in range(1, 6)])
+    sales_houses = Sales_House.objects.bulk_create(
+        [Sales_House(sales_house_id=i, sales_house_name=f"Sales House {i}") for i in range(1, 4)]
+    )
+    sheets = Pricing_Sheet.objects.bulk_create(
+        [Pricing_Sheet(price_date=datetime.date(2025, month, 1), note='') for month in (1, 2, 3)]
+    )
+    prices = Station_Pricing.objects.bulk_create([
+        Station_Pricing(
+            price_date=sheets[i % len(sheets)], station=stations[i % len(stations)],
+            start_hour=hours[i % 24], end_hour=hours[i % 24 + 1], duration=durations[i % len(durations)],
+            sales_house=sales_houses[i % len(sales_houses)], cost_type='CPT', cost=i,
+        )
+        for i in range(rows)
+    ])
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    Break.objects.bulk_create([
+        Break(
+            station=stations[i % len(stations)], sales_house=sales_houses[i % len(sales_houses)],
+            standard_datetime=start + datetime.timedelta(hours=i), spot_duration=30, price=prices[i],
+        )
+        for i in range(rows)
+    ])
+
+    run = Pricing_Run.objects.create(price_date=sheets[0].price_date, source=Pricing_Run.UPLOAD, breaks_processed=rows)
+    Unmatched_Break.objects.bulk_create([
+        Unmatched_Break(run=run, break_id=i, standard_datetime=start, reason='Hour mismatch') for i in range(rows)
+    ])
+    Pricing_Job.objects.bulk_create([
+        Pricing_Job(price_date=sheets[0].price_date, upload_token=f"{i:032x}", run=run) for i in range(rows)
+    ])
+
+    client = Client.objects.create(
+        name="Client", daily_activity_start_time=datetime.time(6), daily_activity_end_time=datetime.time(23),
+        attribution_window_duration=10, ga4_filename='client.csv', start_date=datetime.date(2025, 1, 1),
+    )
+    campaigns = Campaign.objects.bulk_create([Campaign(client=client, name=f"Campaign {i}") for i in range(3)])
+    products = Product.objects.bulk_create([
+        Product(client=client, ga_product_id=i, item_id=f"item-{i}", item_name=f"Product {i}") for i in range(rows)
+    ])
+    pages = Page.objects.bulk_create([Page(client=client, ga_page_id=i, url=f"/page/{i}") for i in range(rows)])
+    Product_Mapping.objects.bulk_create([Product_Mapping(ga_product=p, campaign=campaigns[0]) for p in products])
+    Page_Mapping.objects.bulk_create([Page_Mapping(ga_page=p, campaign=campaigns[0]) for p in pages])
+    Product_Baseline.objects.bulk_create([
+        Product_Baseline(ga_product=p, day_of_week='Mon', hour_of_day=h, baseline_session=1, baseline_sales=1)
+        for p in products[::2] for h in range(3)
+    ])
+    Page_Baseline.objects.bulk_create([
+        Page_Baseline(ga_page_id=p, day_of_week='Mon', hour_of_day=h, baseline_session=1, baseline_sales=1)
+        for p in pages[::2] for h in range(3)
+    ])
+    Commercial.objects.bulk_create([
+        Commercial(
+            advertiser_id=i, campaign=campaigns[i % len(campaigns)], clearcast_commercial_title=f"Ad {i}",
+            commercial_number=f"AD{i:04d}", web_address='https://example.com',
+        )
+        for i in range(rows)
+    ])
+
+
+class AdminQueryBudgetTests(TestCase):
+    """Every registered changelist and change form stays within its query budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_dataset()
+        cls.user = User.objects.create_superuser('audit', 'audit@example.com', 'audit')
+
+    def setUp(self):
+        # Warm process caches (reference data, pricing windows) so they don't count against the first view
+        self.auditor = AdminQueryAuditor(self.user)
+        self.auditor.run()
+
+    def test_views_within_query_budget(self):
+        views, fields = self.auditor.run()
+        over = [audit.name for audit in views if audit.over_budget]
+        self.assertEqual(over, [], "\n" + format_report(views, fields))
+
+    def test_no_fields_query_per_row(self):
+        views, fields = self.auditor.run()
+        repeated = [f"{f.admin_name} {f.field_name}" for f in fields if f.repeated]
+        self.assertEqual(repeated, [], "\n" + format_report(views, fields))
+
+
+PRICE_DATE = datetime.date(2025, 1, 1)
+
+
+def create_pricing_fixture():
+    """
+    One sheet and a break for each matching outcome: station 1 is fully
+    priceable (wildcard and specific rules), station 2 fails on sales house,
+    duration or hour, station 3 has no rules at all.
+    """
+    # The tables are built from the models, which don't mark the wildcard columns nullable
+    with connection.cursor() as cursor:
+        for column in ('sales_house_id', 'duration', 'start_hour', 'end_hour'):
+            cursor.execute(f"ALTER TABLE {Station_Pricing._meta.db_table} ALTER COLUMN {column} DROP NOT NULL")
+
+    Hour.objects.bulk_create([Hour(hour=h) for h in range(25)])
+    Duration.objects.bulk_create([Duration(duration_seconds=d) for d in (30, 60)])
+    Station.objects.bulk_create([Station(station_id=i, station_name=f"Station {i}") for i in (1, 2, 3)])
+    Sales_House.objects.bulk_create([Sales_House(sales_house_id=i, sales_house_name=f"Sales House {i}") for i in (1, 2)])
+    Pricing_Sheet.objects.create(price_date=PRICE_DATE, note='')
+
+    def rule(station_id, sales_house_id=None, duration_id=None, start=None, end=None):
+        return Station_Pricing(
+            price_date_id=PRICE_DATE, station_id=station_id, sales_house_id=sales_house_id,
+            duration_id=duration_id, start_hour_id=start, end_hour_id=end, cost_type='CPT', cost=1,
+        )
+
+    Station_Pricing.objects.bulk_create([
+        rule(1),                                    # catch-all for station 1
+        rule(1, sales_house_id=1, duration_id=30, start=6, end=12),
+        rule(1, sales_house_id=2, start=0, end=24),
+        rule(1, duration_id=60, start=18, end=24),
+        rule(2, sales_house_id=1, duration_id=30, start=0, end=12),
+    ])
+
+    def at(hour):
+        return datetime.datetime(2025, 1, 2, hour, tzinfo=datetime.timezone.utc)
+
+    Break.objects.bulk_create([
+        Break(station_id=1, sales_house_id=1, spot_duration=30, standard_datetime=at(8)),
+        Break(station_id=1, sales_house_id=1, spot_duration=30, standard_datetime=at(14)),
+        Break(station_id=1, sales_house_id=2, spot_duration=60, standard_datetime=at(20)),
+        Break(station_id=1, sales_house_id=None, spot_duration=60, standard_datetime=at(3)),
+        Break(station_id=1, sales_house_id=None, spot_duration=60, standard_datetime=at(19)),
+        Break(station_id=2, sales_house_id=2, spot_duration=30, standard_datetime=at(8)),
+        Break(station_id=2, sales_house_id=1, spot_duration=60, standard_datetime=at(8)),
+        Break(station_id=2, sales_house_id=1, spot_duration=30, standard_datetime=at(15)),
+        Break(station_id=2, sales_house_id=1, spot_duration=30, standard_datetime=at(9)),
+        Break(station_id=3, sales_house_id=1, spot_duration=30, standard_datetime=at(8)),
+    ])
+
+
+class PricingEngineTests(TestCase):
+    """The bulk and in-database pricing engines agree with PriceMatcher."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+
+    def expected(self, breaks):
+        """{break_id: (price_id, reason)} according to PriceMatcher."""
+        matcher = PriceMatcher.for_sheet(PRICE_DATE)
+        return {
+            br.break_id: matcher.match(br.station_id, br.sales_house_id, br.spot_duration, br.standard_datetime.hour)
+            for br in breaks
+        }
+
+    def assigned_prices(self, assign, breaks):
+        """{break_id: price_id} written by assign, with prices cleared before and after."""
+        breaks.update(price=None)
+        result = assign(PRICE_DATE, breaks)
+        prices = dict(breaks.values_list('break_id', 'price_id'))
+        breaks.update(price=None)
+        return result, prices
+
+    def test_fixture_covers_every_outcome(self):
+        reasons = {reason for _, reason in self.expected(Break.objects.all()).values()}
+        self.assertEqual(reasons, {None, NO_STATION_PRICING, SALES_HOUSE_MISMATCH, DURATION_MISMATCH, HOUR_MISMATCH})
+
+    def test_resolve_prices_matches_price_matcher(self):
+        breaks = Break.objects.all()
+        assigned, unmatched = resolve_prices(load_breaks_frame(breaks), load_rules_frame(PRICE_DATE))
+
+        resolved = {row.break_id: (row.price_id, None) for row in assigned.itertuples()}
+        resolved.update({row.break_id: (None, row.reason) for row in unmatched.itertuples()})
+        self.assertEqual(resolved, self.expected(breaks))
+
+    def test_assign_prices_bulk_matches_assign_prices(self):
+        priceable = Break.objects.filter(station_id=1)
+        result, prices = self.assigned_prices(assign_prices_bulk, priceable)
+        self.assertEqual(result, (True, []))
+        self.assertEqual((result, prices), self.assigned_prices(assign_prices, priceable))
+
+        breaks = Break.objects.all()
+        (success, errors), prices = self.assigned_prices(assign_prices_bulk, breaks)
+        (_, expected_errors), _ = self.assigned_prices(assign_prices, breaks)
+        self.assertFalse(success)
+        self.assertEqual(set(prices.values()), {None})
+        self.assertEqual(
+            sorted((e['break_id'], e['reason']) for e in errors),
+            sorted((e['break_id'], e['reason']) for e in expected_errors),
+        )
+
+    def test_assign_prices_in_db_matches_assign_prices(self):
+        priceable = Break.objects.filter(station_id=1)
+        result, prices = self.assigned_prices(assign_prices_in_db, priceable)
+        self.assertEqual(result, (True, []))
+        self.assertEqual((result, prices), self.assigned_prices(assign_prices, priceable))
+
+        breaks = Break.objects.all()
+        (success, errors), prices = self.assigned_prices(assign_prices_in_db, breaks)
+        (_, expected_errors), _ = self.assigned_prices(assign_prices, breaks)
+        self.assertFalse(success)
+        self.assertEqual(set(prices.values()), {None})
+        self.assertEqual(
+            sorted((e['break_id'], e['reason']) for e in errors),
+            sorted((e['break_id'], e['reason']) for e in expected_errors),
+        )
+
+    def test_reprice_in_chunks_matches_assign_prices(self):
+        priceable = Break.objects.filter(station_id=1)
+        _, expected_prices = self.assigned_prices(assign_prices, priceable)
+        for all_or_nothing in (False, True):
+            with self.subTest(all_or_nothing=all_or_nothing):
+                result, prices = self.assigned_prices(
+                    lambda price_date, breaks: reprice_in_chunks(price_date, breaks, chunk_size=2, all_or_nothing=all_or_nothing),
+                    priceable,
+                )
+                self.assertEqual(prices, expected_prices)
+                self.assertEqual((result.breaks_processed, result.breaks_priced), (len(prices), len(prices)))
+                self.assertIsNone(result.unmatched_path)
+
+    def test_reprice_in_chunks_spills_what_assign_prices_reports(self):
+        breaks = Break.objects.all()
+        (_, expected_errors), _ = self.assigned_prices(assign_prices, breaks)
+        expected_priced = {
+            break_id: price_id for break_id, (price_id, _) in self.expected(breaks).items() if price_id is not None
+        }
+
+        for all_or_nothing in (False, True):
+            with self.subTest(all_or_nothing=all_or_nothing):
+                result, prices = self.assigned_prices(
+                    lambda price_date, breaks: reprice_in_chunks(price_date, breaks, chunk_size=2, all_or_nothing=all_or_nothing),
+                    breaks,
+                )
+                try:
+                    spilled = list(read_unmatched(result.unmatched_path))
+                finally:
+                    discard_unmatched(result.unmatched_path)
+
+                self.assertEqual(
+                    [(int(row['break_id']), row['station'], row['reason']) for row in spilled],
+                    sorted((e['break_id'], e['station'], e['reason']) for e in expected_errors),
+                )
+                self.assertEqual(result.unmatched, len(expected_errors))
+                if all_or_nothing:
+                    # Like assign_prices: one miss and nothing is written
+                    self.assertEqual(result.breaks_priced, 0)
+                    self.assertEqual(set(prices.values()), {None})
+                else:
+                    self.assertEqual(result.breaks_priced, len(expected_priced))
+                    self.assertEqual({k: v for k, v in prices.items() if v is not None}, expected_priced)
+
+    def test_reprice_in_chunks_without_a_staging_table(self):
+        # Backends other than PostgreSQL write chunks in one transaction instead of staging them
+        def reprice(price_date, breaks):
+            with mock.patch.object(connection, 'vendor', 'sqlite'), CaptureQueriesContext(connection) as queries:
+                result = reprice_in_chunks(price_date, breaks, chunk_size=2, all_or_nothing=True)
+            self.assertFalse([q['sql'] for q in queries if 'reprice_staging' in q['sql']])
+            return result
+
+        priceable = Break.objects.filter(station_id=1)
+        result, prices = self.assigned_prices(reprice, priceable)
+        self.assertEqual(prices, self.assigned_prices(assign_prices, priceable)[1])
+        self.assertEqual(result.breaks_priced, len(prices))
+
+        result, prices = self.assigned_prices(reprice, Break.objects.all())
+        discard_unmatched(result.unmatched_path)
+        self.assertGreater(result.unmatched, 0)
+        self.assertEqual(result.breaks_priced, 0)
+        self.assertEqual(set(prices.values()), {None})
+
+
+class SheetDiffTests(TestCase):
+    """Incremental loads reprice exactly the breaks a full reload would change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+
+    def setUp(self):
+        reprice_in_chunks(PRICE_DATE, Break.objects.all())
+        self.sheet_admin = django_admin.site._registry[Pricing_Sheet]
+
+    def sheet_rows(self):
+        """The stored sheet as validated upload rows, in file order."""
+        return [
+            {
+                'price_date': PRICE_DATE.isoformat(), 'station_id': rule.station_id, 'start_hour': rule.start_hour_id,
+                'end_hour': rule.end_hour_id, 'duration': rule.duration_id, 'sales_house_id': rule.sales_house_id,
+                'cost_type': rule.cost_type, 'cost': rule.cost,
+            }
+            for rule in Station_Pricing.objects.filter(price_date=PRICE_DATE).order_by('price_id')
+        ]
+
+    def prices(self):
+        return dict(Break.objects.values_list('break_id', 'price_id'))
+
+    def apply_incrementally(self, rows):
+        diff = diff_pricing_sheet(PRICE_DATE, rows)
+        self.assertTrue(diff.order_preserved)
+        breaks = affected_breaks(Break.objects.all(), diff)
+        affected = set(breaks.values_list('break_id', flat=True))
+        apply_sheet_diff(diff, self.sheet_admin.build_price_instance)
+        reprice_in_chunks(PRICE_DATE, breaks)
+        return diff, affected
+
+    def full_reprice(self):
+        """Prices a full reload would give, without leaving them written."""
+        incremental = self.prices()
+        Break.objects.update(price=None)
+        reprice_in_chunks(PRICE_DATE, Break.objects.all())
+        full = self.prices()
+        for break_id, price_id in incremental.items():
+            Break.objects.filter(break_id=break_id).update(price_id=price_id)
+        return full
+
+    def test_unchanged_sheet_has_an_empty_diff(self):
+        diff = diff_pricing_sheet(PRICE_DATE, self.sheet_rows())
+        self.assertTrue(diff.unchanged)
+        self.assertEqual(diff.touched_rules, [])
+        self.assertEqual(
+            set(affected_breaks(Break.objects.all(), diff).values_list('break_id', flat=True)),
+            set(Break.objects.filter(price__isnull=True).values_list('break_id', flat=True)),
+        )
+
+    def test_cost_change_is_an_update_that_reprices_nothing_new(self):
+        rows = self.sheet_rows()
+        rows[1]['cost'] = 99
+        before = self.prices()
+        diff, affected = self.apply_incrementally(rows)
+        self.assertEqual((len(diff.inserts), len(diff.updates), len(diff.deletes)), (0, 1, 0))
+        self.assertEqual(affected, {k for k, v in before.items() if v is None})
+        self.assertEqual(self.prices(), before)
+        self.assertEqual(Station_Pricing.objects.get(price_id=before[Break.objects.get(station_id=1, standard_datetime__hour=8).pk]).cost, 99)
+
+    def test_edited_rule_reprices_only_the_breaks_it_covers(self):
+        # Widen station 2's only rule from 0-12 to 0-16, which also covers its 15:00 break
+        rows = self.sheet_rows()
+        self.assertEqual((rows[-1]['station_id'], rows[-1]['end_hour']), (2, 12))
+        rows[-1]['end_hour'] = 16
+        # A station 1 break that lost its price, e.g. to an earlier failed run, is repriced too
+        stale = Break.objects.get(station_id=1, sales_house_id=2)
+        Break.objects.filter(pk=stale.pk).update(price=None)
+        before = self.prices()
+
+        diff, affected = self.apply_incrementally(rows)
+        self.assertEqual((len(diff.inserts), len(diff.updates), len(diff.deletes)), (1, 0, 1))
+
+        station_2_covered = set(
+            Break.objects.filter(station_id=2, sales_house_id=1, spot_duration=30).values_list('break_id', flat=True)
+        )
+        unpriced = {k for k, v in before.items() if v is None}
+        self.assertEqual(affected, station_2_covered | unpriced)
+        self.assertIn(stale.pk, affected)
+        # Priced breaks on station 1 keep their rows untouched
+        self.assertFalse(affected & set(Break.objects.filter(station_id=1, price__isnull=False).values_list('break_id', flat=True)) - {stale.pk})
+
+        after = self.prices()
+        self.assertIsNotNone(after[stale.pk])
+        self.assertIsNotNone(after[Break.objects.get(station_id=2, sales_house_id=1, spot_duration=30, standard_datetime__hour=15).pk])
+        self.assertEqual(after, self.full_reprice())
+
+    def test_added_rule_takes_over_priced_breaks_it_covers(self):
+        # Station 1's 14:00 break is priced by the catch-all; a later, narrower rule wins it
+        rows = self.sheet_rows()
+        rows.append(dict(rows[1], start_hour=13, end_hour=16, cost=5))
+        covered = Break.objects.get(station_id=1, sales_house_id=1, standard_datetime__hour=14)
+        outside = Break.objects.get(station_id=1, sales_house_id=1, standard_datetime__hour=8)
+        before = self.prices()
+        self.assertIsNotNone(before[covered.pk])
+
+        diff, affected = self.apply_incrementally(rows)
+        self.assertEqual((len(diff.inserts), len(diff.updates), len(diff.deletes)), (1, 0, 0))
+        self.assertIn(covered.pk, affected)
+        self.assertNotIn(outside.pk, affected)
+
+        after = self.prices()
+        self.assertEqual(Station_Pricing.objects.get(price_id=after[covered.pk]).cost, 5)
+        self.assertEqual(after[outside.pk], before[outside.pk])
+        self.assertEqual(after, self.full_reprice())
+
+
+PRICING_HEADER = 'price_date,station_name,start_hour,end_hour,duration,sales_house_name,cost_type,cost'
+
+
+def pricing_csv(rows):
+    """An uploaded pricing CSV holding rows of PRICING_HEADER values (None for an empty field)."""
+    lines = [PRICING_HEADER] + [','.join('' if value is None else str(value) for value in row) for row in rows]
+    return io.BytesIO(('\n'.join(lines) + '\n').encode())
+
+
+def reset_process_caches():
+    """Forget cached versions, reference data and windows, which outlive each test's rollback."""
+    versions._checked.clear()
+    reference._cached['version'] = None
+    windows._cached['version'] = None
+    quotes._sheets.clear()
+
+
+class UploadTestCase(TestCase):
+    """Stages uploads in a throwaway directory and starts each test with cold process caches."""
+
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.staging_dir = staging.name
+        self.enterContext(override_settings(UPLOAD_STAGING_DIR=self.staging_dir))
+        reset_process_caches()
+        self.addCleanup(reset_process_caches)
+
+    def stage(self, rows):
+        token, _ = stage_pricing_upload(pricing_csv(rows))
+        return token
+
+    def age_artifact(self, token, seconds):
+        past = time.time() - seconds
+        os.utime(os.path.join(self.staging_dir, token), (past, past))
+
+
+class JobQueueTests(UploadTestCase):
+    """Queued pricing jobs: claiming, running, failing without writes, and retrying."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+
+    def catch_all_rows(self, station_ids):
+        return [('01/01/2025', f"Station {station_id}", None, None, None, None, 'CPT', 2) for station_id in station_ids]
+
+    def run_next(self):
+        job = claim_next_job()
+        self.assertEqual(job.status, Pricing_Job.RUNNING)
+        self.assertIsNotNone(job.started_at)
+        return run_job(job, chunk_size=3)
+
+    def test_claim_next_job_takes_the_oldest_queued_job(self):
+        first, second = Pricing_Job.objects.bulk_create([
+            Pricing_Job(price_date=PRICE_DATE, upload_token='a' * 32), Pricing_Job(price_date=PRICE_DATE, upload_token='b' * 32),
+        ])
+        self.assertEqual(claim_next_job().pk, first.pk)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(set(Pricing_Job.objects.values_list('status', flat=True)), {Pricing_Job.RUNNING})
+
+    def test_job_that_prices_every_break_succeeds_and_discards_its_upload(self):
+        [job] = enqueue_pricing_jobs(self.stage(self.catch_all_rows([1, 2, 3])))
+        self.assertEqual(job.status, Pricing_Job.QUEUED)
+
+        job = self.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Pricing_Job.SUCCEEDED, job.message)
+        self.assertEqual((job.rows_inserted, job.breaks_total), (3, Break.objects.count()))
+        self.assertEqual((job.breaks_processed, job.breaks_priced, job.unmatched_count), (job.breaks_total, job.breaks_total, 0))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.run.source, Pricing_Run.JOB)
+
+        new_rules = set(Station_Pricing.objects.filter(price_date=PRICE_DATE).values_list('price_id', flat=True))
+        self.assertEqual(set(Break.objects.values_list('price_id', flat=True)), new_rules)
+        with self.assertRaises(ArtifactNotFound):
+            artifact_meta(job.upload_token, ARTIFACT_KIND)
+
+    def test_failed_job_writes_nothing_and_keeps_its_upload_pinned(self):
+        # No rule for station 3, so its break can't be priced and the whole window is left alone
+        [job] = enqueue_pricing_jobs(self.stage(self.catch_all_rows([1, 2])))
+        job = self.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Pricing_Job.FAILED)
+        self.assertEqual(job.unmatched_count, 1)
+        self.assertEqual(job.unmatched_reasons, {NO_STATION_PRICING: 1})
+        self.assertEqual(job.breaks_priced, 0)
+        self.assertEqual(list(job.run.unmatched_breaks.values_list('reason', flat=True)), [NO_STATION_PRICING])
+        self.assertFalse(Break.objects.filter(price__isnull=False).exists())
+
+        self.assertIn(job.upload_token, set(pending_upload_tokens()))
+        with override_settings(UPLOAD_STAGING_TTL=60):
+            self.age_artifact(job.upload_token, 3600)
+            evict_expired()
+            self.assertEqual(artifact_meta(job.upload_token, ARTIFACT_KIND)['rows'], 2)
+
+    def test_retried_job_runs_again_from_its_upload(self):
+        [job] = enqueue_pricing_jobs(self.stage(self.catch_all_rows([1, 2])))
+        job = self.run_next()
+        self.assertEqual(job.status, Pricing_Job.FAILED)
+
+        self.assertTrue(retry_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Pricing_Job.QUEUED)
+        self.assertEqual((job.breaks_processed, job.unmatched_count, job.unmatched_reasons, job.run), (0, 0, {}, None))
+        self.assertIsNone(job.finished_at)
+
+        # Once the unpriceable break is gone the same upload goes through
+        Break.objects.filter(station_id=3).delete()
+        job = self.run_next()
+        self.assertEqual(job.status, Pricing_Job.SUCCEEDED, job.message)
+        self.assertFalse(Break.objects.filter(price__isnull=True).exists())
+
+    def test_retry_needs_the_upload(self):
+        job = Pricing_Job.objects.create(price_date=PRICE_DATE, upload_token='c' * 32, status=Pricing_Job.FAILED)
+        self.assertFalse(retry_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Pricing_Job.FAILED)
+
+    def test_job_whose_upload_is_gone_fails_with_a_message(self):
+        job = Pricing_Job.objects.create(price_date=PRICE_DATE, upload_token='d' * 32)
+        job = self.run_next()
+        self.assertEqual(job.status, Pricing_Job.FAILED)
+        self.assertIn("upload has expired", job.message)
+        self.assertEqual(Station_Pricing.objects.filter(price_date=PRICE_DATE).count(), 5)
+
+
+class MultiDateUploadTests(UploadTestCase):
+    """An upload holding two sheets, split per date and loaded in the request or queued as jobs."""
+
+    NEXT_DATE = datetime.date(2025, 1, 5)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+        # Breaks in the window a sheet for NEXT_DATE opens
+        Break.objects.bulk_create([
+            Break(station_id=station_id, sales_house_id=1, spot_duration=30,
+                  standard_datetime=datetime.datetime(2025, 1, 6, 8, tzinfo=datetime.timezone.utc))
+            for station_id in (1, 2, 2)
+        ])
+
+    def stage_two_dates(self, extra=()):
+        # Catch-all rules for each date, interleaved in the file
+        return self.stage([
+            ('01/01/2025', 'Station 1', None, None, None, None, 'CPT', 2),
+            ('2025-01-05', 'Station 1', None, None, None, None, 'CPT', 7),
+            ('01/01/2025', 'Station 2', None, None, None, None, 'CPT', 2),
+            ('05/01/2025', 'Station 2', None, None, None, None, 'CPT', 7),
+            ('01/01/2025', 'Station 3', None, None, None, None, 'CPT', 2),
+            *extra,
+        ])
+
+    def assert_priced_by_own_window(self):
+        """Every break is priced by its station's rule on the sheet whose window it falls in."""
+        window_start = day_start(self.NEXT_DATE)
+        priced = {
+            br.break_id: (br.price.price_date_id, br.price.station_id)
+            for br in Break.objects.select_related('price')
+        }
+        expected = {
+            br.break_id: (self.NEXT_DATE if br.standard_datetime >= window_start else PRICE_DATE, br.station_id)
+            for br in Break.objects.all()
+        }
+        self.assertEqual(priced, expected)
+        self.assertEqual(len({price_date for price_date, _ in priced.values()}), 2)
+
+    def test_split_upload_keeps_each_dates_rows_in_file_order(self):
+        token = self.stage_two_dates()
+        date_tokens = split_pricing_upload(token)
+        self.assertEqual([price_date for price_date, _ in date_tokens], [str(PRICE_DATE), str(self.NEXT_DATE)])
+        self.assertEqual(
+            [[row['station_id'] for row in load_pricing_upload(date_token)] for _, date_token in date_tokens],
+            [[1, 2, 3], [1, 2]],
+        )
+        with self.assertRaises(ArtifactNotFound):
+            artifact_meta(token, ARTIFACT_KIND)
+
+    def test_load_sheets_prices_each_window_from_its_own_sheet(self):
+        date_tokens = split_pricing_upload(self.stage_two_dates())
+        grouped_rows = {price_date: load_pricing_upload(date_token) for price_date, date_token in date_tokens}
+
+        # In the request the new sheet is committed, and its version bumped, as soon as
+        # it is saved. Threads use their own connections, which can't see this test's data.
+        with mock.patch.object(transaction, 'on_commit', lambda func, *args, **kwargs: func()):
+            results = load_sheets(django_admin.site._registry[Pricing_Sheet], grouped_rows, workers=1)
+
+        self.assertEqual([(r.price_date, r.success, r.error) for r in results], [
+            (str(PRICE_DATE), True, None), (str(self.NEXT_DATE), True, None),
+        ])
+        self.assertEqual((results[0].breaks, results[1].breaks), (10, 3))
+        self.assertIn((messages.INFO, f"Pricing sheet for {self.NEXT_DATE} was automatically created."), results[1].notes)
+        self.assertEqual(list(Pricing_Sheet.objects.order_by('price_date').values_list('price_date', flat=True)), [
+            PRICE_DATE, self.NEXT_DATE,
+        ])
+        self.assert_priced_by_own_window()
+
+    def test_enqueue_creates_every_sheet_before_any_job(self):
+        last_date = datetime.date(2025, 1, 8)
+        token = self.stage_two_dates(extra=[('08/01/2025', 'Station 1', None, None, None, None, 'CPT', 9)])
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            jobs = enqueue_pricing_jobs(token)
+
+        self.assertEqual([job.price_date for job in jobs], [str(PRICE_DATE), str(self.NEXT_DATE), str(last_date)])
+        self.assertEqual([job.status for job in jobs], [Pricing_Job.QUEUED] * 3)
+        self.assertEqual([staged_price_dates(job.upload_token) for job in jobs], [
+            [str(PRICE_DATE)], [str(self.NEXT_DATE)], [str(last_date)],
+        ])
+
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO')]
+        sheet_inserts = [i for i, sql in enumerate(inserts) if sql.startswith('INSERT INTO "sr_pricing_sheets"')]
+        job_inserts = [i for i, sql in enumerate(inserts) if sql.startswith('INSERT INTO "sr_pricing_jobs"')]
+        self.assertEqual((len(sheet_inserts), len(job_inserts)), (2, 3))
+        self.assertLess(max(sheet_inserts), min(job_inserts))
+
+        for _ in jobs:
+            job = claim_next_job()
+            self.assertEqual(run_job(job).status, Pricing_Job.SUCCEEDED, job.message)
+        self.assert_priced_by_own_window()
+
+    def test_enqueue_rolls_back_sheets_if_a_job_cant_be_queued(self):
+        # The first job is queued, the second fails
+        with mock.patch.object(Pricing_Job, 'save', side_effect=[None, DatabaseError("no jobs table")]):
+            with self.assertRaises(DatabaseError):
+                enqueue_pricing_jobs(self.stage_two_dates())
+
+        self.assertEqual(list(Pricing_Sheet.objects.values_list('price_date', flat=True)), [PRICE_DATE])
+        self.assertFalse(Pricing_Job.objects.exists())
+        # Neither the upload nor its per-date parts are left behind
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+
+class PriceQuoteTests(TestCase):
+    """The price-quote endpoint, and its compiled-sheet cache following sheet versions."""
+
+    url = '/stations/price-quote/'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        reset_process_caches()
+        self.addCleanup(reset_process_caches)
+        self.client.force_login(self.user)
+
+    def expected_price_id(self, station_id, sales_house_id, duration, hour):
+        return PriceMatcher.for_sheet(PRICE_DATE).match(station_id, sales_house_id, duration, hour)[0]
+
+    def quote(self, **params):
+        response = self.client.get(self.url, dict({'station_id': 1, 'sales_house_id': 1, 'duration': 30,
+                                                   'datetime': '2025-01-02T08:00:00Z'}, **params))
+        return response.status_code, response.json()
+
+    def post(self, body):
+        response = self.client.post(self.url, body, content_type='application/json')
+        return response.status_code, response.json()
+
+    def test_get_quotes_one_spot(self):
+        status, quote = self.quote()
+        self.assertEqual(status, 200)
+        price_id = self.expected_price_id(1, 1, 30, 8)
+        self.assertEqual(quote['price_id'], price_id)
+        self.assertEqual(quote['price_date'], PRICE_DATE.isoformat())
+        self.assertEqual((quote['cost_type'], quote['cost']), ('CPT', 1))
+
+        status, quote = self.quote(station_id=3)
+        self.assertEqual((status, quote['price_id'], quote['reason']), (200, None, NO_STATION_PRICING))
+
+        status, quote = self.quote(datetime='2024-12-31T23:00:00Z')
+        self.assertEqual((status, quote['reason']), (200, "No pricing sheet"))
+
+    def test_post_quotes_each_spot(self):
+        spots = [
+            {'station_id': 1, 'sales_house_id': 2, 'duration': 60, 'datetime': '2025-01-02T20:00:00Z'},
+            {'station_id': 2, 'sales_house_id': 1, 'duration': 30, 'datetime': '2025-01-02T15:00:00+00:00'},
+            {'station_id': 1, 'sales_house_id': '', 'duration': 60, 'datetime': '2025-01-02T03:00:00'},
+        ]
+        status, body = self.post(spots)
+        self.assertEqual(status, 200)
+        self.assertEqual([quote['price_id'] for quote in body['quotes']], [
+            self.expected_price_id(1, 2, 60, 20), None, self.expected_price_id(1, None, 60, 3),
+        ])
+        self.assertEqual(body['quotes'][1]['reason'], HOUR_MISMATCH)
+        self.assertEqual(self.post([]), (200, {'quotes': []}))
+
+    def test_bad_requests_are_400s(self):
+        for params in ({'station_id': ''}, {'station_id': 'x'}, {'datetime': 'tomorrow'}, {'duration': '30s'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.quote(**params)[0], 400)
+        self.assertEqual(self.client.get(self.url, {'datetime': '2025-01-02T08:00:00Z'}).status_code, 400)
+
+        for body in ('[1]', '["x"]', '[null]', '{"station_id": 1}', '"spots"', 'not json', '[{"station_id": 1}]'):
+            with self.subTest(body=body):
+                status, response = self.post(body)
+                self.assertEqual(status, 400)
+                self.assertIn('error', response)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_quotes_follow_sheet_version_bumps(self):
+        rule_id = self.expected_price_id(1, 1, 30, 8)
+        self.assertEqual(self.quote()[1]['cost'], 1)
+
+        # Until the sheet's version moves, the compiled sheet is reused
+        Station_Pricing.objects.filter(price_id=rule_id).update(cost=7)
+        self.assertEqual(self.quote()[1]['cost'], 1)
+
+        bump_sheet_version(PRICE_DATE)
+        self.assertEqual(self.quote()[1]['cost'], 7)
+
+        # A bump made by another process is seen once this process checks the version again
+        Station_Pricing.objects.filter(price_id=rule_id).update(cost=8)
+        with connection.cursor() as cursor:
+            cursor.execute(versions.BUMP_SQL, [sheet_version_name(PRICE_DATE)])
+        self.assertEqual(self.quote()[1]['cost'], 7)
+        with mock.patch.object(versions, 'CHECK_INTERVAL', 0):
+            self.assertEqual(self.quote()[1]['cost'], 8)
+
+
+class SheetLoaderTests(UploadTestCase):
+    """COPY and executemany load the same rows, in file order."""
+
+    FIELDS = ['price_date', 'station_id', 'start_hour_id', 'end_hour_id', 'duration_id', 'sales_house_id', 'cost_type', 'cost']
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+
+    def setUp(self):
+        super().setUp()
+        self.rows = load_pricing_upload(self.stage([
+            ('01/01/2025', 'Station 2', 6, 12, 30, 'Sales House 1', 'CPT', 10.5),
+            ('2025-01-01', 'Station 1', None, None, None, None, 'CPT', 1),
+            ('01/01/2025', 'Station 3', 0, 24, 60, None, 'SPT', 2.25),
+            ('01/01/2025', 'Station 1', 18, 24, None, 'Sales House 2', 'CPT', 0),
+        ]))
+
+    def stored(self):
+        return list(Station_Pricing.objects.filter(price_date=PRICE_DATE).order_by('price_id').values_list(*self.FIELDS))
+
+    def test_copy_and_executemany_insert_the_same_rows(self):
+        Station_Pricing.objects.all().delete()
+        loaded = {}
+        for method in ('copy', 'executemany'):
+            with self.subTest(method=method):
+                self.assertEqual(load_station_prices(self.rows, method=method), 4)
+                loaded[method] = self.stored()
+                Station_Pricing.objects.all().delete()
+
+        # psycopg2's copy_expert path, fed through psycopg 3's COPY
+        class CopyExpertCursor:
+            def __init__(self, raw):
+                self.raw = raw
+
+            def copy_expert(self, sql, file):
+                with self.raw.copy(sql) as copy:
+                    copy.write(file.read())
+
+        with connection.cursor() as cursor:
+            self.assertEqual(loaders._copy_rows(SimpleNamespace(cursor=CopyExpertCursor(cursor.cursor)), self.rows), 4)
+        loaded['copy_expert'] = self.stored()
+
+        self.assertEqual(loaded['copy'], loaded['executemany'])
+        self.assertEqual(loaded['copy_expert'], loaded['executemany'])
+        self.assertEqual(loaded['copy'], [
+            (PRICE_DATE, 2, 6, 12, 30, 1, 'CPT', 10.5),
+            (PRICE_DATE, 1, None, None, None, None, 'CPT', 1),
+            (PRICE_DATE, 3, 0, 24, 60, None, 'SPT', 2.25),
+            (PRICE_DATE, 1, 18, 24, None, 2, 'CPT', 0),
+        ])
+
+    def test_replace_pricing_sheet_swaps_the_rows_and_bumps_the_version_on_commit(self):
+        version = get_version(sheet_version_name(PRICE_DATE))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(replace_pricing_sheet(PRICE_DATE, self.rows), (5, False, 4))
+            self.assertEqual(get_version(sheet_version_name(PRICE_DATE)), version)
+
+        self.assertEqual([row[1] for row in self.stored()], [2, 1, 3, 1])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_version(sheet_version_name(PRICE_DATE)), version + 1)
+
+
+class CacheVersionTests(TestCase):
+    """Process caches reload once a version bump is committed, here or in another process."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+
+    def setUp(self):
+        reset_process_caches()
+        self.addCleanup(reset_process_caches)
+
+    def bump_elsewhere(self, name):
+        # What another process's bump_version does: this process's memo isn't touched
+        with connection.cursor() as cursor:
+            cursor.execute(versions.BUMP_SQL, [name])
+
+    def test_reference_data_reloads_once_a_station_save_commits(self):
+        self.assertNotIn(4, get_reference_data().station_names)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Station.objects.create(station_id=4, station_name="Station 4")
+        # Not committed yet, so other processes can't have seen it either
+        self.assertNotIn(4, get_reference_data().station_names)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_reference_data().station_ids["Station 4"], 4)
+
+    def test_pricing_windows_reload_once_a_sheet_save_commits(self):
+        next_date = PRICE_DATE + datetime.timedelta(days=7)
+        self.assertIsNone(get_pricing_windows().window(PRICE_DATE).end)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pricing_Sheet.objects.create(price_date=next_date, note='')
+
+        pricing_windows = get_pricing_windows()
+        self.assertEqual(pricing_windows.price_dates, [PRICE_DATE, next_date])
+        self.assertEqual(pricing_windows.window(PRICE_DATE).end, day_start(next_date))
+
+    def test_bump_from_another_process_is_seen_after_the_check_interval(self):
+        old_reference = get_reference_data()
+        old_windows = get_pricing_windows()
+
+        # Written without signals, then bumped by "another process"
+        Station.objects.filter(station_id=1).update(station_name="Renamed")
+        Pricing_Sheet.objects.bulk_create([Pricing_Sheet(price_date=PRICE_DATE + datetime.timedelta(days=7), note='')])
+        self.bump_elsewhere(REFERENCE_VERSION)
+        self.bump_elsewhere(WINDOWS_VERSION)
+
+        # The memoized version is reused until CHECK_INTERVAL has passed
+        self.assertIs(get_reference_data(), old_reference)
+        self.assertIs(get_pricing_windows(), old_windows)
+
+        with mock.patch.object(versions, 'CHECK_INTERVAL', 0):
+            self.assertEqual(get_reference_data().station_names[1], "Renamed")
+            self.assertEqual(len(get_pricing_windows()), 2)
+
+
+def mirror_exclusive_schema():
+    """
+    The raw export SQL reads the lookup tables from sr_exclusive, where they
+    live in production; the test database builds them in public.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE SCHEMA IF NOT EXISTS sr_exclusive")
+        for model in (Station, Hour, Sales_House):
+            table = model._meta.db_table
+            cursor.execute(f"CREATE VIEW sr_exclusive.{table} AS SELECT * FROM public.{table}")
+
+
+def read_csv_rows(body, types):
+    """Header and typed rows of a CSV body; empty fields are None. COPY and csv.writer format floats differently."""
+    header, *rows = csv.reader(io.StringIO(body.decode()))
+    return header, [
+        [None if value == '' else convert(value) for convert, value in zip(types, row)] for row in rows
+    ]
+
+
+class PricingExportTests(TestCase):
+    """The pricing sheet CSV export, streamed through COPY and through the cursor fallback."""
+
+    url = '/admin/stations/pricing_sheet/export-csv/'
+    types = (str, str, int, int, int, str, str, float)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_pricing_fixture()
+        mirror_exclusive_schema()
+        # A second sheet, which the export must leave out
+        Pricing_Sheet.objects.create(price_date=PRICE_DATE + datetime.timedelta(days=7), note='')
+        Station_Pricing.objects.create(
+            price_date_id=PRICE_DATE + datetime.timedelta(days=7), station_id=3, cost_type='SPT', cost=9.5,
+        )
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def expected_rows(self):
+        # Not select_related: the wildcard columns are nullable here but not on the models
+        stations = dict(Station.objects.values_list('station_id', 'station_name'))
+        sales_houses = dict(Sales_House.objects.values_list('sales_house_id', 'sales_house_name'))
+        return [
+            [
+                str(row.price_date_id), stations[row.station_id], row.start_hour_id, row.end_hour_id, row.duration_id,
+                sales_houses.get(row.sales_house_id), row.cost_type, row.cost,
+            ]
+            for row in Station_Pricing.objects.filter(price_date=PRICE_DATE).order_by('price_id')
+        ]
+
+    def export(self, vendor, **data):
+        response = self.client.post(self.url, dict(price_date=str(PRICE_DATE), **data))
+        self.assertTrue(response.streaming)
+        # The query only runs as the body is read
+        unused = exports._copy_chunks if vendor != 'postgresql' else exports._cursor_chunks
+        with mock.patch.object(connection, 'vendor', vendor), \
+                mock.patch.object(exports, unused.__name__, side_effect=AssertionError(f"{unused.__name__} used")):
+            body = b''.join(response.streaming_content)
+        return response, body
+
+    def test_csv_matches_the_sheet(self):
+        for vendor in ('postgresql', 'sqlite'):
+            with self.subTest(vendor=vendor):
+                response, body = self.export(vendor)
+                self.assertEqual(response['Content-Type'], 'text/csv')
+                self.assertIn(f'filename="station_prices_{PRICE_DATE}.csv"', response['Content-Disposition'])
+
+                header, rows = read_csv_rows(body, self.types)
+                self.assertEqual(header, [
+                    'price_date', 'station_name', 'start_hour', 'end_hour', 'duration', 'sales_house_name', 'cost_type', 'cost',
+                ])
+                self.assertEqual(len(rows), 5)
+                self.assertEqual(rows, self.expected_rows())
+
+    def test_gzip_holds_the_same_csv(self):
+        for vendor in ('postgresql', 'sqlite'):
+            with self.subTest(vendor=vendor):
+                _, plain = self.export(vendor)
+                response, body = self.export(vendor, gzip='1')
+                self.assertEqual(response['Content-Type'], 'application/gzip')
+                self.assertIn(f'filename="station_prices_{PRICE_DATE}.csv.gz"', response['Content-Disposition'])
+                self.assertEqual(gzip.decompress(body), plain)
+
+
+class ParseDatesTests(SimpleTestCase):
+    def test_only_iso_and_day_first_dates_are_accepted(self):
+        values = pd.Series([
+            '2025-01-02', '02/01/2025', '2/1/2025', ' 2025-03-04 ', None,
+            '2025/01/02', '02-01-2025', 'Jan 2 2025', '20250102', '31/02/2025', '2025-01-02 10:00',
+        ])
+        parsed = parse_dates(values)
+        self.assertEqual(
+            [None if pd.isna(value) else value.date() for value in parsed],
+            [datetime.date(2025, 1, 2)] * 3 + [datetime.date(2025, 3, 4)] + [None] * 7,
+        )
+
+
+class ArtifactTests(SimpleTestCase):
+    """Artifacts written chunk by chunk read back exactly as the frames that went in."""
+
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.staging_dir = staging.name
+        self.enterContext(override_settings(UPLOAD_STAGING_DIR=self.staging_dir, UPLOAD_STAGING_TTL=60))
+        # Only the tokens a test pins, not the job queue's
+        self.pins = []
+        self.enterContext(mock.patch.object(artifacts, '_pins', self.pins))
+
+    def write(self, *chunks, meta=None):
+        with artifacts.ArtifactWriter('test') as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+            return writer.finish(meta)
+
+    def age(self, token, seconds):
+        past = time.time() - seconds
+        os.utime(os.path.join(self.staging_dir, token), (past, past))
+
+    def chunks(self):
+        return [
+            pd.DataFrame({
+                'name': ['a', None, 'bb'],
+                'count': pd.array([1, None, -3], dtype='Int64'),
+                'cost': [1.5, float('nan'), 0.0],
+                'flag': [True, False, True],
+            }),
+            # Wider strings than the first chunk, then a chunk of nulls only
+            pd.DataFrame({
+                'name': ['Station with a long name', 'é'],
+                'count': pd.array([2 ** 40, 0], dtype='Int64'),
+                'cost': [2.25, -1.0],
+                'flag': [False, False],
+            }),
+            pd.DataFrame({
+                'name': pd.Series([None, None], dtype=object),
+                'count': pd.array([None, None], dtype='Int64'),
+                'cost': [3.0, 4.0],
+                'flag': [True, True],
+            }),
+        ]
+
+    def expected(self):
+        frame = pd.concat(self.chunks(), ignore_index=True)
+        # Null strings come back as None
+        frame['name'] = frame['name'].astype(object).where(frame['name'].notna(), None)
+        return frame
+
+    def test_chunks_round_trip(self):
+        token = self.write(*self.chunks(), meta={'source': 'upload.csv'})
+
+        frame = artifacts.load_frame(token, 'test')
+        pd.testing.assert_frame_equal(frame, self.expected())
+        self.assertEqual(frame['name'].tolist(), ['a', None, 'bb', 'Station with a long name', 'é', None, None])
+        self.assertEqual(frame['count'].tolist(), [1, pd.NA, -3, 2 ** 40, 0, pd.NA, pd.NA])
+        self.assertEqual(artifact_meta(token, 'test'), {'source': 'upload.csv', 'rows': 7})
+
+        pd.testing.assert_frame_equal(
+            artifacts.load_frame(token, 'test', columns=['count']), self.expected()[['count']]
+        )
+
+    def test_iter_frame_yields_ordered_slices(self):
+        token = self.write(*self.chunks())
+
+        slices = list(artifacts.iter_frame(token, 'test', slice_size=3))
+        self.assertEqual([len(df) for df in slices], [3, 3, 1])
+        self.assertEqual([df.index[0] for df in slices], [0, 3, 6])
+        pd.testing.assert_frame_equal(pd.concat(slices), self.expected())
+
+        names = list(artifacts.iter_frame(token, 'test', columns=['name'], slice_size=5))
+        self.assertEqual([list(df.columns) for df in names], [['name'], ['name']])
+        pd.testing.assert_frame_equal(pd.concat(names), self.expected()[['name']])
+
+    def test_zero_rows(self):
+        empty = self.chunks()[0].iloc[:0]
+        for token in (self.write(empty), self.write()):
+            with self.subTest(token=token):
+                self.assertEqual(artifact_meta(token, 'test')['rows'], 0)
+                self.assertEqual(len(artifacts.load_frame(token, 'test')), 0)
+                self.assertEqual(list(artifacts.iter_frame(token, 'test')), [])
+        self.assertEqual(list(artifacts.load_frame(self.write(empty), 'test').columns), list(empty.columns))
+
+    def test_chunks_must_match(self):
+        with self.assertRaises(ValueError), artifacts.ArtifactWriter('test') as writer:
+            writer.append(pd.DataFrame({'a': [1]}))
+            writer.append(pd.DataFrame({'a': ['text']}))
+        # The partial artifact is removed
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+    def test_expired_artifacts_go_unless_pinned(self):
+        expired, pinned, fresh = (self.write(self.chunks()[0]) for _ in range(3))
+        self.pins.append(lambda: [pinned])
+        self.age(expired, 120)
+        self.age(pinned, 120)
+
+        with self.assertRaises(ArtifactNotFound):
+            artifacts.load_frame(expired, 'test')
+        self.assertFalse(os.path.exists(os.path.join(self.staging_dir, expired)))
+        self.assertEqual(len(artifacts.load_frame(pinned, 'test')), 3)
+
+        self.age(fresh, 120)
+        self.assertEqual(evict_expired(), 1)
+        self.assertEqual(sorted(os.listdir(self.staging_dir)), [pinned])
+
+        self.pins.clear()
+        self.assertEqual(evict_expired(), 1)
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+
+class LargeTableChangelistTests(TestCase):
+    """Keyset pages and estimated counts on the breaks changelist."""
+
+    url = '/admin/stations/break/'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_dataset()
+        # Breaks sharing a standard_datetime, so pages have to fall back to break_id
+        first = Break.objects.order_by('standard_datetime').first()
+        Break.objects.bulk_create([
+            Break(station_id=first.station_id, standard_datetime=first.standard_datetime + datetime.timedelta(hours=h), spot_duration=30)
+            for h in (3, 3, 3, 10, 10)
+        ])
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def page(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        cl = response.context['cl']
+        return cl, [row.pk for row in cl.result_list]
+
+    @mock.patch.object(BreakAdmin, 'list_per_page', 4)
+    def test_keyset_pages_walk_every_break_both_ways(self):
+        expected = list(Break.objects.order_by('-standard_datetime', '-break_id').values_list('pk', flat=True))
+
+        cl, ids = self.page()
+        self.assertIsNone(cl.newer_url)
+        pages = [ids]
+        while cl.older_url:
+            cl, ids = self.page(cl.older_url)
+            pages.append(ids)
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual([len(page) for page in pages[:-1]], [4] * (len(pages) - 1))
+
+        for previous in reversed(pages[:-1]):
+            cl, ids = self.page(cl.newer_url)
+            self.assertEqual(ids, previous)
+        self.assertIsNone(cl.newer_url)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url + '?after=not-a-cursor')
+        self.assertEqual(response.status_code, 302)
+
+    def test_sorting_is_limited_to_sortable_by(self):
+        # Breaks have no actions, so there is no checkbox column: 0 is break_id, 3 is sales_house
+        cl, ids = self.page('?o=3')
+        self.assertTrue(cl.keyset)
+        self.assertNotIn('o', cl.params)
+        self.assertEqual(ids, list(Break.objects.order_by('-standard_datetime', '-break_id').values_list('pk', flat=True)[:len(ids)]))
+
+        cl, ids = self.page('?o=3.-0')
+        self.assertFalse(cl.keyset)
+        self.assertEqual(cl.params['o'], '-0')
+        self.assertEqual(ids, list(Break.objects.order_by('-break_id').values_list('pk', flat=True)[:len(ids)]))
+
+    def test_date_range_filter(self):
+        day = datetime.date(2025, 1, 2)
+        cl, ids = self.page('?standard_datetime__from=2025-01-02&standard_datetime__to=2025-01-02')
+        expected = Break.objects.filter(standard_datetime__date=day)
+        self.assertTrue(expected.exists())
+        self.assertEqual(sorted(ids), sorted(expected.values_list('pk', flat=True)))
+
+        # Open-ended: everything from the day on
+        cl, ids = self.page('?standard_datetime__from=2025-01-02')
+        self.assertEqual(sorted(ids), sorted(Break.objects.filter(standard_datetime__date__gte=day).values_list('pk', flat=True)))
+
+        response = self.client.get(self.url + '?standard_datetime__from=02/01/2025')
+        self.assertEqual(response.status_code, 302)
+
+    def test_coverage_panel_needs_a_bounded_range(self):
+        response = self.client.get(self.url + '?standard_datetime__from=2025-01-01&standard_datetime__to=2025-01-02')
+        self.assertEqual(response.context['coverage']['days'], [datetime.date(2025, 1, 1), datetime.date(2025, 1, 2)])
+
+        for query in ('', '?standard_datetime__from=2025-01-01', '?standard_datetime__from=2025-01-01&standard_datetime__to=2025-03-01'):
+            response = self.client.get(self.url + query)
+            self.assertNotIn('coverage', response.context)
+            self.assertIn('coverage_hint', response.context)
+
+    def test_break_coverage_matches_the_breaks(self):
+        days, rows, day_totals = break_coverage(Break.objects.all())
+
+        breaks = list(Break.objects.select_related('station'))
+        self.assertEqual(days, sorted({b.standard_datetime.date() for b in breaks}))
+        self.assertEqual([row['station'] for row in rows], sorted({b.station.station_name for b in breaks}))
+        for row in rows:
+            station = [b for b in breaks if b.station.station_name == row['station']]
+            self.assertEqual(row['cells'], [
+                (
+                    sum(1 for b in station if b.standard_datetime.date() == day and b.price_id is not None),
+                    sum(1 for b in station if b.standard_datetime.date() == day),
+                )
+                for day in days
+            ])
+            self.assertEqual((row['priced'], row['total']), (sum(b.price_id is not None for b in station), len(station)))
+        self.assertEqual(day_totals, [
+            (sum(r['cells'][i][0] for r in rows), sum(r['cells'][i][1] for r in rows)) for i in range(len(days))
+        ])
+        self.assertEqual(sum(total for _, total in day_totals), len(breaks))
+        self.assertLess(sum(priced for priced, _ in day_totals), len(breaks))
+
+    def test_estimated_count(self):
+        total = Break.objects.count()
+        self.assertEqual(estimated_count(Break.objects.all(), limit=total), (total, False))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Break._meta.db_table}")
+        self.assertEqual(table_estimate(Break), total)
+        self.assertEqual(estimated_count(Break.objects.all(), limit=10), (total, True))
+
+        # Past the limit a filtered count comes from the planner, but is never below what was counted
+        count, is_estimate = estimated_count(Break.objects.filter(spot_duration=30), limit=10)
+        self.assertTrue(is_estimate)
+        self.assertGreaterEqual(count, 11)
@@ -0,0 +1,160 @@
+from contextlib import ExitStack
+
+from SR.artifacts import ArtifactNotFound, ArtifactWriter, artifact_meta, discard, iter_frame
+from SR.csv_ingest import PRICING_SCHEMA, CsvIngestError, iter_csv, parse_dates
+
+from .reference import get_reference_data
+
+VALIDATED_COLUMNS = [
+    'price_date', 'station_id', 'start_hour', 'end_hour',
+    'duration', 'sales_house_id', 'cost_type', 'cost'
+]
+NULLABLE_ID_COLUMNS = ['start_hour', 'end_hour', 'duration', 'sales_house_id']
+
+CHUNK_SIZE = 50000
+
+# Staged rows are turned into dicts this many at a time
+SLICE_SIZE = 10000
+
+ARTIFACT_KIND = 'pricing'
+
+
+class PricingUploadError(Exception):
+    """A pricing CSV failed validation; the message is shown to the user."""
+
+
+def validate_pricing_chunk(df, refs):
+    """
+    Validate and resolve ids for one chunk read with PRICING_SCHEMA, raising
+    PricingUploadError on the first failed check.
+    """
+    # === ✅ Required Field Check ===
+    missing_cols = PRICING_SCHEMA.columns_with_nulls(df)
+    if missing_cols:
+        raise PricingUploadError(f"Missing required values in columns: {', '.join(missing_cols)}")
+
+    # === ✅ Duration Check ===
+    unknown_durations = set(df['duration'].dropna().unique()) - refs.durations
+    if unknown_durations:
+        raise PricingUploadError(f"Unknown duration values: {', '.join(map(str, unknown_durations))}")
+
+    # === ✅ Parse and validate price_date column ===
+    df['price_date'] = parse_dates(df['price_date'])
+    if df['price_date'].isnull().any():
+        raise PricingUploadError("One or more rows have invalid date formats. Please use DD/MM/YYYY or YYYY-MM-DD.")
+    df['price_date'] = df['price_date'].dt.strftime('%Y-%m-%d')
+
+    # === ✅ Station Name Check ===
+    df['station_id'] = df['station_name'].map(refs.station_ids)
+    if df['station_id'].isnull().any():
+        unknown_stations = df[df['station_id'].isnull()]['station_name'].unique()
+        raise PricingUploadError(f"Unknown station name(s): {', '.join(map(str, unknown_stations))}")
+
+    # === ✅ Sales House Name Check ===
+    df['sales_house_id'] = df['sales_house_name'].map(refs.sales_house_ids)
+    invalid_sales_house_rows = df[df['sales_house_name'].notna() & df['sales_house_id'].isna()]
+    if not invalid_sales_house_rows.empty:
+        unknown_sales = invalid_sales_house_rows['sales_house_name'].unique()
+        raise PricingUploadError(f"Unknown sales house names: {', '.join(map(str, unknown_sales))}")
+
+    # === ✅ Start/End Hour Check ===
+    invalid_hours = (set(df['start_hour'].dropna().unique()) | set(df['end_hour'].dropna().unique())) - refs.hours
+    if invalid_hours:
+        raise PricingUploadError(f"Unknown hour values: {', '.join(map(str, invalid_hours))}")
+
+    return df[VALIDATED_COLUMNS]
+
+
+def _typed(df):
+    for column in NULLABLE_ID_COLUMNS:
+        df[column] = df[column].astype('Int64')
+    df['station_id'] = df['station_id'].astype('int64')
+    return df
+
+
+def stage_pricing_upload(file, chunk_size=CHUNK_SIZE):
+    """
+    Validate an uploaded pricing CSV chunk by chunk, writing each valid chunk
+    to an artifact as it goes. Returns (token, row_count); nothing is staged
+    if any chunk fails.
+    """
+    refs = get_reference_data()
+    price_dates = set()
+    try:
+        with ArtifactWriter(ARTIFACT_KIND) as writer:
+            for chunk in iter_csv(file, PRICING_SCHEMA, chunk_size):
+                df = _typed(validate_pricing_chunk(chunk, refs))
+                writer.append(df)
+                price_dates.update(df['price_date'].unique())
+
+            if not writer.rows:
+                raise PricingUploadError("The uploaded file has no rows.")
+            token = writer.finish(meta={'price_dates': sorted(price_dates)})
+    except CsvIngestError as e:
+        raise PricingUploadError(str(e))
+    return token, writer.rows
+
+
+class StagedPricingRows:
+    """
+    A staged upload's validated rows, as the dicts the insert pipeline expects.
+    Rows are read from the memory-mapped artifact SLICE_SIZE at a time, so only
+    one slice is ever held as dicts. Can be iterated more than once.
+    """
+
+    def __init__(self, token, slice_size=SLICE_SIZE):
+        self.token = token
+        self.slice_size = slice_size
+        try:
+            self.count = artifact_meta(token, ARTIFACT_KIND)['rows']
+        except ArtifactNotFound:
+            raise PricingUploadError("The validated upload has expired. Please upload the CSV again.")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for df in iter_frame(self.token, ARTIFACT_KIND, slice_size=self.slice_size):
+            df = df.astype(object).where(df.notna(), None)
+            yield from df.to_dict(orient='records')
+
+
+def load_pricing_upload(token):
+    """Validated rows for a staged upload (see StagedPricingRows)."""
+    return StagedPricingRows(token)
+
+
+def staged_price_dates(token):
+    """Distinct price_dates in a staged upload, in date order, without loading the rows."""
+    try:
+        return artifact_meta(token, ARTIFACT_KIND)['price_dates']
+    except ArtifactNotFound:
+        raise PricingUploadError("The validated upload has expired. Please upload the CSV again.")
+
+
+def split_pricing_upload(token):
+    """
+    Re-stage an upload as one artifact per price_date, keeping row order within
+    each date, and discard the original. Slices of the upload are appended to
+    the per-date artifacts as they are read. Returns [(price_date, token), ...].
+    """
+    try:
+        price_dates = artifact_meta(token, ARTIFACT_KIND)['price_dates']
+        with ExitStack() as stack:
+            writers = {price_date: stack.enter_context(ArtifactWriter(ARTIFACT_KIND)) for price_date in price_dates}
+            for df in iter_frame(token, ARTIFACT_KIND, slice_size=CHUNK_SIZE):
+                for price_date, rows in df.groupby('price_date', sort=False):
+                    writers[price_date].append(_typed(rows.reset_index(drop=True)))
+            tokens = [
+                (price_date, writer.finish(meta={'price_dates': [price_date]}))
+                for price_date, writer in writers.items()
+            ]
+    except ArtifactNotFound:
+        raise PricingUploadError("The validated upload has expired. Please upload the CSV again.")
+
+    discard(token)
+    return tokens
+
+
+def discard_pricing_upload(token):
+    discard(token)
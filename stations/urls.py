@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('price-quote/', views.price_quote, name='price-quote'),
+]
@@ -0,0 +1,50 @@
+import time
+
+from django.db import connection
+
+from .models import Cache_Version
+
+# Version counters for cached lookups. They live in the database so that a
+# bump in one process (an upload, a job worker) invalidates every other
+# process, and so concurrent bumps can't be lost: each is a single atomic
+# increment. Reads are reused for CHECK_INTERVAL seconds, so a hot lookup
+# costs at most one query per interval; other processes see a bump within it.
+
+CHECK_INTERVAL = 2.0
+
+_checked = {}
+
+BUMP_SQL = f"""
+    INSERT INTO {Cache_Version._meta.db_table} (name, version) VALUES (%s, 2)
+    ON CONFLICT (name) DO UPDATE SET version = {Cache_Version._meta.db_table}.version + 1
+    RETURNING version
+"""
+
+
+def get_version(name):
+    checked = _checked.get(name)
+    if checked is not None and time.monotonic() - checked[1] < CHECK_INTERVAL:
+        return checked[0]
+
+    # A counter that was never bumped has no row yet
+    version = Cache_Version.objects.filter(name=name).values_list('version', flat=True).first() or 1
+    _checked[name] = (version, time.monotonic())
+    return version
+
+
+def bump_version(name):
+    with connection.cursor() as cursor:
+        cursor.execute(BUMP_SQL, [name])
+        version = cursor.fetchone()[0]
+    # This process sees its own bump straight away
+    _checked[name] = (version, time.monotonic())
+    return version
+
+
+def sheet_version_name(price_date):
+    return f"pricing_sheet:{price_date}"
+
+
+def bump_sheet_version(price_date):
+    """Call after any write to a sheet's Station_Pricing rows, once it has committed."""
+    return bump_version(sheet_version_name(price_date))
@@ -1,3 +1,47 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_http_methods
+
+from .quotes import price_for, price_for_many
+
+
+def _parse_spot(data):
+    """(station_id, sales_house_id, duration, when) from a request dict, raising ValueError on bad input."""
+    when = parse_datetime(str(data.get('datetime', '')))
+    if when is None:
+        raise ValueError("datetime must be an ISO 8601 date and time")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+
+    sales_house_id = data.get('sales_house_id')
+    duration = data.get('duration')
+    return (
+        int(data['station_id']),
+        int(sales_house_id) if sales_house_id not in (None, '') else None,
+        int(duration) if duration not in (None, '') else None,
+        when,
+    )
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def price_quote(request):
+    """
+    GET  ?station_id=&sales_house_id=&duration=&datetime=  -> one quote
+    POST [{"station_id": .., "sales_house_id": .., "duration": .., "datetime": ..}, ...]  -> list of quotes
+    """
+    try:
+        if request.method == "GET":
+            return JsonResponse(price_for(*_parse_spot(request.GET)))
+
+        items = json.loads(request.body)
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("the body must be a JSON list of spot objects")
+        spots = [_parse_spot(item) for item in items]
+        return JsonResponse({'quotes': price_for_many(spots)})
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'error': f"Invalid quote request: {e}"}, status=400)
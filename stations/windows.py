@@ -0,0 +1,91 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, time
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Break, Pricing_Sheet
+from .versions import get_version
+
+WINDOWS_VERSION = 'pricing_windows'
+
+
+def day_start(day):
+    # Same boundary the old standard_datetime__date lookups used (current time zone)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+@dataclass(frozen=True)
+class PricingWindow:
+    price_date: object
+    start: datetime
+    end: datetime = None  # exclusive, None for the latest sheet
+
+    def breaks(self):
+        """Half-open standard_datetime range, so an index on the column can be used."""
+        breaks = Break.objects.filter(standard_datetime__gte=self.start)
+        if self.end is not None:
+            breaks = breaks.filter(standard_datetime__lt=self.end)
+        return breaks
+
+
+class PricingWindows:
+    """
+    Interval table of pricing sheets: sheet N applies from its price_date up
+    to (not including) the price_date of sheet N+1.
+    """
+
+    def __init__(self, price_dates):
+        self.price_dates = sorted(price_dates)
+        self.starts = [day_start(day) for day in self.price_dates]
+        self.windows = [
+            PricingWindow(day, start, self.starts[i + 1] if i + 1 < len(self.starts) else None)
+            for i, (day, start) in enumerate(zip(self.price_dates, self.starts))
+        ]
+        self._index = {window.price_date: window for window in self.windows}
+        self._start_array = np.array([start.timestamp() for start in self.starts], dtype=np.float64)
+
+    @classmethod
+    def load(cls):
+        return cls(Pricing_Sheet.objects.values_list('price_date', flat=True))
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def window(self, price_date):
+        """Window for a sheet date. A date with no sheet yet gets the window it would have."""
+        if isinstance(price_date, str):
+            price_date = datetime.strptime(price_date, '%Y-%m-%d').date()
+        window = self._index.get(price_date)
+        if window is None:
+            start = day_start(price_date)
+            i = bisect_right(self.starts, start)
+            window = PricingWindow(price_date, start, self.starts[i] if i < len(self.starts) else None)
+        return window
+
+    def window_for(self, when):
+        """Window a datetime falls in, or None if it's before the first sheet."""
+        i = bisect_right(self.starts, when) - 1
+        return self.windows[i] if i >= 0 else None
+
+    def sheet_dates_for(self, datetimes):
+        """Vectorized window_for: one sheet date (or None) per datetime."""
+        stamps = np.array([dt.timestamp() for dt in datetimes], dtype=np.float64)
+        positions = np.searchsorted(self._start_array, stamps, side='right') - 1
+        return [self.price_dates[i] if i >= 0 else None for i in positions.tolist()]
+
+
+_cached = {'version': None, 'windows': None}
+
+
+def get_pricing_windows():
+    """Process-wide PricingWindows, reloaded whenever a sheet is added or removed."""
+    version = get_version(WINDOWS_VERSION)
+    if _cached['version'] != version:
+        _cached['windows'] = PricingWindows.load()
+        _cached['version'] = version
+    return _cached['windows']